@@ -0,0 +1,49 @@
+import time
+
+
+class AIScheduler:
+    """Spreads the think-steps of mobs (e.g. choosing where to move) across ticks, so that mobs don't all think in the
+    same tick. Each mob thinks once every <period> ticks, starting at a staggered offset, and each tick the mobs that
+    are due think in order of priority until <budget> seconds have been used (or <max_steps> think-steps have run,
+    which is reproducible, unlike a time budget). Mobs that miss out stay due and are put first once they are a
+    whole period late, so that none of them are starved"""
+
+    def __init__(self, budget=None, max_steps=None):
+        self.budget = budget
+        self.max_steps = max_steps
+
+        # key (e.g. a mob) -> the tick it next needs to think at
+        self.next_due = dict()
+        self.staggered = 0
+        self.stats = {"steps": 0, "deferred": 0}
+
+    def run(self, tick, tasks):
+        """Runs the think-steps of the due tasks, where each task is a (priority, key, period, think) tuple, with lower
+        priorities thinking first and think() being called with no arguments. Keys that are not given are forgotten"""
+
+        next_due = dict()
+        due_tasks = []
+        for priority, key, period, think in tasks:
+            due = self.next_due.get(key)
+            if due is None:
+                # new keys are given different offsets, so that a group of mobs appearing together is spread out
+                due = tick + self.staggered % period
+                self.staggered += 1
+            next_due[key] = due
+
+            if due <= tick:
+                overdue = tick - due >= period
+                due_tasks.append(((not overdue, priority), key, period, think))
+        self.next_due = next_due
+
+        due_tasks.sort(key=lambda task: task[0])
+        start = time.perf_counter()
+        for index, (priority, key, period, think) in enumerate(due_tasks):
+            if (self.max_steps is not None and index >= self.max_steps) or \
+                    (self.budget is not None and index > 0 and time.perf_counter() - start >= self.budget):
+                self.stats["deferred"] += len(due_tasks) - index
+                break
+
+            think()
+            self.next_due[key] = tick + period
+            self.stats["steps"] += 1
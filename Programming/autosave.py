@@ -0,0 +1,58 @@
+import threading
+
+
+class Autosaver:
+    """Saves the game every <interval> ticks without holding up the simulation: take_snapshot() is called at a tick
+    boundary, on the simulation's thread, and must return a copy of the game that is never changed afterwards (e.g.
+    a copy-on-write snapshot), which save(path, snapshot) then writes to <path> on a background thread. If the last
+    save is still being written when the next one is due, the next one waits until it has finished"""
+
+    def __init__(self, path, interval, take_snapshot, save):
+        self.path = path
+        self.interval = interval
+        self.take_snapshot = take_snapshot
+        self.save = save
+
+        self.next_save = interval
+        self.worker = None
+        # an error from the background thread, raised on the simulation's thread by the next tick()
+        self.error = None
+        self.stats = {"saves": 0, "delayed": 0}
+
+    def tick(self, tick):
+        """Starts saving the game in the background if a save is due, to be called between ticks"""
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+        if tick < self.next_save:
+            return
+        if self.worker is not None and self.worker.is_alive():
+            self.stats["delayed"] += 1
+            return
+
+        snapshot = self.take_snapshot()
+        self.worker = threading.Thread(target=self.write, args=(snapshot,), name="autosave", daemon=True)
+        self.worker.start()
+        self.next_save = tick + self.interval
+
+    def write(self, snapshot):
+        """Writes a snapshot to the save file, on the background thread"""
+
+        try:
+            self.save(self.path, snapshot)
+            self.stats["saves"] += 1
+        except Exception as error:
+            self.error = error
+
+    def stop(self):
+        """Waits for any save that is being written to finish"""
+
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
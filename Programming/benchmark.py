@@ -0,0 +1,204 @@
+import argparse
+import collections
+import csv
+import importlib
+import os
+import random
+import sys
+import time
+
+# the benchmark never opens a real window, so it can run on machines without a display
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+
+try:
+    import pygame
+
+except ModuleNotFoundError:
+    print("Error: PyGame module not found, please make sure that PyGame is installed in the same folder as main.py.")
+    print("See https://pypi.org/project/pygame/ for installation details.")
+    sys.exit(1)
+
+import profiling
+
+
+# scripted input trace, as (segment name, frames, held arrow keys (x, y), toolbar slot, mouse action) - the mouse
+# action is either None, "ground" (hold left click just below the user) or "sweep" (hold left click whilst circling
+# the user, hitting any mobs nearby)
+INPUT_TRACE = [("walk", 40, (1, 0), None, None),
+               ("walk", 40, (0, 1), None, None),
+               ("mine", 30, (0, 0), 3, "ground"),
+               ("mine", 30, (0, 0), 2, "ground"),
+               ("attack", 40, (-1, 0), 0, "sweep"),
+               ("attack", 40, (0, -1), 1, "sweep"),
+               ("menus", 40, (0, 0), None, None),
+               ("walk", 40, (-1, -1), None, None)]
+
+# frame offsets within a "menus" segment at which to open the pause menu, open help, go back and resume
+MENU_EVENTS = {0: ("key", "K_ESCAPE"), 1: ("key", "K_ESCAPE"), 10: ("click", "help_button"),
+               25: ("click", "back_button"), 35: ("key", "K_ESCAPE")}
+
+# functions in main.py that are timed, in the order they are reported
+TIMED_STAGES = ["Simulation.tick", "shift_interface", "mob_refresh", "draw_interface", "draw_mobs",
+                "display_user_info", "display_hotbar", "Button.draw", "display_cursor", "display_pause_menu",
+                "display_help_menu", "display.flip"]
+
+
+class ScriptedInput:
+    """Input source for the main game loop that replays <INPUT_TRACE> instead of reading the keyboard and mouse,
+    marking the end of each frame for a StageTimer"""
+
+    def __init__(self, game, timer, repeats):
+        self.game = game
+        self.timer = timer
+        self.frames = []
+        for i in range(repeats):
+            for segment in INPUT_TRACE:
+                name, frame_count = segment[:2]
+                for offset in range(frame_count):
+                    self.frames.append((segment, offset))
+
+        self.frame = -1
+
+    def get_events(self):
+        """Returns the scripted events for the current frame, or a quit event once the trace has finished"""
+
+        self.timer.end_frame()
+        self.frame += 1
+
+        if self.frame >= len(self.frames):
+            return [pygame.event.Event(pygame.QUIT)]
+
+        (name, frame_count, movement, toolbar_slot, mouse_action), offset = self.frames[self.frame]
+        events = []
+        if name == "menus" and offset in MENU_EVENTS:
+            event_type, target = MENU_EVENTS[offset]
+            if event_type == "key":
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=getattr(pygame, target)))
+            else:
+                button = getattr(self.game, target)
+                events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=button.rect.center))
+
+        return events
+
+    def get_controls(self, camera):
+        """Returns the scripted controls for the current frame"""
+
+        if self.frame + 1 >= len(self.frames):
+            return self.game.engine.NO_CONTROLS
+
+        (name, frame_count, movement, toolbar_slot, mouse_action), offset = self.frames[self.frame + 1]
+
+        # aim relative to the middle of the window, where the user normally is
+        centre_x, centre_y = self.game.engine.WINDOW_WIDTH // 2, self.game.engine.WINDOW_HEIGHT // 2
+        if mouse_action == "ground":
+            mouse_pos = (centre_x + 10, centre_y + 80)
+        elif mouse_action == "sweep":
+            mouse_pos = (centre_x + (offset * 37) % 300 - 150, centre_y + (offset * 53) % 300 - 150)
+        else:
+            mouse_pos = (centre_x, centre_y)
+
+        return self.game.engine.Controls(movement[0], movement[1], mouse_action is not None,
+                                         camera.to_world(mouse_pos), False, False, toolbar_slot, None)
+
+
+class StageTimer:
+    """Accumulates how long each timed function takes within each frame of the game loop"""
+
+    def __init__(self):
+        self.frames = []
+        self.current = collections.defaultdict(float)
+        self.frame_start = None
+
+    def wrap(self, owner, attribute, stage):
+        """Replaces <owner>.<attribute> with a version of itself that adds its run time to <stage>"""
+
+        function = getattr(owner, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.current[stage] += time.perf_counter() - start
+
+        setattr(owner, attribute, timed)
+
+    def end_frame(self):
+        """Stores the stage times for the frame that has just finished and starts timing the next one"""
+
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.current["frame"] = now - self.frame_start
+            self.frames.append(dict(self.current))
+
+        self.current.clear()
+        self.frame_start = now
+
+
+def report(frames):
+    """Prints per-frame percentiles, in milliseconds, for every stage that ran during the benchmark"""
+
+    print(f"{'stage':<20}{'frames':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for stage in ["frame"] + TIMED_STAGES:
+        times = sorted(frame[stage] * 1000 for frame in frames if stage in frame)
+        if times:
+            p50, p90, p99 = (profiling.percentile(times, fraction) for fraction in (0.5, 0.9, 0.99))
+            print(f"{stage:<20}{len(times):>8}{p50:>9.2f}{p90:>9.2f}{p99:>9.2f}{times[-1]:>9.2f}")
+
+
+def write_csv(frames, path):
+    """Writes the time (in milliseconds) of each stage in each frame to a CSV file"""
+
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["frame", "total"] + TIMED_STAGES)
+        for index, frame in enumerate(frames):
+            writer.writerow([index, round(frame["frame"] * 1000, 3)] +
+                            [round(frame.get(stage, 0) * 1000, 3) for stage in TIMED_STAGES])
+
+
+def run_benchmark(seed, repeats, warmup, csv_path, profile_path=None):
+    """Runs the real game loop in lockstep mode against the scripted input trace, then reports frame times"""
+
+    # the world's seed is chosen when engine.py is imported, so seed beforehand to benchmark the same world every time
+    random.seed(seed)
+    game = importlib.import_module("main")
+
+    timer = StageTimer()
+    timer.wrap(game.engine.Simulation, "tick", "Simulation.tick")
+    timer.wrap(game.Button, "draw", "Button.draw")
+    timer.wrap(pygame.display, "flip", "display.flip")
+    # the simulation's stages are in engine.py, and the rest are in main.py
+    for stage in TIMED_STAGES:
+        for module in (game, game.engine):
+            if hasattr(module, stage):
+                timer.wrap(module, stage, stage)
+
+    start = time.perf_counter()
+    game.main(ScriptedInput(game, timer, repeats), lockstep=True, frame_rate=0, profile_path=profile_path)
+    total = time.perf_counter() - start
+
+    frames = timer.frames[warmup:]
+    print(f"Benchmarked {len(frames)} frames (seed {seed}, {warmup} warm-up frames skipped) in {total:.2f}s")
+    report(frames)
+
+    if csv_path is not None:
+        write_csv(frames, csv_path)
+        print(f"Per-frame times written to {csv_path}")
+    if profile_path is not None:
+        print(f"Profile written to {profile_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless frame-time benchmark of the main game loop")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for world generation and mobs")
+    parser.add_argument("--repeats", type=int, default=1, help="number of times to play the input trace")
+    parser.add_argument("--warmup", type=int, default=10, help="number of initial frames to leave out")
+    parser.add_argument("--csv", default=None, help="file to write per-frame stage times to")
+    parser.add_argument("--profile", default=None,
+                        help="file to write the game's own profile to, as a Chrome trace (.json) or CSV file")
+    arguments = parser.parse_args()
+
+    run_benchmark(arguments.seed, arguments.repeats, arguments.warmup, arguments.csv, arguments.profile)
@@ -0,0 +1,137 @@
+import copy
+
+
+class ClearanceMap:
+    """Stores, for every point in a grid, the side of the largest square of passable points that has its top-left
+    corner at that point (up to <max_clearance>), so that whether a square sprite fits somewhere is a single lookup"""
+
+    def __init__(self, width, height, is_passable, max_clearance):
+        self.width, self.height = width, height
+        self.is_passable = is_passable
+        self.max_clearance = max_clearance
+        self.values = bytearray(width * height)
+        # (width, height) -> the squares that cover a rectangle of that size, as from squares_in(), and size -> a
+        # bytes.translate() table turning clearances into whether a square of that size fits
+        self.rectangles = dict()
+        self.size_tables = dict()
+
+        # each point's clearance depends on the points to its right and below it, so these are worked out first
+        for y in range(height - 1, -1, -1):
+            for x in range(width - 1, -1, -1):
+                self.values[y * width + x] = self.calculate(x, y)
+
+    def calculate(self, x, y):
+        """Works out the clearance of a point from the clearances of the points to its right and below it"""
+
+        if not self.is_passable(x, y):
+            return 0
+
+        width, values = self.width, self.values
+        right = values[y * width + x + 1] if x + 1 < width else 0
+        below = values[(y + 1) * width + x] if y + 1 < self.height else 0
+        diagonal = values[(y + 1) * width + x + 1] if x + 1 < width and y + 1 < self.height else 0
+
+        return min(self.max_clearance, 1 + min(right, below, diagonal))
+
+    def get(self, x, y):
+        """Returns the clearance of a point, which is 0 if the point is not passable"""
+
+        return self.values[y * self.width + x]
+
+    def fits(self, x, y, size):
+        """Returns whether a <size> x <size> square with its top-left corner at (x, y) is all passable"""
+
+        return 0 <= x < self.width and 0 <= y < self.height and self.values[y * self.width + x] >= size
+
+    def fits_rectangle(self, x, y, width, height):
+        """Returns whether a <width> x <height> rectangle with its top-left corner at (x, y) is all passable, by
+        covering it with squares as big as its shorter side"""
+
+        squares = self.rectangles.get((width, height))
+        if squares is None:
+            squares = self.rectangles[(width, height)] = self.squares_in(width, height)
+
+        size, offsets = squares
+        if not (0 <= x and x + width <= self.width and 0 <= y and y + height <= self.height):
+            return False
+
+        values, row_width = self.values, self.width
+        for dx, dy in offsets:
+            if values[(y + dy) * row_width + x + dx] < size:
+                return False
+
+        return True
+
+    def fits_row(self, x, y, length, width, height):
+        """Returns whether a <width> x <height> rectangle fits with its top-left corner at each of <length> points
+        along a row from (x, y), as bytes of 0 or 1, working on whole rows of the map at a time rather than point by
+        point"""
+
+        squares = self.rectangles.get((width, height))
+        if squares is None:
+            squares = self.rectangles[(width, height)] = self.squares_in(width, height)
+        size, offsets = squares
+        table = self.size_tables.get(size)
+        if table is None:
+            table = self.size_tables[size] = bytes(clearance >= size for clearance in range(256))
+
+        # only the points where the whole rectangle is inside the map can fit it
+        first, last = max(0, -x), min(length, self.width - width - x + 1)
+        if y < 0 or y + height > self.height or first >= last:
+            return bytes(length)
+
+        # the rectangle fits where every square covering it does, so the rows for each square are and-ed together
+        fits = None
+        for dx, dy in offsets:
+            row_start = (y + dy) * self.width + x + first + dx
+            row = self.values[row_start:row_start + last - first].translate(table)
+            fits = row if fits is None else \
+                (int.from_bytes(fits, "big") & int.from_bytes(row, "big")).to_bytes(last - first, "big")
+
+        return bytes(first) + fits + bytes(length - last)
+
+    @staticmethod
+    def squares_in(width, height):
+        """Returns the side of the squares that cover a <width> x <height> rectangle, and the (x, y) offsets of their
+        top-left corners from the rectangle's, with the last square overlapping the one before if they don't fit
+        exactly"""
+
+        size = min(width, height)
+        if width >= height:
+            return size, [(min(dx, width - size), 0) for dx in range(0, width, size)]
+        else:
+            return size, [(0, min(dy, height - size)) for dy in range(0, height, size)]
+
+    def update_point(self, x, y):
+        """Recalculates the clearances that can depend on a point whose passability has changed, returning the
+        (x, y, width, height) box of points that were recalculated and the changes, as for update_area()"""
+
+        return self.update_area(x, y, 1, 1)
+
+    def update_area(self, x, y, width, height):
+        """Recalculates the clearances that can depend on an (x, y, width, height) box of points whose passability has
+        changed, which are the points in the box and up to <max_clearance> - 1 points above and to the left of it,
+        returning the box of points that were recalculated and an (x, y, old clearance, new clearance) tuple for each
+        point whose clearance changed"""
+
+        x_start, y_start = max(0, x - self.max_clearance + 1), max(0, y - self.max_clearance + 1)
+        x_end, y_end = min(self.width, x + width), min(self.height, y + height)
+        changes = []
+        for y_pos in range(y_end - 1, y_start - 1, -1):
+            for x_pos in range(x_end - 1, x_start - 1, -1):
+                index = y_pos * self.width + x_pos
+                old_clearance, new_clearance = self.values[index], self.calculate(x_pos, y_pos)
+                if old_clearance != new_clearance:
+                    self.values[index] = new_clearance
+                    changes.append((x_pos, y_pos, old_clearance, new_clearance))
+
+        return (x_start, y_start, x_end - x_start, y_end - y_start), changes
+
+    def snapshot(self):
+        """Returns a read-only copy of the map, which other threads can read whilst this map is being updated"""
+
+        frozen = copy.copy(self)
+        frozen.values = bytes(self.values)
+        frozen.is_passable = None
+
+        return frozen
@@ -0,0 +1,218 @@
+import asyncio
+import argparse
+import threading
+
+import engine
+import state_sync
+
+
+MOB_TYPES = list(engine.MOB_STATS)
+
+
+class ServerConnection:
+    """A connection to a game server (see server.py), playing as one user whose view of the world is kept in
+    <world>"""
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.player_id = None
+        self.world_seed = None
+        self.world = state_sync.ClientWorld(engine.TERRAIN_CHUNK_SIZE)
+        self.sent_controls = None
+
+    async def join(self, host, port):
+        """Connects to the server at (host, port) and waits to be welcomed"""
+
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(state_sync.pack_message(state_sync.JOIN, state_sync.JOIN_MESSAGE.pack(
+            state_sync.PROTOCOL_VERSION)))
+
+        message_type, payload = await state_sync.read_message(self.reader)
+        if message_type != state_sync.WELCOME or len(payload) != state_sync.WELCOME_MESSAGE.size:
+            raise state_sync.SyncError(f"{host}:{port} is not a game server")
+        version, self.player_id, self.world_seed, self.world.tick = state_sync.WELCOME_MESSAGE.unpack(payload)
+        if version != state_sync.PROTOCOL_VERSION:
+            raise state_sync.SyncError(f"{host}:{port} talks version {version} of the protocol, rather than version "
+                                       f"{state_sync.PROTOCOL_VERSION}")
+
+    async def receive_update(self):
+        """Waits for the next update from the server, and applies it to <world>"""
+
+        try:
+            message_type, payload = await state_sync.read_message(self.reader)
+        except asyncio.IncompleteReadError:
+            raise state_sync.SyncError("the server closed the connection") from None
+
+        if message_type != state_sync.UPDATE:
+            raise state_sync.SyncError(f"unexpected message of type {message_type} from the server")
+        self.world.apply_update(payload)
+
+    def send_controls(self, controls):
+        """Sends the user's controls to the server, if they have changed since they were last sent"""
+
+        if controls != self.sent_controls:
+            self.writer.write(state_sync.pack_message(state_sync.CONTROLS, state_sync.pack_controls(controls)))
+            self.sent_controls = controls
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def take_snapshot(self):
+        """Returns the user's view of the world as an immutable snapshot, in the same form as engine.Simulation's"""
+
+        world = self.world
+        player_x, player_y, direction, health, hunger, hit, toolbar_slot, inventory_slot, red_overlay_opacity = \
+            world.user
+        mobs = tuple(engine.MobSnapshot(MOB_TYPES[type_id], (mob_x, mob_y), hostile, mob_hit)
+                     for type_id, mob_x, mob_y, hostile, mob_hit in world.mobs.values())
+        players = tuple(engine.PlayerSnapshot(player_id, (other_x, other_y), state_sync.DIRECTIONS[other_direction],
+                                              other_hit)
+                        for player_id, (other_x, other_y, other_direction, other_hit) in world.players.items())
+
+        return engine.WorldSnapshot(world.tick, player_x, player_y, state_sync.DIRECTIONS[direction], health, hunger,
+                                    hit, toolbar_slot, inventory_slot, tuple(world.toolbar.items()),
+                                    tuple(world.inventory.items()), mobs, world.messages, red_overlay_opacity,
+                                    players)
+
+
+class RemoteSimulation(threading.Thread):
+    """Stands in for engine.Simulation when playing on a server: a thread running the connection on its own event
+    loop, which sends the local user's controls to the server after every update, and publishes a snapshot of what
+    the update changed"""
+
+    def __init__(self, host, port, snapshots):
+        super().__init__(name="connection", daemon=True)
+        self.host = host
+        self.port = port
+        self.snapshots = snapshots
+        self.connection = ServerConnection()
+
+        # a game on a server is never autosaved, recorded or replayed by its clients
+        self.autosaver = None
+        self.recorder = None
+        self.playback = None
+
+        # thread control, written by the render loop and read by the connection's thread
+        self.error = None
+        self.loop = None
+        self._controls = engine.NO_CONTROLS
+        self._paused = False
+        self._controls_lock = threading.Lock()
+        self._joined = threading.Event()
+        self._stopped = threading.Event()
+
+    def join_game(self):
+        """Starts the connection's thread, waiting until the first update from the server has been published (so that
+        the render loop always has a snapshot), and raising any error in joining"""
+
+        self.start()
+        self._joined.wait()
+        if self.error is not None:
+            raise self.error
+
+    def load_world(self):
+        """Generates the server's world from its seed, then keeps it up to date with the server's edits"""
+
+        engine.WORLD_SEED = self.connection.world_seed
+        engine.load_world()
+
+        # edits are only ever made to the terrain on the connection's thread
+        asyncio.run_coroutine_threadsafe(self.attach_terrain(engine.terrain), self.loop).result()
+
+    async def attach_terrain(self, terrain):
+        self.connection.world.attach_terrain(terrain)
+
+    def set_controls(self, controls):
+        """Stores the latest user input, to be sent to the server after the next update"""
+
+        with self._controls_lock:
+            self._controls = controls
+
+    def set_paused(self, paused):
+        """The world carries on whilst the game is paused, so the user stops using their controls until it is resumed"""
+
+        with self._controls_lock:
+            self._paused = paused
+
+    def stop(self):
+        """Leaves the server"""
+
+        self._stopped.set()
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.connection.close)
+            except RuntimeError:
+                # the connection's event loop has already finished
+                pass
+
+    def run(self):
+        try:
+            asyncio.run(self.run_connection())
+        except Exception as error:
+            # leaving the server closes the connection whilst waiting for an update, which is not an error
+            if not self._stopped.is_set():
+                self.error = error
+        finally:
+            self._joined.set()
+
+    async def run_connection(self):
+        self.loop = asyncio.get_running_loop()
+        await self.connection.join(self.host, self.port)
+
+        try:
+            while not self._stopped.is_set():
+                await self.connection.receive_update()
+                with self._controls_lock:
+                    controls = engine.NO_CONTROLS if self._paused else self._controls
+                self.connection.send_controls(controls)
+
+                self.snapshots.publish(self.connection.take_snapshot())
+                self._joined.set()
+        finally:
+            self.connection.close()
+
+
+async def run_bot(host, port, seed, ticks):
+    """Joins a server as a user that wanders about for <ticks> updates, returning its connection"""
+
+    connection = ServerConnection()
+    await connection.join(host, port)
+    wanderer = engine.Wanderer(seed)
+
+    try:
+        for tick in range(ticks):
+            await connection.receive_update()
+            player_x, player_y = connection.world.user[:2]
+            connection.send_controls(wanderer.get_controls(tick, player_x, player_y, len(connection.world.inventory)))
+    except state_sync.SyncError as error:
+        print(f"Bot {connection.player_id} left early: {error}")
+    finally:
+        connection.close()
+
+    return connection
+
+
+async def run_bots(host, port, bots, ticks, seed):
+    """Joins a server with several bots at once, reporting how much each was sent"""
+
+    connections = await asyncio.gather(*(run_bot(host, port, seed + bot, ticks) for bot in range(bots)))
+    for connection in connections:
+        stats = connection.world.stats
+        print(f"Bot {connection.player_id}: {stats['updates']} updates, {stats['bytes']} bytes "
+              f"({stats['bytes'] / max(1, stats['updates']):.1f} bytes per update), holding "
+              f"{len(connection.world.mobs)} mobs, {len(connection.world.players)} users, "
+              f"{sum(len(edits) for edits in connection.world.chunks.values())} edited points")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Joins a server with bots that wander about, without a display")
+    parser.add_argument("--host", default=state_sync.DEFAULT_HOST, help="address of the server")
+    parser.add_argument("--port", type=int, default=state_sync.DEFAULT_PORT, help="port of the server")
+    parser.add_argument("--bots", type=int, default=4, help="number of bots to join with")
+    parser.add_argument("--ticks", type=int, default=600, help="number of updates each bot stays for")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the bots' wandering")
+    arguments = parser.parse_args()
+
+    asyncio.run(run_bots(arguments.host, arguments.port, arguments.bots, arguments.ticks, arguments.seed))
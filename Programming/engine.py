@@ -0,0 +1,1570 @@
+import math
+import random
+import os
+import abc
+import time
+import threading
+import collections
+import functools
+import itertools
+import argparse
+import zlib
+
+import terrain_gen
+import pathfinding
+import flow_field
+import navigation
+import path_service
+import spawn_index
+import spatial_hash
+import mob_store
+import ai_scheduler
+import line_of_sight
+import world_save
+import terrain_overlay
+import profiling
+import replay
+
+
+# the simulation of the game - the world, mobs, each user's state and items, and saving, loading and replaying it -
+# which never imports PyGame, so it can be ticked without a display (e.g. by soak tests or server.py), with main.py
+# drawing the snapshots it publishes
+
+TERRAIN_ICON_COORDS = {"plains": {"coords": [62, 77, 392, 344], "scaling": 0.1},
+                       "desert": {"coords": [62, 46, 138, 164], "scaling": 0.3},
+                       "forest": {"coords": [2, 41, 68, 87], "scaling": 0.8}}
+
+# initialise terrain, as a generated base that can be made again from <WORLD_SEED>, with the user's changes kept in a
+# sparse overlay for each chunk of <TERRAIN_CHUNK_SIZE> points (the same size as the terrain renderer's chunks), so
+# that saves only need to store those changes. The terrain is only generated (or loaded) by load_world()
+WIDTH, HEIGHT, SPACING, POINT_SIZE = 2, 2, 100, 10
+TERRAIN_CHUNK_SIZE = 40
+WORLD_SEED = random.getrandbits(32)
+terrain = None
+
+# initialise window variables, which decide how far from the user mobs are simulated, and where messages are drawn
+VIEW_SIZE = 75
+WINDOW_WIDTH, WINDOW_HEIGHT = VIEW_SIZE * POINT_SIZE, VIEW_SIZE * POINT_SIZE
+WORLD_WIDTH, WORLD_HEIGHT = WIDTH * SPACING, HEIGHT * SPACING
+
+
+# initialise terrain movement rules, so that they can be shared by pathfinding
+def is_walkable(movement, x, y):
+    """Returns whether a mob with a movement type of land / water can move through a point in the terrain"""
+
+    return terrain[y][x][3] is None and (terrain[y][x][1] == "ocean") == (movement == "water")
+
+
+# initialise attack types, so that they can be attached to mob types
+class MobAttack:
+    """A mixin class for neutral and aggressive mobs' attack protocol"""
+
+    # noinspection PyUnresolvedReferences
+    def attack(self, user_health, user_hit):
+        if user_hit == 0:
+            user_health -= self.attack_damage
+            user_hit = 10
+
+        else:
+            user_hit -= 1
+
+        return user_health, user_hit
+
+
+# initialise game variables
+USER_ICON_COORDS = {"idle": [9, 61, 15, 35], "horizontal": [70, 12, 21, 34], "up": [106, 108, 15, 33],
+                    "down": [105, 59, 15, 35]}
+USER_SCALING = 2
+HUNGER_INTERVAL = 40
+TICK_RATE = 15
+# the game is loaded from and saved to this file when run directly, as well as being saved to it in the background
+# every <AUTOSAVE_INTERVAL> ticks
+SAVE_FILE = "world.sav"
+AUTOSAVE_INTERVAL = 60 * TICK_RATE
+
+# every stage of a tick or frame and the main helpers are timed by <profiler>, along with counters such as draw calls,
+# keeping rolling percentiles over the last <PROFILE_WINDOW> frames
+PROFILE_WINDOW = 120
+profiler = profiling.Profiler(PROFILE_WINDOW)
+
+# in soak tests (and a server's bots), the user changes direction every <WANDER_TURN_INTERVAL> ticks
+WANDER_TURN_INTERVAL = 30
+
+# initialise user variables, where every user starts with wooden tools, and keeps their own tools and items
+STARTING_TOOLBAR = {"sword": "wood", "axe": "wood", "pickaxe": "wood", "shovel": "wood"}
+terrain_tool_type = {"pickaxe": ["caves"], "shovel": ["desert", "plains", "forest"]}
+food_item_values = {"beef": 10, "chicken": 15, "fish": 5}
+
+# immutable records passed between the render loop and the simulation thread
+Controls = collections.namedtuple("Controls", ["move_x", "move_y", "use", "target", "upgrade", "eat",
+                                               "toolbar_slot", "inventory_slot"])
+NO_CONTROLS = Controls(0, 0, False, None, False, False, None, None)
+MobSnapshot = collections.namedtuple("MobSnapshot", ["mob_type", "position", "hostile", "hit"])
+PlayerSnapshot = collections.namedtuple("PlayerSnapshot", ["player_id", "position", "direction", "hit"])
+WorldSnapshot = collections.namedtuple("WorldSnapshot", [
+    "tick", "player_x", "player_y", "direction", "user_health", "user_hunger", "user_hit",
+    "selected_toolbar_slot", "selected_inventory_slot", "toolbar", "inventory", "mobs", "messages",
+    "red_overlay_opacity", "players"])
+
+# item order, origin position, length of sprite sides
+TOOLBAR_ICONS_COORDS = [["sword", "axe", "pickaxe", "shovel"], ["diamond", "iron", "wood"], [32, 80], 16]
+
+# noinspection SpellCheckingInspection
+MOB_ICON_COORDS = {"chicken": {"idle": [2, 53, 12, 11], "scaling": 3},
+                   "cow": {"idle": [3, 1, 31, 23], "scaling": 2.5},
+                   "fish": {"idle": [10, 171, 16, 6], "scaling": 2.1},
+                   "ghost": {"idle": [345, 52, 27, 43], "scaling": 1.5},
+                   "scorpion": {"idle": [5, 6, 24, 22], "scaling": 1.5},
+                   "shark": {"idle": [209, 321, 93, 32], "scaling": 1.2},
+                   "wolf": {"idle": {False: [64, 1, 18, 13], True: [64, 18, 18, 13]}, "scaling": 3},
+                   "zombie": {"idle": [91, 313, 26, 49], "scaling": 1.3}}
+
+# the stats of every type of mob, and whether it is a passive, neutral or aggressive mob
+MOB_STATS = {"chicken": {"behaviour": "Passive", "max_health": 20, "drops": ("chicken", 1), "movement": "land"},
+             "cow": {"behaviour": "Passive", "max_health": 50, "drops": ("beef", 2), "movement": "land"},
+             "fish": {"behaviour": "Passive", "max_health": 10, "drops": ("fish", 1), "movement": "water"},
+             "ghost": {"behaviour": "Aggressive", "max_health": 100, "drops": ("diamond", 1), "movement": "land",
+                       "attack_damage": 20},
+             "scorpion": {"behaviour": "Aggressive", "max_health": 30, "drops": None, "movement": "land",
+                          "attack_damage": 10},
+             "shark": {"behaviour": "Aggressive", "max_health": 60, "drops": None, "movement": "water",
+                       "attack_damage": 15},
+             "wolf": {"behaviour": "Neutral", "max_health": 40, "drops": None, "movement": "land",
+                      "attack_damage": 10},
+             "zombie": {"behaviour": "Aggressive", "max_health": 80, "drops": ("iron", 1), "movement": "land",
+                        "attack_damage": 10}}
+
+# the chance of each type of mob being chosen when a mob generates in a biome
+MOB_BIOMES = {"plains": {"chicken": 0.8, "cow": 0.2},
+              "forest": {"wolf": 1},
+              "desert": {"scorpion": 1},
+              "caves": {"ghost": 0.1, "zombie": 0.9},
+              "ocean": {"fish": 0.8, "shark": 0.2}}
+
+# everything about a type of mob that doesn't change, worked out once by register_mob_types() when the game loads,
+# with the sizes of mob sprites in points (their footprint) rather than pixels
+MobType = collections.namedtuple("MobType", ["name", "mob_class", "max_health", "drops", "movement", "attack_damage",
+                                             "footprint", "scaling"])
+mob_types = dict()
+# for each biome, the mob types that can generate there, as (cumulative spawn chance, mob type) pairs
+biome_spawns = dict()
+
+# the per-tick values of every mob live in parallel arrays in <mob_data>, with <mob_list> holding the mob objects
+mob_data = mob_store.MobStore(MOB_STATS)
+mob_list = mob_data.mobs
+# every mob is given an id that is never reused, so that a server's clients can tell mobs apart between updates
+mob_ids = itertools.count()
+# every mob in <mob_list> is also stored in <mob_grid> by position, so that nearby mobs can be found quickly
+MOB_GRID_CELL_SIZE = 16
+mob_grid = spatial_hash.SpatialHash(MOB_GRID_CELL_SIZE)
+
+# mobs are simulated in less detail the further they are from the user: full AI within <VIEW_SIZE> + 10 points,
+# occasional wandering within <MEDIUM_RANGE> points, and frozen beyond <SLEEP_RANGE> points, where they are packed
+# away into <sleeping_mobs> by chunk until the user comes back
+MEDIUM_RANGE = VIEW_SIZE + 25
+MEDIUM_SLICES = 4
+MOB_CHUNK_SIZE = 25
+SLEEP_RANGE = MEDIUM_RANGE + MOB_CHUNK_SIZE
+SLEEP_INTERVAL = 15
+sleeping_mobs = dict()
+# the most mobs (awake or asleep) that can exist at once, the furthest sleeping mobs are despawned to make room
+MOB_CAP = 60
+# new mobs spawn at points listed by <spawn_points> for each chunk of <SPAWN_CHUNK_SIZE> points, with up to
+# <SPAWN_ATTEMPTS> tries at finding a point that is free of other mobs
+SPAWN_CHUNK_SIZE = 10
+SPAWN_ATTEMPTS = 3
+
+DIRECTIONS = [(0, 1), (0, -1), (1, 1), (1, -1), (-1, -1), (1, 0), (-1, 0), (-1, 1)]
+
+# mobs think (choose how to move) once every <CHASE_PERIOD> ticks when chasing the user and every <WANDER_PERIOD> ticks
+# when wandering, with <mob_scheduler> spreading their think-steps out over ticks and stopping once a tick has spent
+# <AI_BUDGET> seconds on them, nearest and most hostile mobs first (or <AI_STEP_BUDGET> think-steps in lockstep mode)
+CHASE_PERIOD = 6
+WANDER_PERIOD = 2
+AI_BUDGET = 0.004
+AI_STEP_BUDGET = 12
+mob_scheduler = ai_scheduler.AIScheduler(AI_BUDGET)
+
+# mobs chase the user when within <AGGRO_RANGE> points of them, using a flow field slightly larger than this range,
+# which is only rebuilt once the user moves more than <FLOW_FIELD_CORE> points from where it was built, with at most
+# <FLOW_FIELD_CACHE_SIZE> fields kept (e.g. one per navigation class for each user on a server)
+AGGRO_RANGE = VIEW_SIZE // 2 - 10
+FLOW_FIELD_RADIUS = VIEW_SIZE // 2
+FLOW_FIELD_CORE = VIEW_SIZE // 8
+FLOW_FIELD_CACHE_SIZE = 16
+
+# the maximum number of nodes a mob's own path search can expand, before settling for a partial path, with the total number
+# of nodes expanded by mobs' own searches kept in <path_stats>
+PATH_SEARCH_BUDGET = 400
+path_stats = {"expansions": 0}
+
+# mobs move through the world as navigation classes, made up of a movement type and the size of the rectangle of free
+# points that the mob's sprite needs (its footprint), with sides of up to <MAX_CLEARANCE> points
+MAX_CLEARANCE = 16
+NAVIGATION_CHUNK_SIZE = 20
+# the most chunks of the navigation grid that one search can build, spreading the cost of long routes over many ticks
+NAVIGATION_CHUNK_BUDGET = 2
+
+# flow fields and mobs' own path searches are searched for on background workers, with at most <PATH_APPLY_BUDGET>
+# finished searches being put to use each tick. The workers are threads rather than processes: a mob's search repairs
+# the mob's own planner, which would have to be copied to and from a process every time, and searches only read the
+# navigation grid's snapshot, which threads share without copying. Searches still hold the GIL whilst they run, but
+# the tick thread gets it back at least every switch interval (5ms), so a long search is spread over several ticks
+# rather than landing in one
+PATH_WORKERS = 1
+PATH_APPLY_BUDGET = 4
+path_requests = path_service.PathService(PATH_WORKERS, PATH_APPLY_BUDGET)
+
+
+# hostile mobs only start chasing the user when nothing blocks their view of the user, e.g. trees and cacti, with
+# the answer cached for each pair of points until the cache holds <SIGHTLINE_CACHE_SIZE> answers
+SIGHTLINE_CACHE_SIZE = 4096
+
+
+def is_occluder(x, y):
+    """Returns whether a point in the terrain blocks mobs' sight, which natural objects do"""
+
+    return terrain[y][x][3] is not None
+
+
+def snapshot_walkable():
+    """Returns a read-only walkable_row(navigation class, x, y, length) function for the world as it is now"""
+
+    return navigation_grid.snapshot().passable_row
+
+
+def set_reproducible(reproducible):
+    """Makes every tick depend only on the world and the controls, by running path searches in order on the
+    simulation's thread and limiting mobs' thinking by count rather than time, or lets them use background workers and
+    time budgets to keep ticks short"""
+
+    path_requests.inline = reproducible
+    mob_scheduler.budget, mob_scheduler.max_steps = (None, AI_STEP_BUDGET) if reproducible else (AI_BUDGET, None)
+
+
+def world_checksum(snapshot):
+    """Returns a checksum of a world snapshot, which a replayed tick must match the recorded tick on"""
+
+    return zlib.crc32(repr(snapshot).encode())
+
+
+def start_headless(world_seed, session_seed):
+    """Generates a world and creates a simulation of it, to be ticked reproducibly on the calling thread without a
+    display"""
+
+    global WORLD_SEED
+
+    WORLD_SEED = world_seed
+    load_world()
+    build_world_indexes()
+    set_reproducible(True)
+
+    simulation = Simulation(SnapshotBuffer())
+    random.seed(session_seed)
+
+    return simulation
+
+
+def run_headless(simulation, ticks, get_controls=None):
+    """Ticks a simulation <ticks> times as fast as possible, with the controls given by get_controls(tick) if given,
+    returning how long each tick took"""
+
+    tick_times = []
+    for tick in range(ticks):
+        if get_controls is not None:
+            simulation.set_controls(get_controls(tick))
+
+        tick_start = time.perf_counter()
+        simulation.step()
+        tick_times.append(time.perf_counter() - tick_start)
+        profiler.end_frame()
+
+    return tick_times
+
+
+def report_tick_times(tick_times):
+    """Prints how fast ticks ran, and which were slowest"""
+
+    total = sum(tick_times)
+    print(f"Ran {len(tick_times)} ticks in {total:.2f}s ({len(tick_times) / max(total, 1e-9):.0f} ticks per second, "
+          f"{len(tick_times) / TICK_RATE / max(total, 1e-9):.1f}x real time)")
+    if tick_times:
+        ordered = sorted(tick_times)
+        print(f"Tick times (ms): p50 {profiling.percentile(ordered, 0.5) * 1000:.2f}, "
+              f"p99 {profiling.percentile(ordered, 0.99) * 1000:.2f}, max {ordered[-1] * 1000:.2f}")
+        slowest = sorted(range(len(tick_times)), key=lambda tick: tick_times[tick], reverse=True)[:5]
+        print("Slowest ticks: " + ", ".join(f"{tick + 1} ({tick_times[tick] * 1000:.2f}ms)" for tick in slowest))
+
+
+def replay_headless(replay_path, profile_path=None):
+    """Plays back a recorded session as fast as possible without a display, reporting how long each tick took and
+    whether the world turned out the same as when it was recorded"""
+
+    recording = replay.read(replay_path)
+    simulation = start_headless(recording.world_seed, recording.session_seed)
+    simulation.playback = replay.Playback(recording)
+
+    report_tick_times(run_headless(simulation, len(recording.ticks)))
+    report_playback(simulation.playback)
+
+    if profile_path is not None:
+        profiler.export(profile_path)
+
+    return simulation.playback
+
+
+def soak_test(ticks, seed, profile_path=None):
+    """Ticks a new world as fast as possible without a display, with the user wandering about whilst holding down
+    left click just ahead of them (attacking or mining) and sometimes eating, reporting how long each tick took"""
+
+    simulation = start_headless(seed, seed)
+    wanderer = Wanderer(seed)
+
+    def get_controls(tick):
+        user = simulation.user
+        return wanderer.get_controls(tick, user.player_x, user.player_y, len(user.inventory))
+
+    report_tick_times(run_headless(simulation, ticks, get_controls))
+    print(f"Mobs awake: {len(mob_list)}, asleep: {sum(len(records) for records in sleeping_mobs.values())}, user "
+          f"health: {simulation.user.user_health}, inventory: {simulation.user.inventory}")
+
+    if profile_path is not None:
+        profiler.export(profile_path)
+
+    return simulation
+
+
+class Wanderer:
+    """Chooses the controls of a user who wanders about whilst holding down left click just ahead of them (attacking
+    or mining) and sometimes eating, with their own random generator so that they don't change the simulation's"""
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.movement = (0, 0)
+        self.toolbar_slot = 0
+
+    def get_controls(self, tick, player_x, player_y, inventory_size):
+        """Returns the controls for a tick, given where the user is and how many items they have"""
+
+        if tick % WANDER_TURN_INTERVAL == 0:
+            self.movement = (self.random.choice([-1, 0, 1]), self.random.choice([-1, 0, 1]))
+            self.toolbar_slot = self.random.randrange(len(TOOLBAR_ICONS_COORDS[0]))
+
+        move_x, move_y = self.movement
+        target = (min(max(player_x + 2 * move_x, 0), WORLD_WIDTH - 1),
+                  min(max(player_y + 2 * move_y + 4, 0), WORLD_HEIGHT - 1))
+
+        return Controls(move_x, move_y, True, target, False, tick % HUNGER_INTERVAL == 0, self.toolbar_slot,
+                        self.random.randrange(inventory_size + 1))
+
+
+def report_playback(playback):
+    """Prints whether a replayed session matched its recording"""
+
+    if playback.diverged_at is None:
+        print(f"Replay matched the recording for all {playback.tick} ticks")
+    else:
+        print(f"Replay diverged from the recording at tick {playback.diverged_at}")
+
+
+def load_world(save_path=None):
+    """Loads the terrain from the save file at <save_path> if there is one, returning the rest of the save's data to
+    be applied once the simulation exists, otherwise (or if the save can't be read) generates new terrain from
+    <WORLD_SEED> and returns None"""
+
+    global terrain
+
+    if save_path is not None and os.path.exists(save_path):
+        try:
+            save_data = read_save(save_path)
+            terrain = save_data.terrain
+            return save_data
+        except world_save.SaveError as error:
+            # the save is moved aside rather than being overwritten by the new world when the game is next saved
+            os.replace(save_path, f"{save_path}.bad")
+            print(f"Error: {error}, so a new world has been generated (the save has been moved to "
+                  f"'{save_path}.bad')")
+
+    terrain = terrain_overlay.OverlayTerrain(
+        terrain_gen.generate(WIDTH, HEIGHT, SPACING, TERRAIN_ICON_COORDS, POINT_SIZE, WORLD_SEED), TERRAIN_CHUNK_SIZE,
+        WORLD_SEED, (WIDTH, HEIGHT, SPACING))
+
+    return None
+
+
+class SnapshotBuffer:
+    """Double buffer holding the most recent immutable world snapshot, published by the simulation thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._front = None
+        self._published = threading.Event()
+
+    def publish(self, snapshot):
+        """Swaps a fully built snapshot in as the front buffer, so the render loop never sees a partial tick"""
+
+        with self._lock:
+            self._front = snapshot
+        self._published.set()
+
+    def latest(self):
+        """Returns the most recently published snapshot, waiting for the first one if necessary"""
+
+        self._published.wait()
+        with self._lock:
+            return self._front
+
+
+class Player:
+    """A user in the world, with their own position, stats, hotbar selections, tools and items, along with the controls
+    they are using and the messages raised for them in the current tick"""
+
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.player_x, self.player_y = WORLD_WIDTH // 2, WORLD_HEIGHT // 2
+        self.direction = "idle"
+        self.user_delay = 0
+
+        # user running stats
+        self.user_health = 100
+        self.user_hunger = 100
+        self.user_hit = 0
+        self.selected_toolbar_slot = 0
+        self.selected_inventory_slot = 0
+        self.red_overlay_opacity = 0
+        self.toolbar = dict(STARTING_TOOLBAR)
+        self.inventory = dict()
+
+        # the controls used in the current tick, and the messages raised for the user during it (e.g. "Hunger already
+        # full!"), which are drawn by the render loop
+        self.controls = NO_CONTROLS
+        self.messages = []
+
+
+class Simulation(threading.Thread):
+    """Thread that owns and ticks all game state (users, mobs, items), publishing a snapshot of the local user's view
+    of the world after every tick. Without <snapshots> there is no local user (e.g. when run by a server), and users
+    are only added by add_player()"""
+
+    def __init__(self, snapshots=None):
+        super().__init__(name="simulation", daemon=True)
+        self.snapshots = snapshots
+
+        # keeps track of total ticks in-game, limiting how often mobs can move
+        self.window_age = 0
+
+        # every user in the world by their id, where <user> is the one playing on this machine
+        self.players = dict()
+        self.next_player_id = 0
+        self.user = self.add_player() if snapshots is not None else None
+
+        # saves the game in the background every so often, if given an autosave.Autosaver
+        self.autosaver = None
+        # a replay.Recorder that every tick's controls are written to, or a replay.Playback that every tick's
+        # controls are read from instead of the user's
+        self.recorder = None
+        self.playback = None
+
+        # thread control, written by the render loop and read by the simulation thread
+        self.error = None
+        self._controls = NO_CONTROLS
+        self._controls_lock = threading.Lock()
+        self._running = threading.Event()
+        self._stopped = threading.Event()
+
+        if self.snapshots is not None:
+            self.snapshots.publish(self.take_snapshot())
+
+    def add_player(self):
+        """Adds a new user to the world at the spawn point, between ticks, returning them"""
+
+        player = Player(self.next_player_id)
+        self.next_player_id += 1
+        self.players[player.player_id] = player
+
+        return player
+
+    def remove_player(self, player_id):
+        """Removes a user from the world, between ticks"""
+
+        del self.players[player_id]
+
+    def set_controls(self, controls):
+        """Stores the latest input of the local user, to be used by the next simulation tick"""
+
+        with self._controls_lock:
+            self._controls = controls
+
+    def set_paused(self, paused):
+        """Pauses or resumes ticking, at a tick boundary"""
+
+        if paused:
+            self._running.clear()
+        else:
+            self._running.set()
+
+    def stop(self):
+        """Asks the simulation thread to finish after its current tick"""
+
+        self._stopped.set()
+        self._running.set()
+
+    def step(self):
+        """Runs a single tick with the local user's latest controls and publishes it, on the calling thread"""
+
+        if self.playback is not None:
+            controls = Controls(*self.playback.next_controls())
+        else:
+            with self._controls_lock:
+                controls = self._controls
+
+        self.user.controls = controls
+        snapshot = self.tick()
+        if self.recorder is not None:
+            self.recorder.record(controls, world_checksum(snapshot))
+        if self.playback is not None:
+            self.playback.check(world_checksum(snapshot))
+
+        self.snapshots.publish(snapshot)
+
+    def run(self):
+        """Ticks the simulation <TICK_RATE> times per second until stopped"""
+
+        tick_length = 1 / TICK_RATE
+        next_tick = time.perf_counter()
+
+        try:
+            while not self._stopped.is_set():
+                # block whilst the game is paused, then restart the tick timer so that no ticks are 'caught up'
+                if not self._running.is_set():
+                    self._running.wait()
+                    next_tick = time.perf_counter()
+                    continue
+
+                self.step()
+
+                # sleep until the next tick is due, without trying to catch up after a slow tick
+                next_tick = max(next_tick + tick_length, time.perf_counter())
+                self._stopped.wait(max(0.0, next_tick - time.perf_counter()))
+
+        except Exception as error:
+            self.error = error
+
+    @profiler.timed("Simulation.tick")
+    def tick(self):
+        """Simulates a single tick of the game with every user's controls, returning an immutable snapshot of the local
+        user's view of the resulting world state, if there is a local user"""
+
+        self.window_age += 1
+        players = list(self.players.values())
+
+        for player in players:
+            self.move_player(player)
+
+        # put the path searches that have finished since last tick to use, before mobs move
+        with profiler.span("apply path results"):
+            path_requests.apply_results()
+        mob_refresh(players, self.window_age)
+
+        for player in players:
+            self.apply_actions(player)
+
+        # autosaves are taken between ticks, so that they never hold a half-finished tick
+        if self.autosaver is not None:
+            with profiler.span("autosave"):
+                self.autosaver.tick(self.window_age)
+
+        if self.user is None:
+            return None
+
+        return self.take_snapshot()
+
+    def move_player(self, player):
+        """Respawns a user if they have died, then moves them by their controls"""
+
+        player.messages.clear()
+
+        # respawn the user if they have died
+        if player.user_health <= 0:
+            player.player_x, player.player_y = WORLD_WIDTH // 2, WORLD_HEIGHT // 2
+            player.user_health = 100
+            player.user_hunger = 100
+            player.red_overlay_opacity = 200
+            item_tax(player)
+
+        # check that the user is not delayed before moving, otherwise wait
+        if player.user_delay == 0:
+            player.player_x, player.player_y, player.direction, player.user_delay = (
+                shift_interface(player.controls, player.player_x, player.player_y, terrain, self.window_age))
+
+            # fade the red tinting that highlights a successful mob attack
+            if player.user_hit > 0:
+                player.user_hit -= 1
+        else:
+            player.user_delay -= 1
+
+    def apply_actions(self, player):
+        """Updates a user's hunger and hotbar selections, then carries out the action they are trying to perform"""
+
+        controls = player.controls
+
+        # simulate hunger behaviour every <HUNGER_INTERVAL> ticks
+        if self.window_age % HUNGER_INTERVAL == 0:
+            player.user_health, player.user_hunger = simulate_hunger(player.user_health, player.user_hunger)
+
+        # update hotbar selections
+        if controls.toolbar_slot is not None:
+            player.selected_toolbar_slot = controls.toolbar_slot
+        if controls.inventory_slot is not None:
+            player.selected_inventory_slot = controls.inventory_slot
+
+        if player.red_overlay_opacity > 0:
+            player.red_overlay_opacity -= 10
+
+        # check if left click is being held down over the world
+        if controls.use and controls.target is not None:
+            action_type = TOOLBAR_ICONS_COORDS[0][player.selected_toolbar_slot]
+
+            if action_type == "sword" or action_type == "axe":
+                user_attack(player, action_type, controls.target)
+            else:
+                gather_terrain(player, action_type, terrain, controls.target)
+
+        # check if the user is trying to perform an action
+        if controls.upgrade:
+            upgrade_tool(player)
+        elif controls.eat:
+            eat_item(player)
+
+    def take_snapshot(self, player=None):
+        """Copies the current game state, as seen by a user (the local user by default), into an immutable snapshot
+        that the render loop can safely draw"""
+
+        if player is None:
+            player = self.user
+        mobs = tuple(MobSnapshot(*values) for values in mob_data.snapshot())
+        others = tuple(PlayerSnapshot(other.player_id, (other.player_x, other.player_y), other.direction,
+                                      other.user_hit) for other in self.players.values() if other is not player)
+
+        return WorldSnapshot(self.window_age, player.player_x, player.player_y, player.direction,
+                             player.user_health, player.user_hunger, player.user_hit, player.selected_toolbar_slot,
+                             player.selected_inventory_slot, tuple(player.toolbar.items()),
+                             tuple(player.inventory.items()), mobs, tuple(player.messages),
+                             player.red_overlay_opacity, others)
+
+
+@profiler.timed("mob_refresh")
+def mob_refresh(players, window_age):
+    """Simulates one tick of mob behaviour for all mobs within any user's window frame view, with each mob reacting to
+    the user closest to it"""
+
+    # check which mobs are within range of each user, in one pass over the position arrays per user, with a mob near
+    # several users only being simulated once
+    slots = []
+    for player in players:
+        nearby_mobs = mob_grid.query((player.player_x - MEDIUM_RANGE, player.player_y - MEDIUM_RANGE,
+                                      2 * MEDIUM_RANGE, 2 * MEDIUM_RANGE))
+        slots += mob_data.in_range([mob.slot for mob in nearby_mobs], player.player_x, player.player_y, MEDIUM_RANGE)
+    slots = list(dict.fromkeys(slots))
+    active_mobs = [mob_list[slot] for slot in slots]
+
+    for mob in mob_data.dead(slots):
+        mob.die()
+
+    # dying mobs free their slots, which moves other mobs into them, so the surviving mobs' slots are looked up again
+    slots = [mob.slot for mob in active_mobs if mob.slot is not None]
+
+    # only mobs within range of a user sprite, with padding, are fully simulated
+    near_slots = []
+    mob_counts = []
+    for player in players:
+        player_near_slots = mob_data.in_range(slots, player.player_x, player.player_y, VIEW_SIZE + 10)
+        mob_counts.append(len(player_near_slots))
+        near_slots += player_near_slots
+    near_slots = list(dict.fromkeys(near_slots))
+    user_width, user_height = get_user_dimensions()
+
+    # attacks are checked every tick, whilst mobs' movement is handed to <mob_scheduler> as think-steps
+    think_steps = []
+    for slot in near_slots:
+        mob = mob_list[slot]
+        mob_x, mob_y = mob.position
+        player, distance = closest_player(players, mob_x, mob_y)
+        player_x, player_y = player.player_x, player.player_y
+
+        # check how a mob should move and whether it should move
+        if mob_data.is_hostile(slot):
+            # if an attacking mob has collided with a user, execute attack protocol
+            mob_width, mob_height = get_sprite_dimensions(mob.mob_type)
+            if intersects([player_x, player_y, user_width, user_height], [mob_x, mob_y, mob_width, mob_height]):
+                player.user_health, player.user_hit = mob.attack(player.user_health, player.user_hit)
+
+            # otherwise move the mob aggressively towards the user if the user is very close, and the mob can see
+            # them (or has already seen them and is chasing), from the middle of its sprite to the user's
+            elif distance < AGGRO_RANGE and (mob.chasing or sightlines.is_visible(
+                    (mob_x + mob_width // 2, mob_y + mob_height // 2),
+                    (player_x + user_width // 2, player_y + user_height // 2))):
+                mob.chasing = True
+                think_steps.append(((0, distance), mob, CHASE_PERIOD,
+                                    functools.partial(mob.move, player_position=(player_x, player_y), passive=False)))
+
+            else:
+                mob.chasing = False
+                think_steps.append(((1, distance), mob, WANDER_PERIOD, functools.partial(wander, mob)))
+        else:
+            think_steps.append(((1, distance), mob, WANDER_PERIOD, mob.move))
+
+    # mobs further away only wander, and less often
+    near_slots = set(near_slots)
+    for slot in slots:
+        if slot not in near_slots:
+            mob = mob_list[slot]
+            distance = closest_player(players, *mob.position)[1]
+            think_steps.append(((2, distance), mob, WANDER_PERIOD * MEDIUM_SLICES, functools.partial(wander, mob)))
+
+    mob_scheduler.run(window_age, think_steps)
+
+    # fade the red tinting that highlights a successful player attack
+    mob_data.decay_hit_timers(slots)
+
+    if window_age % SLEEP_INTERVAL == 0:
+        update_sleeping_mobs(players)
+
+    # make sure that there are not too many mobs generating in each user's proximity (lag + realism issues)
+    for player, mob_count in zip(players, mob_counts):
+        if mob_count < 6:
+            # random chance of a new mob generating each tick, as long as the world isn't full of mobs
+            if random.random() < 0.2 and make_room_for_mob(players):
+                generate_mob(player.player_x, player.player_y)
+
+
+def closest_player(players, x, y):
+    """Returns the user closest to (x, y), and how many points away they are on the furthest axis"""
+
+    return min(((player, max(abs(player.player_x - x), abs(player.player_y - y))) for player in players),
+               key=lambda pair: pair[1])
+
+
+def wander(mob):
+    """Think-step for a mob that wanders without keeping to its last route, e.g. a hostile mob that lost the user"""
+
+    mob.next_movements = None
+    mob.move()
+
+
+@profiler.timed("update_sleeping_mobs")
+def update_sleeping_mobs(players):
+    """Puts mobs that are far from every user to sleep, and wakes up the sleeping mobs in chunks near any user"""
+
+    for mob in mob_data.beyond([(player.player_x, player.player_y) for player in players], SLEEP_RANGE):
+        chunk = (mob.position[0] // MOB_CHUNK_SIZE, mob.position[1] // MOB_CHUNK_SIZE)
+        sleeping_mobs.setdefault(chunk, []).append(mob.sleep())
+
+    # wake every chunk that overlaps a user's medium range, these are all within <SLEEP_RANGE> so stay awake
+    for player in players:
+        player_x, player_y = player.player_x, player.player_y
+        first_cx, first_cy = (player_x - MEDIUM_RANGE) // MOB_CHUNK_SIZE, (player_y - MEDIUM_RANGE) // MOB_CHUNK_SIZE
+        last_cx, last_cy = (player_x + MEDIUM_RANGE) // MOB_CHUNK_SIZE, (player_y + MEDIUM_RANGE) // MOB_CHUNK_SIZE
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                for record in sleeping_mobs.pop((cx, cy), []):
+                    wake_mob(record)
+
+
+def make_room_for_mob(players):
+    """Returns whether a new mob can be added without going over <MOB_CAP>, despawning a sleeping mob from the chunk
+    furthest from any user if needed"""
+
+    if len(mob_list) + sum(len(records) for records in sleeping_mobs.values()) < MOB_CAP:
+        return True
+
+    if not sleeping_mobs:
+        return False
+
+    player_chunks = [(player.player_x // MOB_CHUNK_SIZE, player.player_y // MOB_CHUNK_SIZE) for player in players]
+    furthest_chunk = max(sleeping_mobs, key=lambda chunk: min(max(abs(chunk[0] - player_chunk[0]),
+                                                                  abs(chunk[1] - player_chunk[1]))
+                                                              for player_chunk in player_chunks))
+    sleeping_mobs[furthest_chunk].pop()
+    if not sleeping_mobs[furthest_chunk]:
+        del sleeping_mobs[furthest_chunk]
+
+    return True
+
+
+def wake_mob(record):
+    """Recreates a sleeping mob from the record made by Mob.sleep()"""
+
+    mob_type, position, health, hostile = record
+    mob = spawn_mob(mob_type, position)
+    mob.health = health
+    if isinstance(mob, NeutralMob):
+        mob.hostile = hostile
+
+
+def spawn_mob(mob_type, position):
+    """Creates a new mob of a registered type at a position, which adds it to the world"""
+
+    details = mob_types[mob_type]
+    if details.attack_damage is None:
+        return details.mob_class(position, details.max_health, details.drops, details.movement, mob_type)
+
+    return details.mob_class(position, details.max_health, details.drops, details.movement, mob_type,
+                             details.attack_damage)
+
+
+@profiler.timed("generate_mob")
+def generate_mob(player_x, player_y):
+    """Generates a new mob within a user's window frame view"""
+
+    for attempt in range(SPAWN_ATTEMPTS):
+        # chose random pair of coordinates within window, kept in bounds, to decide the area and biome to spawn in
+        nx = min(WORLD_WIDTH - 1, max(0, player_x + random.randint(-VIEW_SIZE // 2, VIEW_SIZE // 2)))
+        ny = min(WORLD_HEIGHT - 1, max(0, player_y + random.randint(-VIEW_SIZE // 2, VIEW_SIZE // 2)))
+        biome = terrain[ny][nx][1]
+
+        # chose a mob type given the biome, using the spawn chances of the mobs in that biome
+        spawns = biome_spawns[biome]
+        mob_choice_value = random.random()
+        mob_type = next((name for chance, name in spawns if mob_choice_value <= chance), spawns[-1][1])
+
+        # pick a point nearby in the same biome where the new mob's sprite fully fits on land / water
+        details = mob_types[mob_type]
+        spawn_point = spawn_points.sample(spawn_points.chunk_of((nx, ny)), biome, (details.movement, details.footprint))
+        if spawn_point is None:
+            continue
+
+        # check that the point is within the window but not too close to the user, and doesn't overlap any mobs
+        sx, sy = spawn_point
+        if 5 < abs(sx - player_x) <= VIEW_SIZE // 2 and 5 < abs(sy - player_y) <= VIEW_SIZE // 2 and \
+                overlaps(sx, sy, *details.footprint) == 0:
+            spawn_mob(mob_type, spawn_point)
+            return
+
+
+@profiler.timed("shift_interface")
+def shift_interface(controls, player_x, player_y, terrain, window_age):
+    """Updates a player's (x, y) coordinates from the user's controls"""
+
+    # multiple key presses are handled at once for diagonal movement, opposite keys cancel each other out
+    direction = "idle"
+    if controls.move_x < 0 and player_x > 0:
+        player_x -= 1
+        direction = "left"
+    if controls.move_x > 0 and player_x < WORLD_WIDTH - 1 - (USER_ICON_COORDS["horizontal"][2] // POINT_SIZE):
+        player_x += 1
+        direction = "right"
+    if controls.move_y < 0 and player_y > 0:
+        player_y -= 1
+        direction = "up"
+    if controls.move_y > 0 and player_y < WORLD_HEIGHT - 1 - (USER_ICON_COORDS["down"][3] // POINT_SIZE * 2):
+        player_y += 1
+        direction = "down"
+
+    if get_terrain_type(
+            terrain, (player_x, math.ceil(player_y + USER_ICON_COORDS["idle"][3] / POINT_SIZE))) == "water":
+        user_delay = 2
+
+        # ensure synchronisation with mobs
+        if window_age % 2 != 0:
+            user_delay -= 1
+
+    else:
+        user_delay = 0
+
+    return player_x, player_y, direction, user_delay
+
+
+def get_user_dimensions():
+    """Returns the width and height of the user's sprite in points, rounding up"""
+
+    return [math.ceil(length * USER_SCALING / POINT_SIZE) for length in USER_ICON_COORDS["idle"][2:]]
+
+
+def get_sprite_dimensions(mob_type):
+    """A getter for accessing a mob's sprite width and height"""
+
+    return mob_types[mob_type].footprint
+
+
+def register_mob_types():
+    """Works out everything about each type of mob from MOB_STATS, MOB_ICON_COORDS and MOB_BIOMES, storing it in
+    <mob_types> and <biome_spawns> so that nothing needs to be recalculated whilst mobs spawn and move"""
+
+    mob_classes = {"Passive": PassiveMob, "Neutral": NeutralMob, "Aggressive": AggressiveMob}
+
+    for name, stats in MOB_STATS.items():
+        dimensions = MOB_ICON_COORDS[name]["idle"]
+        # for neutral mobs with two skins, just pick the passive one as both have the same dimensions
+        if isinstance(dimensions, dict):
+            dimensions = dimensions[False]
+
+        # adjust for scaling factor and pixel (point) size, rounding up
+        scaling = MOB_ICON_COORDS[name]["scaling"]
+        footprint = (math.ceil(dimensions[2] * scaling / POINT_SIZE), math.ceil(dimensions[3] * scaling / POINT_SIZE))
+        mob_types[name] = MobType(name, mob_classes[stats["behaviour"]], stats["max_health"], stats["drops"],
+                                  stats["movement"], stats.get("attack_damage"), footprint, scaling)
+
+    for biome, spawn_chances in MOB_BIOMES.items():
+        cumulative_chance = 0
+        biome_spawns[biome] = []
+        for name, chance in spawn_chances.items():
+            cumulative_chance += chance
+            biome_spawns[biome].append((cumulative_chance, name))
+
+
+def intersects(sprite1, sprite2):
+    """Determines whether two coordinate boxes intersect with each other, assuming top has a smaller y-value than
+    bottom, using the Separating Axis Theorem"""
+
+    sprite1_top_right = (sprite1[0] + sprite1[2], sprite1[1])
+    sprite1_bottom_left = (sprite1[0], sprite1[1] + sprite1[3])
+    sprite2_top_right = (sprite2[0] + sprite2[2], sprite2[1])
+    sprite2_bottom_left = (sprite2[0], sprite2[1] + sprite2[3])
+
+    result = (sprite1_top_right[0] < sprite2_bottom_left[0] or sprite1_bottom_left[0] > sprite2_top_right[0] or
+                sprite1_top_right[1] > sprite2_bottom_left[1] or sprite1_bottom_left[1] < sprite2_top_right[1])
+
+    return not result
+
+
+def overlaps(nx, ny, sprite_width, sprite_height):
+    """Uses intersects() to determine how many mob sprites a specified object intersects with, only checking the mobs
+    in <mob_grid> buckets near the object"""
+
+    intersections = 0
+    overlapping_mobs = []
+
+    for mob in mob_grid.query((nx, ny, sprite_width, sprite_height)):
+        if intersects([nx, ny, sprite_width, sprite_height], mob_grid.get_box(mob)):
+            intersections += 1
+            overlapping_mobs.append(mob)
+
+    # only occurs when user is attacking mobs
+    if sprite_width == 1:
+        to_return = overlapping_mobs
+    else:
+        to_return = intersections
+
+    return to_return
+
+
+def get_terrain_type(terrain, position):
+    """Given a position in a terrain grid, returns whether that point is land or water"""
+
+    x, y = position
+
+    if terrain[y][x][1] == "ocean":
+        terrain = "water"
+    else:
+        terrain = "land"
+
+    return terrain
+
+
+def post_message(player, text, position):
+    """Queues a help message raised for a user by the simulation, to be drawn with the next published snapshot"""
+
+    player.messages.append((text, position))
+
+
+def user_attack(player, action_type, position):
+    """Procedure that deals with a user mouseclick event, detecting and attack a mob at that location"""
+
+    mouse_x, mouse_y = position
+    overlapping_mobs = overlaps(mouse_x, mouse_y, 1, 1)
+
+    # make upgraded weapons do more damage
+    if player.toolbar[action_type] == "diamond":
+        damage_multiplier = 3
+    elif player.toolbar[action_type] == "iron":
+        damage_multiplier = 2
+    else:
+        damage_multiplier = 1
+
+    for mob in overlapping_mobs:
+        # check whether the attack cooldown is in place
+        if mob.hit == 0:
+            mob.attacker = player
+
+            # affect mob stats differently, dependent on weapon—
+            if action_type == "sword":
+                mob.health -= 20 * damage_multiplier
+                mob.hit = 10
+            else:
+                mob.health -= 30 * damage_multiplier
+                mob.hit = 15
+
+            # make neutral mobs hostile
+            if isinstance(mob, NeutralMob):
+                mob.hostile = True
+
+
+def simulate_hunger(user_health, user_hunger):
+    if user_hunger == 0:
+        user_health -= 1
+    else:
+        user_hunger -= 1
+
+    if user_hunger > 50 and user_health < 100:
+        user_health += 1
+
+    return user_health, user_hunger
+
+
+def eat_item(player):
+    """Protocol for when a user attempts to eat something in their inventory slot"""
+
+    inventory = player.inventory
+    if player.selected_inventory_slot < len(inventory):
+        item = list(inventory.keys())[player.selected_inventory_slot]
+    else:
+        item = None
+
+    if item in food_item_values:
+        if player.user_hunger < 100:
+            player.user_hunger = min(100, player.user_hunger + food_item_values[item])
+            # remove food item from user inventory
+            if inventory[item] == 1:
+                inventory.pop(item)
+            else:
+                inventory[item] -= 1
+        else:
+            post_message(player, "Hunger already full!", (WINDOW_WIDTH // 2 - 85, 100))
+    else:
+        post_message(player, "Item cannot be eaten!", (WINDOW_WIDTH // 2 - 96, 100))
+
+
+def item_tax(player):
+    """Taxes 20% of a user's items when they die"""
+
+    for item, quantity in player.inventory.items():
+        new_quantity = math.ceil(quantity * 0.8)
+        player.inventory[item] = new_quantity
+
+
+def add_to_inventory(player, item, quantity=1):
+    """Adds <quantity> number of <item> to a user's inventory"""
+
+    if item in player.inventory:
+        player.inventory[item] += quantity
+    else:
+        player.inventory[item] = quantity
+
+
+@profiler.timed("gather_terrain")
+def gather_terrain(player, action_type, terrain, position):
+    """Procedure that attempts to gather blocks from the terrain at <position>"""
+
+    x_pos, y_pos = position
+    current_biome = terrain[y_pos][x_pos][1]
+
+    # check whether the user is using the correct tool for the terrain
+    if current_biome in terrain_tool_type[action_type]:
+        if terrain[y_pos][x_pos][4] <= 0:
+            # convert terrain to item to add
+            if current_biome == "desert":
+                item_to_add = "sand"
+            elif current_biome == "forest" or current_biome == "plains":
+                item_to_add = "dirt"
+            else:
+                item_to_add = "stone"
+            add_to_inventory(player, item_to_add, 1)
+            # restore a point's destroyed status to initial value (100)
+            terrain[y_pos][x_pos] = terrain[y_pos][x_pos][:4] + (100,)
+            terrain_changed(position)
+
+        else:
+            # make upgraded tools destroy terrain more quickly
+            if player.toolbar[action_type] == "diamond":
+                destroy_multiplier = 3
+            elif player.toolbar[action_type] == "iron":
+                destroy_multiplier = 2
+            else:
+                destroy_multiplier = 1
+            # partially destroy point
+            terrain[y_pos][x_pos] = terrain[y_pos][x_pos][:4] + (terrain[y_pos][x_pos][4] - 10*destroy_multiplier,)
+
+    else:
+        post_message(player, f"{action_type.capitalize()} cannot destroy {current_biome} ground!",
+                     (WINDOW_WIDTH // 2 - 170, 100))
+
+
+@profiler.timed("terrain_changed")
+def terrain_changed(position):
+    """Tells the navigation grid, chase flow fields, spawn points, sightlines and every mob's path planner that a point
+    in the terrain has changed, so that anything relying on whether the point could be moved or seen through is
+    repaired"""
+
+    sightlines.update_point(*position)
+
+    # changing one point changes where mobs of each size can fit in the area around it, if it changed whether the point
+    # can be moved through at all (digging the ground doesn't)
+    box, changes = navigation_grid.update_point(*position)
+    if box is None:
+        return
+
+    chase_fields.update_area(*box)
+    spawn_points.update_area(*box)
+    for mob in mob_list:
+        if mob.planner is not None:
+            navigation_class = (mob.movement, mob_types[mob.mob_type].footprint)
+            mob.changed_points += navigation_grid.changed_points(navigation_class, changes)
+
+
+def upgrade_tool(player):
+    """Protocol for a user attempting to upgrade a tool, checking whether the user has enough resources"""
+
+    # use the toolbar ordering to see what tool the toolbar slot relates to
+    tool = TOOLBAR_ICONS_COORDS[0][player.selected_toolbar_slot]
+    user_toolbar, user_inventory = player.toolbar, player.inventory
+    tool_material = user_toolbar[tool]
+
+    upgrade_failed = False
+
+    # calculate the type of material needed to upgrade, if already diamond then no upgrade can be done
+    if tool_material == "wood":
+        if "iron" in user_inventory:
+            user_required_material_count = user_inventory["iron"]
+        else:
+            user_required_material_count = 0
+        if user_required_material_count >= 5:
+            user_toolbar[tool] = "iron"
+        else:
+            upgrade_failed = "iron"
+
+    elif tool_material == "iron":
+        if "diamond" in user_inventory:
+            user_required_material_count = user_inventory["diamond"]
+        else:
+            user_required_material_count = 0
+        if user_required_material_count >= 5:
+            user_toolbar[tool] = "diamond"
+        else:
+            upgrade_failed = "diamonds"
+
+    else:
+        post_message(player, f"Tool already fully upgraded!", (WINDOW_WIDTH // 2 - 125, 100))
+        upgrade_failed = None
+
+    if upgrade_failed is False:
+        material_used = user_toolbar[tool]
+        if user_inventory[material_used] == 5:
+            user_inventory.pop(material_used)
+        else:
+            user_inventory[material_used] -= 5
+
+    if upgrade_failed == "diamonds":
+        post_message(player, "More diamonds needed for upgrade!", (WINDOW_WIDTH // 2 - 160, 100))
+    elif upgrade_failed == "iron":
+        post_message(player, "More iron needed for upgrade!", (WINDOW_WIDTH // 2 - 140, 100))
+
+
+def passive_movement(mob_type, position, movement, next_movements, find_movement=False):
+    """Algorithm for a mob that wonders passively"""
+
+    if next_movements is None:
+        if random.randint(1, 15) == 1 or find_movement:
+            direction = random.choice(DIRECTIONS)
+            steps = random.randint(1, 8)
+            next_movements = (direction, steps)
+
+    if next_movements is not None:
+        direction, steps = next_movements
+        dx, dy = direction
+        mob_x, mob_y = position
+        nx, ny = mob_x + dx, mob_y + dy
+        failed = False
+
+        # check whether the whole of the mob's sprite fits on its type of terrain, using the clearance map
+        sprite_width, sprite_height = get_sprite_dimensions(mob_type)
+
+        if navigation_grid.is_passable((movement, mob_types[mob_type].footprint), nx, ny) and \
+                overlaps(nx, ny, sprite_width, sprite_height) < 2:
+            position = (nx, ny)
+            if steps == 1:
+                next_movements = None
+            else:
+                next_movements = (direction, steps - 1)
+        else:
+            failed = True
+
+        if failed:
+            next_movements = None
+
+    return position, next_movements
+
+
+def aggressive_movement(mob, end):
+    """Algorithm for a mob that aggressively pathfinds towards the user, following the shared flow field, or otherwise
+    the path from the mob's own search, which runs on the path service whilst the mob carries on along its last path.
+    A mob without a path holds still until its first search arrives"""
+
+    mob_type, start, next_movements = mob.mob_type, mob.position, mob.next_movements
+    failed = True
+
+    # only points where the whole of the mob's sprite fits on its type of terrain are searched through
+    navigation_class = (mob.movement, mob_types[mob_type].footprint)
+
+    # a mob squeezed somewhere its sprite doesn't fully fit can't be routed anywhere, so it wanders until it is free
+    if not navigation_grid.is_passable(navigation_class, *start):
+        mob.path = []
+        return passive_movement(mob_type, start, mob.movement, None, True)
+
+    # look up the next step in the shared flow field, only searching separately if the field has no route
+    next_step = chase_fields.next_step(navigation_class, start, end)
+    if next_step is not None:
+        path = [next_step]
+        mob.path = []
+    else:
+        with profiler.span("path search"):
+            request_path(mob, navigation_class, start, end)
+        path = mob.path
+
+    if len(path) > 0:
+        sprite_width, sprite_height = get_sprite_dimensions(mob_type)
+        nx, ny = path[0]
+
+        # check whether the whole of the mob's sprite fits on its type of terrain, using the clearance map
+        if max(abs(nx - start[0]), abs(ny - start[1])) == 1 and navigation_grid.is_passable(navigation_class, nx, ny):
+            failed = False
+            if overlaps(nx, ny, sprite_width, sprite_height) < 2:
+                position = path[0]
+                next_movements = path[-1]
+                if mob.path:
+                    mob.path = mob.path[1:]
+            else:
+                # move randomly if other mobs in the way to get out of way, giving up if boxed in
+                next_movements = None
+                attempts = 0
+                while next_movements is None and attempts < len(DIRECTIONS):
+                    position, next_movements = passive_movement(mob_type, start, mob.movement, next_movements, True)
+                    attempts += 1
+        else:
+            # the path no longer leads on from where the mob is, e.g. the terrain changed
+            mob.path = []
+
+    if failed:
+        position = start
+        next_movements = None
+
+    return position, next_movements
+
+
+def request_path(mob, navigation_class, start, end):
+    """Asks the path service for a new path for a mob from <start> towards <end>, unless one is already on its way.
+    The search finds a hierarchical route to the user, e.g. around a lake, and heads for its first waypoint by
+    repairing the mob's own search from last time (a user within <FLOW_FIELD_CORE> points is headed for directly)"""
+
+    key = ("mob path", mob.mob_id)
+    if path_requests.is_pending(key):
+        return
+
+    # the planner is only used by one search at a time, which first catches up with the points that have changed
+    # since the last one
+    if mob.planner is None:
+        mob.planner = pathfinding.IncrementalPlanner(start, WORLD_WIDTH, WORLD_HEIGHT, None,
+                                                     max_expansions=PATH_SEARCH_BUDGET)
+    planner, changed_points = mob.planner, mob.changed_points
+    mob.changed_points = []
+    grid = navigation_grid.snapshot()
+    search_stats = dict()
+
+    def search():
+        planner.is_walkable = grid.walkable_for(grid.is_passable, navigation_class)
+        planner.stats = search_stats
+        for point in changed_points:
+            planner.update_point(point)
+
+        route = grid.find_route(navigation_class, start, end, max_expansions=PATH_SEARCH_BUDGET,
+                                max_chunk_builds=NAVIGATION_CHUNK_BUDGET)
+        if route is None:
+            return []
+
+        return planner.find_path(start, route[0]) or []
+
+    def install(path):
+        path_stats["expansions"] += search_stats.get("expansions", 0)
+
+        # the mob has usually moved on along its last path since the search started, so the new path is picked up
+        # from wherever the mob is on it (a mob off the new path holds still until its next search)
+        position = mob.position if mob.slot is not None else None
+        if position == start:
+            mob.path = path
+        elif position in path:
+            mob.path = path[path.index(position) + 1:]
+        else:
+            mob.path = []
+
+    path_requests.submit(key, search, install)
+
+
+class Mob(abc.ABC):
+    """Abstract bass class for all mobs, whose values that change during a tick are stored in <mob_data> in the mob's
+    slot, rather than on the mob itself"""
+
+    def __init__(self, position, max_health, drops, movement, mob_type, hostile=False):
+        self.max_health = max_health
+        self.drops = drops
+        self.next_movements = None
+        # the mob's own path search (kept between searches so that it can be repaired), the points that have changed
+        # for it since its last search, and the path from its last search that the mob is following
+        self.planner = None
+        self.changed_points = []
+        self.path = []
+        # whether the mob has seen the user and is chasing them, so it doesn't need to keep seeing them
+        self.chasing = False
+        # the user who last attacked the mob, who is given its drops when it dies
+        self.attacker = None
+        self.icon_file = f"{mob_type} sprite.png"
+        self.mob_id = next(mob_ids)
+
+        # a mob is part of the world as soon as it is created
+        self.slot = mob_data.add(self, position, max_health, movement, mob_type, hostile)
+        mob_grid.insert(self, (*position, *get_sprite_dimensions(mob_type)))
+
+    @property
+    def position(self):
+        """The (x, y) coordinates of the top-left of the mob's sprite"""
+
+        return mob_data.x[self.slot], mob_data.y[self.slot]
+
+    @position.setter
+    def position(self, position):
+        mob_data.x[self.slot], mob_data.y[self.slot] = position
+
+        # keep the mob's bucket in <mob_grid> up to date
+        mob_grid.move(self, (*position, *get_sprite_dimensions(self.mob_type)))
+
+    @property
+    def health(self):
+        return mob_data.health[self.slot]
+
+    @health.setter
+    def health(self, health):
+        mob_data.health[self.slot] = health
+
+    @property
+    def hit(self):
+        """The number of ticks left of the mob's red tinting, after being hit by the user"""
+
+        return mob_data.hit[self.slot]
+
+    @hit.setter
+    def hit(self, hit):
+        mob_data.hit[self.slot] = hit
+
+    @property
+    def movement(self):
+        """The type of terrain the mob moves over, either land or water"""
+
+        return mob_store.MOVEMENT_TYPES[mob_data.movement[self.slot]]
+
+    @property
+    def mob_type(self):
+        return mob_data.get_type(self.slot)
+
+    def move(self, player_position=None, passive=True):
+        """Function that changes a mob's position, depending on its hostility and type of terrain travelling over"""
+
+        if passive:
+            self.position, self.next_movements = passive_movement(
+                self.mob_type, self.position, self.movement, self.next_movements)
+
+        else:
+            self.position, self.next_movements = aggressive_movement(self, player_position)
+
+    def die(self):
+        """Procedure that deals with the process of a mob's death"""
+
+        # check if the mob drops something
+        if self.drops is not None and self.attacker is not None:
+            item, quantity = self.drops
+            add_to_inventory(self.attacker, item, quantity)
+
+        # the mob's values are only removed from <mob_data> once, even if the mob dies twice in a tick
+        if self.slot is not None:
+            mob_data.remove(self.slot)
+            self.slot = None
+        mob_grid.remove(self)
+
+    def record(self):
+        """Returns a (mob type, position, health, hostile) record of the mob, that wake_mob() can recreate it from"""
+
+        return self.mob_type, self.position, self.health, mob_data.is_hostile(self.slot)
+
+    def sleep(self):
+        """Removes the mob from the world without it dying, returning its record"""
+
+        record = self.record()
+
+        mob_data.remove(self.slot)
+        self.slot = None
+        mob_grid.remove(self)
+
+        return record
+
+
+class PassiveMob(Mob):
+    """Class for all passive mobs"""
+
+    def __init__(self, position, max_health, drops, movement, mob_type):
+        super().__init__(position, max_health, drops, movement, mob_type)
+
+    def __repr__(self):
+        return f"mob type: {self.mob_type}, position: {self.position}, health: {self.health}, max health: " + \
+            f"{self.max_health}, drops: {self.drops}, movement type: {self.movement}, movement queue: " + \
+            f"{self.next_movements}"
+
+
+class NeutralMob(Mob, MobAttack):
+    """Class for all neutral mobs"""
+
+    def __init__(self, position, max_health, drops, movement, mob_type, attack_damage):
+        super().__init__(position, max_health, drops, movement, mob_type)
+        self.attack_damage = attack_damage
+
+    @property
+    def hostile(self):
+        """Whether the mob is attacking the user, after being provoked"""
+
+        return mob_data.is_hostile(self.slot)
+
+    @hostile.setter
+    def hostile(self, hostile):
+        mob_data.hostile[self.slot] = hostile
+
+    def __repr__(self):
+        return f"mob type: {self.mob_type}, position: {self.position}, health: {self.health}, max health: " + \
+            f"{self.max_health}, drops: {self.drops}, movement type: {self.movement}, movement queue: " + \
+            f"{self.next_movements}, hostile: {self.hostile}, attack damage: {self.attack_damage}"
+
+
+class AggressiveMob(Mob, MobAttack):
+    """Class for all aggressive mobs"""
+
+    def __init__(self, position, max_health, drops, movement, mob_type, attack_damage):
+        super().__init__(position, max_health, drops, movement, mob_type, hostile=True)
+        self.attack_damage = attack_damage
+
+    def __repr__(self):
+        return f"mob type: {self.mob_type}, position: {self.position}, health: {self.health}, max health: " + \
+            f"{self.max_health}, drops: {self.drops}, movement type: {self.movement}, movement queue: " + \
+            f"{self.next_movements}, attack damage: {self.attack_damage}"
+
+
+def build_world_indexes():
+    """Builds everything that is worked out from the terrain, which is rebuilt whenever the terrain is replaced (e.g.
+    by loading a save): where each navigation class fits, chase flow fields, sightlines and spawn points"""
+
+    global navigation_grid, chase_fields, sightlines, spawn_points
+
+    navigation_grid = navigation.NavigationGrid(WORLD_WIDTH, WORLD_HEIGHT, is_walkable, mob_store.MOVEMENT_TYPES,
+                                                MAX_CLEARANCE, NAVIGATION_CHUNK_SIZE)
+    # the chunk graphs are built for every mob's navigation class whilst the world loads, so mobs' route searches
+    # only build the chunks that edits have changed
+    navigation_grid.build_chunk_graphs(sorted({(details.movement, details.footprint)
+                                               for details in mob_types.values()}))
+
+    # one shared flow field per navigation class towards each user, rebuilt only when the user leaves its core
+    chase_fields = flow_field.FlowFieldService(FLOW_FIELD_RADIUS, WORLD_WIDTH, WORLD_HEIGHT,
+                                               navigation_grid.passable_row, path_requests, snapshot_walkable,
+                                               lambda: navigation_grid.version, FLOW_FIELD_CORE, FLOW_FIELD_CACHE_SIZE)
+    sightlines = line_of_sight.LineOfSight(WORLD_WIDTH, WORLD_HEIGHT, is_occluder, SIGHTLINE_CACHE_SIZE)
+
+    # the spawn index lists where each mob type can spawn, so it can only be built once the mob types are registered
+    spawn_points = spawn_index.SpawnIndex(
+        WORLD_WIDTH, WORLD_HEIGHT, SPAWN_CHUNK_SIZE, lambda x, y: terrain[y][x][1], navigation_grid.is_passable,
+        {biome: sorted({(mob_types[mob_type].movement, mob_types[mob_type].footprint) for mob_type in spawn_chances})
+         for biome, spawn_chances in MOB_BIOMES.items()})
+
+
+def take_save_data(simulation):
+    """Returns a copy of the terrain, every mob (awake or asleep), and the local user's state and items, which is never
+    changed afterwards, so can be saved on another thread. The terrain is a copy-on-write snapshot, so this is cheap"""
+
+    mobs = [mob.record() for mob in mob_list] + [record for records in sleeping_mobs.values() for record in records]
+    user = simulation.user
+    player = world_save.PlayerRecord(user.player_x, user.player_y, user.user_health, user.user_hunger,
+                                     simulation.window_age, user.selected_toolbar_slot, user.selected_inventory_slot)
+
+    return world_save.SaveData(terrain.snapshot(), player, mobs, dict(user.inventory), dict(user.toolbar))
+
+
+def save_game(path, simulation):
+    """Saves the terrain, every mob (awake or asleep), and the user's state and items to a save file"""
+
+    world_save.save(path, take_save_data(simulation))
+
+
+def generate_base(seed, parameters):
+    """Generates the base terrain of a saved world from its seed and (width, height, spacing), reusing the current
+    world's base if it is the same world"""
+
+    if isinstance(terrain, terrain_overlay.OverlayTerrain) and (terrain.seed, terrain.parameters) == (seed, parameters):
+        return terrain.base
+
+    return terrain_gen.generate(*parameters, TERRAIN_ICON_COORDS, POINT_SIZE, seed)
+
+
+def read_save(path):
+    """Reads a save file, checking that its world is the right size"""
+
+    save_data = world_save.load(path, generate_base)
+    if (len(save_data.terrain[0]), len(save_data.terrain)) != (WORLD_WIDTH, WORLD_HEIGHT):
+        raise world_save.SaveError(f"'{path}' is not a {WORLD_WIDTH} x {WORLD_HEIGHT} world")
+
+    return save_data
+
+
+def load_game(path, simulation):
+    """Replaces the terrain, every mob, and the user's state and items with those from a save file, whilst the
+    simulation is not ticking"""
+
+    global terrain
+
+    save_data = read_save(path)
+    terrain = save_data.terrain
+    build_world_indexes()
+    apply_save_data(save_data, simulation)
+
+
+def apply_save_data(save_data, simulation):
+    """Replaces every mob, and the user's state and items with those from a save, once its terrain is in use"""
+
+    # every mob is woken up, then the ones far from the user are put back to sleep as usual
+    for mob in list(mob_list):
+        mob.sleep()
+    sleeping_mobs.clear()
+    for record in save_data.mobs:
+        wake_mob(record)
+
+    user = simulation.user
+    user.inventory = dict(save_data.inventory)
+    user.toolbar = dict(save_data.toolbar)
+
+    player = save_data.player
+    user.player_x, user.player_y = player.x, player.y
+    user.user_health, user.user_hunger = player.health, player.hunger
+    simulation.window_age = player.window_age
+    user.selected_toolbar_slot, user.selected_inventory_slot = player.toolbar_slot, player.inventory_slot
+    simulation.snapshots.publish(simulation.take_snapshot())
+
+
+# the mob classes are needed by the registry, so it can only be filled in once they are defined
+register_mob_types()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the game's simulation as fast as possible, without a display")
+    parser.add_argument("--ticks", type=int, default=10000, help="number of ticks to soak test for")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the world and the user's wandering")
+    parser.add_argument("--replay", default=None, help="recorded session to play back instead of soak testing")
+    parser.add_argument("--profile", default=None,
+                        help="file to write the profile to, as a Chrome trace (.json) or CSV file")
+    arguments = parser.parse_args()
+
+    if arguments.replay is not None:
+        replay_headless(arguments.replay, arguments.profile)
+    else:
+        soak_test(arguments.ticks, arguments.seed, arguments.profile)
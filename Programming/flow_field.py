@@ -0,0 +1,253 @@
+import heapq
+
+import pathfinding
+
+
+class FlowField:
+    """Dijkstra map for a single target and movement class, storing for every point within <radius> of the target the
+    cost of reaching the target and the next point to step to on the way there"""
+
+    def __init__(self, target, radius, world_width, world_height, walkable_row, stats=None):
+        self.target = target
+
+        # the field only covers a square window around the target, clipped to the world
+        self.x_start, self.y_start = max(0, target[0] - radius), max(0, target[1] - radius)
+        self.x_end = min(world_width, target[0] + radius + 1)
+        self.y_end = min(world_height, target[1] + radius + 1)
+        self.width = self.x_end - self.x_start
+
+        # points are stored with a border of one unwalkable point all the way round the window, so that searching
+        # from a point never has to check whether its neighbours are inside the window
+        self.padded_width = self.width + 2
+        size = self.padded_width * (self.y_end - self.y_start + 2)
+        self.costs = [float("inf")] * size
+        # the index of the next point to step to from each point
+        self.next_steps = [None] * size
+
+        self.build(walkable_row, stats)
+
+    def index(self, position):
+        """Converts a world position to its index in the field, or None if it is outside of the field"""
+
+        x, y = position
+        if self.x_start <= x < self.x_end and self.y_start <= y < self.y_end:
+            return (y - self.y_start + 1) * self.padded_width + (x - self.x_start + 1)
+
+        return None
+
+    def position(self, index):
+        """Converts an index in the field back to its world position"""
+
+        return self.x_start + index % self.padded_width - 1, self.y_start + index // self.padded_width - 1
+
+    def build(self, walkable_row, stats):
+        """Runs Dijkstra's algorithm outwards from the target, so that each point's next step leads back towards it,
+        given walkable_row(x, y, length) for whether each point along a row is walkable (as bytes of 0 or 1). The target
+        itself is always included, even if the target is not walkable for this movement class"""
+
+        padded_width = self.padded_width
+
+        # look up walkability a row at a time, then work on flat indexes rather than (x, y) tuples
+        walkable = bytearray(len(self.costs))
+        for y in range(self.y_start, self.y_end):
+            row_start = self.index((self.x_start, y))
+            walkable[row_start:row_start + self.width] = walkable_row(self.x_start, y, self.width)
+        # kept so that changes to the grid can be checked against what the field was built from
+        self.walkable = walkable
+        costs, next_steps = self.costs, self.next_steps
+        moves = [(dy * padded_width + dx, pathfinding.DIAGONAL_COST if dx and dy else 1)
+                 for dx, dy in pathfinding.EIGHT_DIRECTIONS]
+
+        target_index = self.index(self.target)
+        costs[target_index] = 0
+        # the closed set starts with every unwalkable point (including the border) in it, apart from the target
+        closed_set = bytearray(not point_walkable for point_walkable in walkable)
+        closed_set[target_index] = 0
+        open_set = [(0, target_index)]
+        heappop, heappush = heapq.heappop, heapq.heappush
+        expansions = 0
+
+        while open_set:
+            current_cost, current_index = heappop(open_set)
+            if closed_set[current_index]:
+                continue
+            closed_set[current_index] = 1
+            expansions += 1
+
+            for index_offset, move_cost in moves:
+                neighbour_index = current_index + index_offset
+                if closed_set[neighbour_index]:
+                    continue
+
+                # moves are symmetrical, so the cost from the neighbour back to this point is the same
+                new_cost = current_cost + move_cost
+                if new_cost < costs[neighbour_index]:
+                    costs[neighbour_index] = new_cost
+                    next_steps[neighbour_index] = current_index
+                    heappush(open_set, (new_cost, neighbour_index))
+
+        if stats is not None:
+            stats["expansions"] = stats.get("expansions", 0) + expansions
+
+    def next_step(self, position):
+        """Returns the point to move to from <position> to get closer to the target, or None if the target cannot be
+        reached from <position> within the field"""
+
+        position_index = self.index(position)
+        if position_index is None or self.next_steps[position_index] is None:
+            return None
+
+        return self.position(self.next_steps[position_index])
+
+
+def rows_of(is_walkable):
+    """Returns a walkable_row(x, y, length) function for a flow field, from an is_walkable(x, y) function"""
+
+    def walkable_row(x, y, length):
+        return bytes(is_walkable(x_pos, y) for x_pos in range(x, x + length))
+
+    return walkable_row
+
+
+class FlowFieldService:
+    """Shares flow fields between every mob chasing the same target, so that the cost of chasing stays flat no matter
+    how many mobs are chasing. One field is kept per movement class and target (e.g. each user on a server), up to
+    <max_fields> fields, least recently used first out.
+
+    A field is only rebuilt once its target leaves the field's core, the square within <core_radius> points of where
+    the target was when it was built. Until then mobs outside of the core follow the field towards the core, whilst
+    mobs inside it are given no step, so they search their own way to where the target is now.
+
+    Given a PathService, fields are built on its workers from a read-only copy of the world's walkability (a
+    walkable_row() function from <snapshot_walkable()>), and mobs are given no step (so search their own way) until it arrives. A field is thrown
+    away when it arrives if <grid_version()> has changed since it was asked for, as it was searched in an out of date
+    world"""
+
+    def __init__(self, radius, world_width, world_height, walkable_row, path_requests=None, snapshot_walkable=None,
+                 grid_version=None, core_radius=0, max_fields=8):
+        self.radius = radius
+        self.core_radius = core_radius
+        self.max_fields = max_fields
+        self.world_width, self.world_height = world_width, world_height
+
+        # walkable_row(movement, x, y, length) decides which points along a row each movement class (e.g. land mobs of a
+        # certain size) can move through, as bytes of 0 or 1
+        self.walkable_row = walkable_row
+        self.path_requests = path_requests
+        self.snapshot_walkable = snapshot_walkable
+        self.grid_version = grid_version
+        # (movement, target) -> field, in order of last use
+        self.fields = dict()
+        # (movement, target) of the fields that are on their way from the path service
+        self.requested = set()
+        self.stats = {"expansions": 0, "builds": 0, "evictions": 0}
+
+    def in_core(self, centre, position):
+        return max(abs(position[0] - centre[0]), abs(position[1] - centre[1])) <= self.core_radius
+
+    def find_field(self, movement, target):
+        """Returns the field for a movement class whose core <target> is in, preferring one built towards <target>
+        itself, or None if there isn't one"""
+
+        key = (movement, target)
+        if key not in self.fields:
+            key = next((key for key in self.fields if key[0] == movement and self.in_core(key[1], target)), None)
+            if key is None:
+                return None
+
+        # move the field to the end, as the most recently used
+        field = self.fields.pop(key)
+        self.fields[key] = field
+
+        return field
+
+    def add_field(self, movement, field):
+        """Keeps a newly built field, replacing any older field towards the same target, or otherwise making room for
+        it by throwing away the least recently used field"""
+
+        key = (movement, field.target)
+        if self.fields.pop(key, None) is None and len(self.fields) >= self.max_fields:
+            del self.fields[next(iter(self.fields))]
+            self.stats["evictions"] += 1
+
+        self.fields[key] = field
+        self.stats["builds"] += 1
+
+    def get_field(self, movement, target):
+        """Returns the flow field towards <target> (or a point whose core it is in) for a movement class, building it
+        if there isn't one"""
+
+        field = self.find_field(movement, target)
+        if field is None:
+            def walkable_row(x, y, length):
+                return self.walkable_row(movement, x, y, length)
+
+            field = FlowField(target, self.radius, self.world_width, self.world_height, walkable_row, self.stats)
+            self.add_field(movement, field)
+
+        return field
+
+    def request_field(self, movement, target):
+        """Asks the path service for a flow field towards <target> for a movement class, unless one whose core
+        <target> is in is already on its way"""
+
+        if any(key[0] == movement and self.in_core(key[1], target) for key in self.requested):
+            return
+        key = (movement, target)
+        self.requested.add(key)
+
+        walkable = self.snapshot_walkable()
+        version = self.grid_version()
+        build_stats = dict()
+
+        def walkable_row(x, y, length):
+            return walkable(movement, x, y, length)
+
+        def build():
+            return FlowField(target, self.radius, self.world_width, self.world_height, walkable_row, build_stats)
+
+        def install(field):
+            self.requested.discard(key)
+            self.stats["expansions"] += build_stats.get("expansions", 0)
+
+            # a field searched before the world last changed is out of date
+            if version == self.grid_version():
+                self.add_field(movement, field)
+
+        self.path_requests.submit(key, build, install)
+
+    def next_step(self, movement, position, target):
+        """Returns the next point for a mob of a movement class at <position> to step to when chasing <target>, or
+        None if the target cannot be reached within the field's radius, or the mob is in the core of a field built
+        towards where the target was"""
+
+        if self.path_requests is None:
+            field = self.get_field(movement, target)
+        else:
+            field = self.find_field(movement, target)
+            if field is None:
+                self.request_field(movement, target)
+                return None
+
+        # a field built towards where the target was leads to the wrong place once the mob is in its core
+        if field.target != target and self.in_core(field.target, position):
+            return None
+
+        return field.next_step(position)
+
+    def update_area(self, x, y, width, height):
+        """Throws away any field built when a point in an area of the world was walkable and now isn't, or the other
+        way round, so that it is rebuilt next time it is needed"""
+
+        for key, field in list(self.fields.items()):
+            movement = key[0]
+            # only the part of the area inside the field is compared, a row at a time
+            x_start, x_end = max(x, field.x_start), min(x + width, field.x_end)
+            if x_start >= x_end:
+                continue
+            for y_pos in range(max(y, field.y_start), min(y + height, field.y_end)):
+                row_start = field.index((x_start, y_pos))
+                if field.walkable[row_start:row_start + x_end - x_start] != \
+                        self.walkable_row(movement, x_start, y_pos, x_end - x_start):
+                    del self.fields[key]
+                    break
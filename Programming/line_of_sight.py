@@ -0,0 +1,65 @@
+class LineOfSight:
+    """Line of sight queries between points of the world, over a bitmap of the points that block sight (e.g. trees
+    and cacti), with the result for each (from, to) pair of points cached until the bitmap changes"""
+
+    def __init__(self, width, height, is_occluder, cache_size):
+        self.width, self.height = width, height
+        self.is_occluder = is_occluder
+        self.cache_size = cache_size
+
+        self.occluders = bytearray(is_occluder(x, y) for y in range(height) for x in range(width))
+        # (from point, to point) -> whether there is a line of sight between them
+        self.cache = dict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def update_point(self, x, y):
+        """Rechecks whether a point blocks sight after the terrain has changed, throwing away the cache if it
+        changed"""
+
+        occluder = self.is_occluder(x, y)
+        if self.occluders[y * self.width + x] != occluder:
+            self.occluders[y * self.width + x] = occluder
+            self.cache.clear()
+
+    def is_visible(self, start, end):
+        """Returns whether there is a line of sight from <start> to <end>, that is no point that blocks sight on the
+        line between them (not counting the points themselves)"""
+
+        key = (start, end)
+        if key in self.cache:
+            self.stats["hits"] += 1
+            return self.cache[key]
+
+        self.stats["misses"] += 1
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+
+        visible = self.trace(start, end)
+        self.cache[key] = visible
+
+        return visible
+
+    def trace(self, start, end):
+        """Walks along the line from <start> to <end> with Bresenham's algorithm, checking for points that block
+        sight"""
+
+        x, y = start
+        end_x, end_y = end
+        dx, dy = abs(end_x - x), -abs(end_y - y)
+        step_x, step_y = (1 if end_x > x else -1), (1 if end_y > y else -1)
+        error = dx + dy
+        width, occluders = self.width, self.occluders
+
+        while (x, y) != (end_x, end_y):
+            double_error = 2 * error
+            if double_error >= dy:
+                error += dy
+                x += step_x
+            if double_error <= dx:
+                error += dx
+                y += step_y
+
+            if (x, y) != (end_x, end_y) and occluders[y * width + x]:
+                return False
+
+        return True
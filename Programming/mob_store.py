@@ -0,0 +1,110 @@
+import array
+
+
+MOVEMENT_TYPES = ["land", "water"]
+
+
+class MobStore:
+    """Data-oriented storage for every mob in the world, keeping each per-mob value that changes during a tick in its
+    own parallel array (one slot per mob), so that the values are stored compactly and can be read for a snapshot in
+    one pass. Mob objects are thin views onto a slot, kept in the <mobs> list in the same order as the arrays.
+
+    Without numpy, the queries over many slots (e.g. in_range()) are plain Python loops over the arrays rather than
+    batched operations, each making a single pass over the slots it is given"""
+
+    def __init__(self, mob_types):
+        # mob types and movement types are stored as small integer ids
+        self.mob_types = list(mob_types)
+        self.type_ids = {mob_type: type_id for type_id, mob_type in enumerate(self.mob_types)}
+
+        self.x = array.array("i")
+        self.y = array.array("i")
+        self.health = array.array("i")
+        self.hit = array.array("i")
+        self.hostile = array.array("b")
+        self.movement = array.array("b")
+        self.type_id = array.array("h")
+        self.mobs = []
+
+    def __len__(self):
+        return len(self.mobs)
+
+    def add(self, mob, position, health, movement, mob_type, hostile):
+        """Allocates a new slot at the end of the arrays for a mob view, returning the slot"""
+
+        self.x.append(position[0])
+        self.y.append(position[1])
+        self.health.append(health)
+        self.hit.append(0)
+        self.hostile.append(hostile)
+        self.movement.append(MOVEMENT_TYPES.index(movement))
+        self.type_id.append(self.type_ids[mob_type])
+        self.mobs.append(mob)
+
+        return len(self.mobs) - 1
+
+    def remove(self, slot):
+        """Frees a slot by moving the last mob into it, so that the arrays stay packed, telling the moved view about
+        its new slot"""
+
+        last = len(self.mobs) - 1
+        for values in (self.x, self.y, self.health, self.hit, self.hostile, self.movement, self.type_id, self.mobs):
+            values[slot] = values[last]
+            values.pop()
+
+        if slot != last:
+            self.mobs[slot].slot = slot
+
+    def in_range(self, slots, x, y, distance):
+        """Returns the slots (from <slots>) of the mobs less than <distance> points away from (x, y) on both axes"""
+
+        xs, ys = self.x, self.y
+        return [slot for slot in slots if abs(xs[slot] - x) < distance and abs(ys[slot] - y) < distance]
+
+    def beyond(self, positions, distance):
+        """Returns the mob views at least <distance> points away from every (x, y) in <positions> on either axis, out of
+        every mob"""
+
+        # a mob is near a position if it is inside the square around it, so each mob is checked against the squares
+        # rather than working out its distance from each position
+        squares = [(x - distance, x + distance, y - distance, y + distance) for x, y in positions]
+        mobs = []
+        for mob, mob_x, mob_y in zip(self.mobs, self.x, self.y):
+            for x_min, x_max, y_min, y_max in squares:
+                if x_min < mob_x < x_max and y_min < mob_y < y_max:
+                    break
+            else:
+                mobs.append(mob)
+
+        return mobs
+
+    def dead(self, slots):
+        """Returns the mob views (from <slots>) whose health has fallen below zero"""
+
+        health, mobs = self.health, self.mobs
+        return [mobs[slot] for slot in slots if health[slot] < 0]
+
+    def decay_hit_timers(self, slots):
+        """Counts down the attack cooldown / red tinting timer of every mob in <slots>"""
+
+        hit = self.hit
+        for slot in slots:
+            if hit[slot] > 0:
+                hit[slot] -= 1
+
+    def is_hostile(self, slot):
+        """Returns whether the mob in a slot is currently attacking the user"""
+
+        return self.hostile[slot] == 1
+
+    def get_type(self, slot):
+        """Returns the type name (e.g. "zombie") of the mob in a slot"""
+
+        return self.mob_types[self.type_id[slot]]
+
+    def snapshot(self):
+        """Returns a (mob type, position, hostile, hit) tuple for every mob, read straight from the arrays"""
+
+        mob_types = self.mob_types
+        return tuple((mob_types[type_id], (x, y), hostile == 1, hit)
+                     for type_id, x, y, hostile, hit in zip(self.type_id, self.x, self.y, self.hostile, self.hit))
@@ -0,0 +1,404 @@
+import copy
+import heapq
+import math
+
+import clearance
+import pathfinding
+
+
+# swaps 0 and 1 bytes, to turn which points are walkable into which points are closed to a search
+FLIP_BYTES = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+# a stretch of a chunk's border this long is given an entrance at each end rather than one in the middle, so that
+# routes along or across wide openings aren't pulled towards their middles
+LONG_STRETCH = 6
+
+
+class NavigationGrid:
+    """Hierarchical pathfinding (HPA*) over the world for each navigation class, which is a (movement type, footprint)
+    pair, e.g. ("land", (8, 6)) for a mob on land whose sprite needs an 8 x 6 rectangle of free points.
+
+    The world is split into square chunks. The points where a navigation class can cross between neighbouring chunks
+    (entrances) form an abstract graph, with edges between the entrances of a chunk costing the length of the shortest
+    path between them inside that chunk. Each chunk's part of the graph is only built the first time a search reaches
+    it, then kept until the terrain in or next to the chunk changes. A search finds a route through the abstract graph
+    first, which is only refined into a path between points one stretch at a time, as it is needed"""
+
+    def __init__(self, world_width, world_height, is_walkable, movement_types, max_clearance, chunk_size):
+        self.world_width, self.world_height = world_width, world_height
+        self.chunk_size = chunk_size
+        self.clearance_maps = {movement: clearance.ClearanceMap(world_width, world_height,
+                                                                 self.walkable_for(is_walkable, movement),
+                                                                 max_clearance)
+                               for movement in movement_types}
+
+        # (navigation class, chunk) -> (passable points of the chunk, abstract graph edges from each entrance)
+        self.chunk_graphs = dict()
+        self.stats = {"expansions": 0, "chunk builds": 0}
+        # counts the changes to the grid, so that searches of a snapshot can tell whether it is out of date
+        self.version = 0
+        self.current_snapshot = None
+
+    @staticmethod
+    def walkable_for(is_walkable, movement):
+        """Returns an is_walkable(x, y) function for a single movement type"""
+
+        def walkable(x, y):
+            return is_walkable(movement, x, y)
+
+        return walkable
+
+    def snapshot(self):
+        """Returns a read-only copy of the grid as it is now, with its own copy of the chunk graphs built so far, so that
+        other threads can search it whilst this grid changes. The same copy is returned until the grid changes"""
+
+        if self.current_snapshot is None:
+            self.current_snapshot = copy.copy(self)
+            self.current_snapshot.clearance_maps = {movement: clearance_map.snapshot()
+                                                    for movement, clearance_map in self.clearance_maps.items()}
+            self.current_snapshot.chunk_graphs = dict(self.chunk_graphs)
+            self.current_snapshot.stats = {"expansions": 0, "chunk builds": 0}
+
+        return self.current_snapshot
+
+    def is_passable(self, navigation_class, x, y):
+        """Returns whether a mob of a navigation class can have the top-left corner of its sprite at (x, y)"""
+
+        movement, (width, height) = navigation_class
+        return self.clearance_maps[movement].fits_rectangle(x, y, width, height)
+
+    def passable_row(self, navigation_class, x, y, length):
+        """Returns whether a mob of a navigation class can have the top-left corner of its sprite at each of <length>
+        points along a row from (x, y), as bytes of 0 or 1"""
+
+        movement, (width, height) = navigation_class
+        return self.clearance_maps[movement].fits_row(x, y, length, width, height)
+
+    def chunk_of(self, point):
+        return point[0] // self.chunk_size, point[1] // self.chunk_size
+
+    def chunk_bounds(self, chunk):
+        """Returns the (x_start, y_start, x_end, y_end) points of a chunk, with the ends exclusive"""
+
+        x_start, y_start = chunk[0] * self.chunk_size, chunk[1] * self.chunk_size
+        return (x_start, y_start, min(self.world_width, x_start + self.chunk_size),
+                min(self.world_height, y_start + self.chunk_size))
+
+    def border_crossings(self, navigation_class, chunk):
+        """Returns a (point inside the chunk, point in the neighbouring chunk) pair for each entrance of a chunk - one
+        in the middle of each unbroken stretch of its borders that can be crossed, or one at each end of a stretch at
+        least <LONG_STRETCH> points long"""
+
+        x_start, y_start, x_end, y_end = self.chunk_bounds(chunk)
+        # each border as the points along the chunk's edge, and the step out of the chunk from them
+        borders = [([(x_end - 1, y) for y in range(y_start, y_end)], (1, 0)),
+                   ([(x_start, y) for y in range(y_start, y_end)], (-1, 0)),
+                   ([(x, y_end - 1) for x in range(x_start, x_end)], (0, 1)),
+                   ([(x, y_start) for x in range(x_start, x_end)], (0, -1))]
+
+        crossings = []
+        for edge, (dx, dy) in borders:
+            stretch = []
+            for x, y in edge + [(None, None)]:
+                if x is not None and self.is_passable(navigation_class, x, y) and \
+                        self.is_passable(navigation_class, x + dx, y + dy):
+                    stretch.append((x, y))
+                elif stretch:
+                    if len(stretch) >= LONG_STRETCH:
+                        entrances = [stretch[0], stretch[-1]]
+                    else:
+                        entrances = [stretch[len(stretch) // 2]]
+                    for x_inside, y_inside in entrances:
+                        crossings.append(((x_inside, y_inside), (x_inside + dx, y_inside + dy)))
+                    stretch = []
+
+        return crossings
+
+    def get_chunk_graph(self, navigation_class, chunk):
+        """Returns the passable points of a chunk (as from chunk_walkable()), and the abstract graph edges (as
+        (entrance, cost) pairs) from each of the chunk's entrances, building them if needed"""
+
+        key = (navigation_class, chunk)
+        if key not in self.chunk_graphs:
+            walkable = self.chunk_walkable(navigation_class, chunk)
+
+            crossings = self.border_crossings(navigation_class, chunk)
+            edges = {inside: [] for inside, outside in crossings}
+            for inside, outside in crossings:
+                edges[inside].append((outside, 1))
+
+            # connect each entrance to the others that can be reached without leaving the chunk
+            for entrance in edges:
+                others = [other_entrance for other_entrance in edges if other_entrance != entrance]
+                costs = self.search_chunk(chunk, walkable, entrance, others)[0]
+                edges[entrance] += costs.items()
+
+            self.chunk_graphs[key] = (walkable, edges)
+            self.stats["chunk builds"] += 1
+
+        return self.chunk_graphs[key]
+
+    def build_chunk_graphs(self, navigation_classes):
+        """Builds the graph of every chunk for each navigation class up front (e.g. whilst the world loads), so that
+        searches only have to build the chunks that the terrain has changed in since"""
+
+        chunks_across = math.ceil(self.world_width / self.chunk_size)
+        chunks_down = math.ceil(self.world_height / self.chunk_size)
+        for navigation_class in navigation_classes:
+            for cy in range(chunks_down):
+                for cx in range(chunks_across):
+                    self.get_chunk_graph(navigation_class, (cx, cy))
+
+    def chunk_walkable(self, navigation_class, chunk):
+        """Returns whether a navigation class can pass each point of a chunk, as a flat bytearray of the chunk's
+        points with a border of one unwalkable point all the way round (as flow fields store them), so that searching
+        from a point never has to check whether its neighbours are inside the chunk"""
+
+        x_start, y_start, x_end, y_end = self.chunk_bounds(chunk)
+        padded_width = x_end - x_start + 2
+        walkable = bytearray(padded_width * (y_end - y_start + 2))
+        for y in range(y_start, y_end):
+            row_start = (y - y_start + 1) * padded_width + 1
+            walkable[row_start:row_start + x_end - x_start] = self.passable_row(navigation_class, x_start, y,
+                                                                                x_end - x_start)
+
+        return walkable
+
+    def search_chunk(self, chunk, walkable, source, targets, extra=None):
+        """Runs Dijkstra's algorithm from a point through a chunk's passable points (as from chunk_walkable()) until
+        every point in <targets> is reached, returning the cost of reaching each target that can be reached, and the
+        index of the point each point was reached from (as a flat list, for following back with chunk_path()). The
+        source itself, and an <extra> point, do not need to be passable"""
+
+        x_start, y_start, x_end, y_end = self.chunk_bounds(chunk)
+        padded_width = x_end - x_start + 2
+
+        def index_of(point):
+            return (point[1] - y_start + 1) * padded_width + point[0] - x_start + 1
+
+        # the closed set starts with every unwalkable point (including the border) in it, apart from the source
+        closed_set = walkable.translate(FLIP_BYTES)
+        if extra is not None:
+            closed_set[index_of(extra)] = 0
+        source_index = index_of(source)
+        closed_set[source_index] = 0
+
+        costs = [math.inf] * len(walkable)
+        costs[source_index] = 0
+        parents = [None] * len(walkable)
+        remaining = {index_of(target): target for target in targets}
+        target_costs = dict()
+        moves = [(dy * padded_width + dx, pathfinding.DIAGONAL_COST if dx and dy else 1)
+                 for dx, dy in pathfinding.EIGHT_DIRECTIONS]
+        open_set = [(0, source_index)]
+        heappop, heappush = heapq.heappop, heapq.heappush
+        expansions = 0
+
+        while open_set and remaining:
+            current_cost, current_index = heappop(open_set)
+            if closed_set[current_index]:
+                continue
+            closed_set[current_index] = 1
+            expansions += 1
+
+            if current_index in remaining:
+                target_costs[remaining.pop(current_index)] = current_cost
+
+            for index_offset, move_cost in moves:
+                neighbour_index = current_index + index_offset
+                if closed_set[neighbour_index]:
+                    continue
+
+                new_cost = current_cost + move_cost
+                if new_cost < costs[neighbour_index]:
+                    costs[neighbour_index] = new_cost
+                    parents[neighbour_index] = current_index
+                    heappush(open_set, (new_cost, neighbour_index))
+
+        self.stats["expansions"] += expansions
+        return target_costs, parents
+
+    def chunk_path(self, chunk, parents, source, target):
+        """Follows the points that a chunk search (from search_chunk()) reached each point from back from <target> to
+        <source>, returning the path between them (excluding the source)"""
+
+        x_start, y_start, x_end, y_end = self.chunk_bounds(chunk)
+        padded_width = x_end - x_start + 2
+        source_index = (source[1] - y_start + 1) * padded_width + source[0] - x_start + 1
+        current_index = (target[1] - y_start + 1) * padded_width + target[0] - x_start + 1
+
+        path = []
+        while current_index != source_index:
+            path.append((x_start + current_index % padded_width - 1, y_start + current_index // padded_width - 1))
+            current_index = parents[current_index]
+
+        return list(reversed(path))
+
+    def find_route(self, navigation_class, start, goal, max_expansions=None, max_chunk_builds=None):
+        """Searches the abstract graph for the cheapest route from <start> to <goal>, returning the entrances it passes
+        through followed by the goal (excluding the start), or None if there is no route. The goal itself does not
+        need to be passable, as mobs chase the user rather than stand on them.
+
+        Building chunk graphs is the slowest part of a search, so if a search needs more than <max_chunk_builds> new
+        chunks it gives up (returning None), keeping the chunks it did build so that the next search gets further"""
+
+        if not self.is_passable(navigation_class, *start):
+            return None
+
+        start_chunk, goal_chunk = self.chunk_of(start), self.chunk_of(goal)
+        start_walkable, start_edges = self.get_chunk_graph(navigation_class, start_chunk)
+        goal_walkable, goal_edges = self.get_chunk_graph(navigation_class, goal_chunk)
+
+        # temporarily link the start and goal to the entrances of their chunks (moves are symmetrical, so searching
+        # outwards from the goal gives the costs of reaching it)
+        if start_chunk == goal_chunk:
+            start_costs = self.search_chunk(start_chunk, start_walkable, start, list(start_edges) + [goal], goal)[0]
+        else:
+            start_costs = self.search_chunk(start_chunk, start_walkable, start, list(start_edges))[0]
+        goal_costs = self.search_chunk(goal_chunk, goal_walkable, goal, list(goal_edges))[0]
+
+        # if the start or goal is shut in within its chunk, the abstract graph doesn't need searching at all
+        if start_chunk != goal_chunk and (not any(entrance in start_costs for entrance in start_edges) or
+                                          not any(entrance in goal_costs for entrance in goal_edges)):
+            return None
+
+        def neighbours(node):
+            if node == start:
+                node_edges = [(entrance, start_costs[entrance]) for entrance in start_edges
+                              if entrance != start and entrance in start_costs] + start_edges.get(start, [])
+                if start_chunk == goal_chunk and goal in start_costs:
+                    node_edges.append((goal, start_costs[goal]))
+                return node_edges
+
+            node_edges = list(self.get_chunk_graph(navigation_class, self.chunk_of(node))[1].get(node, []))
+            if self.chunk_of(node) == goal_chunk and node in goal_costs:
+                node_edges.append((goal, goal_costs[node]))
+            return node_edges
+
+        open_set = pathfinding.PriorityQueue()
+        open_set.enqueue(start, pathfinding.octile_distance(start, goal))
+        closed_set = set()
+        path = dict()
+        gScore = {start: 0}
+        expansions = 0
+
+        while not open_set.isEmpty() and (max_expansions is None or expansions < max_expansions):
+            current_node = open_set.pop()
+            if current_node in closed_set:
+                continue
+            if max_chunk_builds is not None and \
+                    (navigation_class, self.chunk_of(current_node)) not in self.chunk_graphs:
+                if max_chunk_builds == 0:
+                    return None
+                max_chunk_builds -= 1
+
+            closed_set.add(current_node)
+            expansions += 1
+            self.stats["expansions"] += 1
+
+            if current_node == goal:
+                route = []
+                while current_node != start:
+                    route.append(current_node)
+                    current_node = path[current_node]
+                return list(reversed(route))
+
+            for neighbour, move_cost in neighbours(current_node):
+                new_gScore = gScore[current_node] + move_cost
+                if neighbour not in closed_set and new_gScore < gScore.get(neighbour, math.inf):
+                    gScore[neighbour] = new_gScore
+                    path[neighbour] = current_node
+                    open_set.enqueue(neighbour, new_gScore + pathfinding.octile_distance(neighbour, goal))
+
+        return None
+
+    def refine(self, navigation_class, start, waypoint):
+        """Returns the path of points from <start> to the next waypoint of a route (excluding the start), which is
+        either across a chunk border or within one chunk"""
+
+        if max(abs(start[0] - waypoint[0]), abs(start[1] - waypoint[1])) == 1:
+            return [waypoint]
+
+        chunk = self.chunk_of(start)
+        walkable = self.get_chunk_graph(navigation_class, chunk)[0]
+        costs, parents = self.search_chunk(chunk, walkable, start, [waypoint], waypoint)
+        if waypoint not in costs:
+            return None
+
+        return self.chunk_path(chunk, parents, start, waypoint)
+
+    def find_path(self, navigation_class, start, goal, max_expansions=None):
+        """Returns a full path of points from <start> to <goal> (excluding the start), or None if there isn't one"""
+
+        route = self.find_route(navigation_class, start, goal, max_expansions)
+        if route is None:
+            return None
+
+        path = []
+        position = start
+        for waypoint in route:
+            stretch = self.refine(navigation_class, position, waypoint)
+            if stretch is None:
+                return None
+            path += stretch
+            position = waypoint
+
+        return path
+
+    def update_point(self, x, y):
+        """Updates the clearances and throws away the chunk graphs that depend on a point whose passability may have
+        changed. Returns the (x, y, width, height) box of points that mobs may now be able to pass differently (None if
+        no clearance changed), and movement type -> the (x, y, old clearance, new clearance) of each point whose
+        clearance changed for it"""
+
+        changes = dict()
+        boxes = []
+        for movement, clearance_map in self.clearance_maps.items():
+            box, movement_changes = clearance_map.update_point(x, y)
+            if movement_changes:
+                changes[movement] = movement_changes
+                boxes.append(box)
+
+        # the grid (and its snapshot) only changes if a clearance did, e.g. not when the ground is dug
+        if not changes:
+            return None, changes
+
+        self.version += 1
+        self.current_snapshot = None
+        x_start, y_start = min(box[0] for box in boxes), min(box[1] for box in boxes)
+        x_end, y_end = x + 1, y + 1
+
+        # entrances are shared between neighbouring chunks, so the chunks around the changed ones are rebuilt too
+        first_cx, first_cy = self.chunk_of((x_start, y_start))
+        last_cx, last_cy = self.chunk_of((x_end - 1, y_end - 1))
+        changed_chunks = {(cx, cy) for cy in range(first_cy - 1, last_cy + 2)
+                          for cx in range(first_cx - 1, last_cx + 2)}
+        for key in [key for key in self.chunk_graphs if key[1] in changed_chunks]:
+            del self.chunk_graphs[key]
+
+        return (x_start, y_start, x_end - x_start, y_end - y_start), changes
+
+    def changed_points(self, navigation_class, changes):
+        """Returns the points whose passability changed for a navigation class, given the changes from
+        update_point()"""
+
+        movement, (width, height) = navigation_class
+        clearance_map = self.clearance_maps[movement]
+        size, offsets = clearance_map.squares_in(width, height)
+
+        # a rectangle can only stop or start fitting where one of the squares covering it did
+        old_clearances = dict()
+        candidates = set()
+        for x, y, old_clearance, new_clearance in changes.get(movement, []):
+            old_clearances[(x, y)] = old_clearance
+            if (old_clearance >= size) != (new_clearance >= size):
+                candidates.update((x - dx, y - dy) for dx, dy in offsets)
+
+        points = []
+        for x, y in sorted(candidates):
+            if 0 <= x and x + width <= self.world_width and 0 <= y and y + height <= self.world_height:
+                old_fits = all(old_clearances.get((x + dx, y + dy), clearance_map.get(x + dx, y + dy)) >= size
+                               for dx, dy in offsets)
+                if old_fits != clearance_map.fits_rectangle(x, y, width, height):
+                    points.append((x, y))
+
+        return points
@@ -0,0 +1,85 @@
+import collections
+import queue
+import threading
+
+
+class PathService:
+    """Queue of path requests, served by background worker threads so that searches don't add to the time of the tick
+    that asked for them. Requests with the same key (e.g. the same navigation class and goal) are only searched once,
+    and at most <apply_budget> finished searches are handed back per tick, by apply_results().
+
+    With <inline> set, searches run straight away on the calling thread instead, so that runs are reproducible"""
+
+    def __init__(self, worker_count, apply_budget, inline=False):
+        self.worker_count = worker_count
+        self.apply_budget = apply_budget
+        self.inline = inline
+
+        self.requests = queue.Queue()
+        # finished searches, as (key, result, error) - only workers add to this, and only apply_results() takes from it
+        self.finished = collections.deque()
+        # key -> the callbacks waiting for the result of a queued search, only used by the thread that submits
+        self.pending = dict()
+        self.workers = []
+        self.stats = {"submitted": 0, "deduplicated": 0, "applied": 0}
+
+    def is_pending(self, key):
+        return key in self.pending
+
+    def submit(self, key, search, callback):
+        """Queues search() to be run, with callback(result) called by apply_results() once it has finished. search()
+        runs on another thread, so it must only read data that is never changed once submitted (e.g. a snapshot)"""
+
+        self.stats["submitted"] += 1
+        if key in self.pending:
+            self.pending[key].append(callback)
+            self.stats["deduplicated"] += 1
+            return
+
+        self.pending[key] = [callback]
+        if self.inline:
+            self.run(key, search)
+        else:
+            if not self.workers:
+                for i in range(self.worker_count):
+                    worker = threading.Thread(target=self.work, daemon=True)
+                    worker.start()
+                    self.workers.append(worker)
+            self.requests.put((key, search))
+
+    def run(self, key, search):
+        """Runs a search, keeping any error to be raised on the thread that applies the results"""
+
+        try:
+            self.finished.append((key, search(), None))
+        except Exception as error:
+            self.finished.append((key, None, error))
+
+    def work(self):
+        """Worker thread loop, running queued searches until stopped"""
+
+        while True:
+            key, search = self.requests.get()
+            if search is None:
+                return
+            self.run(key, search)
+
+    def apply_results(self):
+        """Hands up to <apply_budget> finished searches to the callbacks that asked for them"""
+
+        for i in range(min(self.apply_budget, len(self.finished))):
+            key, result, error = self.finished.popleft()
+            callbacks = self.pending.pop(key)
+            if error is not None:
+                raise error
+
+            for callback in callbacks:
+                callback(result)
+            self.stats["applied"] += 1
+
+    def stop(self):
+        """Stops the worker threads once they have finished their current searches"""
+
+        for worker in self.workers:
+            self.requests.put((None, None))
+        self.workers = []
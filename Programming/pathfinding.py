@@ -0,0 +1,352 @@
+import heapq
+import math
+
+
+# moves are in the same order as the original A* implementation, straight moves first
+FOUR_DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+EIGHT_DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
+DIAGONAL_COST = math.sqrt(2)
+
+
+def octile_distance(start, end):
+    """Heuristic for A* algorithm with diagonal moves, the exact cost between two 2D grid points with no obstacles"""
+
+    dx, dy = abs(start[0] - end[0]), abs(start[1] - end[1])
+    return max(dx, dy) + (DIAGONAL_COST - 1) * min(dx, dy)
+
+
+def manhattan_distance(start, end):
+    """Heuristic for A* algorithm without diagonal moves"""
+
+    return abs(start[0] - end[0]) + abs(start[1] - end[1])
+
+
+def A_Star(start, end, grid, is_walkable, directions=EIGHT_DIRECTIONS, max_expansions=None, stats=None):
+    """Implementation of A* algorithm for a 2D grid, using <is_walkable(x, y)> to decide whether each cell in the grid
+    is an obstacle or not, returning the optimal path from a start to end location in the grid (excluding the start).
+
+    At most <max_expansions> nodes are expanded. If the end cannot be reached within that budget (or at all), the path
+    to the explored node closest to the end is returned instead, which is empty if no node is closer than the start.
+    The number of expanded nodes is added to stats["expansions"], if a <stats> dictionary is given"""
+
+    if directions is EIGHT_DIRECTIONS or len(directions) == 8:
+        heuristic = octile_distance
+    else:
+        heuristic = manhattan_distance
+
+    width, height = len(grid[0]), len(grid)
+
+    open_set = PriorityQueue() # nodes to be evaluated
+    open_set.enqueue(start, (heuristic(start, end), heuristic(start, end)))
+    closed_set = set() # nodes that have already been expanded, whose gScore can no longer improve
+
+    path = dict() # stores the best path to a node
+    gScore = dict() # cost from the start node to a node
+    gScore[start] = 0
+
+    # the closest node to the end found so far, as a fallback if the end is not reached
+    closest_node, closest_distance = start, heuristic(start, end)
+    expansions = 0
+
+    while not open_set.isEmpty() and (max_expansions is None or expansions < max_expansions):
+        current_node = open_set.pop() # pop the element with the lowest priority
+
+        # the same node can be queued more than once, only the first (cheapest) copy is expanded
+        if current_node in closed_set:
+            continue
+        closed_set.add(current_node)
+        expansions += 1
+
+        if current_node == end:
+            closest_node = end
+            break
+
+        current_distance = heuristic(current_node, end)
+        if current_distance < closest_distance:
+            closest_node, closest_distance = current_node, current_distance
+
+        for dx, dy in directions:
+            x_pos, y_pos = current_node[0] + dx, current_node[1] + dy
+            neighbour = (x_pos, y_pos)
+
+            # checks if in bounds, not an obstacle and not already expanded
+            if not (0 <= x_pos < width and 0 <= y_pos < height) or neighbour in closed_set or \
+                    not is_walkable(x_pos, y_pos):
+                continue
+
+            # new cost from <current_node> to <neighbour>
+            new_gScore = gScore[current_node] + (DIAGONAL_COST if dx and dy else 1)
+
+            # check whether the new cost is the minimum cost
+            if neighbour not in gScore or new_gScore < gScore[neighbour]:
+                gScore[neighbour] = new_gScore
+                path[neighbour] = current_node
+
+                # ties between equal estimated total costs are broken towards the node nearer the end
+                neighbour_distance = heuristic(neighbour, end)
+                open_set.enqueue(neighbour, (new_gScore + neighbour_distance, neighbour_distance))
+
+    if stats is not None:
+        stats["expansions"] = stats.get("expansions", 0) + expansions
+
+    # reconstruct the path to the end, or to the closest node found if the end was not reached
+    sequence = []
+    current_node = closest_node
+    while current_node in path:
+        sequence.append(current_node)
+        current_node = path[current_node]
+
+    return list(reversed(sequence))
+
+
+class PriorityQueue(object):
+    """Binary heap priority queue as required by the A* algorithm, popping the lowest priority items first"""
+
+    def __init__(self):
+        self.queue = []
+        self.count = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def isEmpty(self):
+        """Returns a boolean for whether the queue is empty"""
+
+        return len(self.queue) == 0
+
+    def enqueue(self, data, priority):
+        """Adds a new element to the priority queue in O(log n) time"""
+
+        # the insertion count breaks ties between equal priorities first-in-first-out, so data is never compared
+        heapq.heappush(self.queue, (priority, self.count, data))
+        self.count += 1
+
+    def pop(self):
+        """Pops the lowest priority item in the priority queue in O(log n) time"""
+
+        return heapq.heappop(self.queue)[2]
+
+
+class IncrementalPlanner:
+    """Lifelong Planning A* (LPA*) search over a 2D grid from a root towards a goal that can move, which keeps its
+    search between calls, so that when the goal moves or points in the grid change only the affected part of the
+    search is repaired rather than searching from scratch.
+
+    The goal moving is handled in the same way as the start moving in D* Lite: the keys already queued stay lower
+    bounds once <key_modifier> has been increased by the heuristic distance the goal moved, and are corrected lazily
+    as they are popped. Searching stops after <max_expansions> nodes, carrying on from the same point next time"""
+
+    def __init__(self, root, width, height, is_walkable, directions=EIGHT_DIRECTIONS, max_expansions=None,
+                 stats=None):
+        self.width, self.height = width, height
+        self.is_walkable = is_walkable
+        self.directions = directions
+        self.max_expansions = max_expansions
+        self.stats = stats
+
+        if directions is EIGHT_DIRECTIONS or len(directions) == 8:
+            self.heuristic = octile_distance
+        else:
+            self.heuristic = manhattan_distance
+
+        self.reset(root)
+
+    def reset(self, root):
+        """Throws away the search, starting a new one from <root>"""
+
+        self.root = root
+        self.goal = None
+        self.key_modifier = 0
+        self.gScore = dict() # cost from the root to a node, as of the last time the node was expanded
+        self.rhs = {root: 0} # one-step lookahead cost from the root to a node, using its neighbours' gScores
+        self.open_set = [] # heap of (key, node), where entries whose key no longer matches <queued> are skipped
+        self.queued = dict()
+        self.path = []
+
+    def passable(self, node):
+        """Returns whether a node can be moved into or out of - the root and goal always can be"""
+
+        return node == self.root or node == self.goal or self.is_walkable(*node)
+
+    def neighbours(self, node):
+        """Yields each in-bounds neighbour of a node, with the cost of moving between them"""
+
+        for dx, dy in self.directions:
+            x_pos, y_pos = node[0] + dx, node[1] + dy
+            if 0 <= x_pos < self.width and 0 <= y_pos < self.height:
+                yield (x_pos, y_pos), (DIAGONAL_COST if dx and dy else 1)
+
+    def calculate_key(self, node):
+        """Returns the priority of a node in the open set"""
+
+        score = min(self.gScore.get(node, math.inf), self.rhs.get(node, math.inf))
+
+        # diagonal costs are irrational, so keys that should tie are rounded to stop rounding errors ending the search
+        # before a node that ties with the goal is expanded
+        return round(score + self.heuristic(node, self.goal) + self.key_modifier, 9), score
+
+    def update_node(self, node):
+        """Recalculates a node's rhs from its neighbours, queueing it if it is no longer consistent with its gScore"""
+
+        if node != self.root:
+            rhs = math.inf
+            if self.passable(node):
+                for neighbour, move_cost in self.neighbours(node):
+                    neighbour_gScore = self.gScore.get(neighbour, math.inf)
+                    if neighbour_gScore + move_cost < rhs and self.passable(neighbour):
+                        rhs = neighbour_gScore + move_cost
+            self.rhs[node] = rhs
+
+        if self.gScore.get(node, math.inf) != self.rhs.get(node, math.inf):
+            key = self.calculate_key(node)
+            self.queued[node] = key
+            heapq.heappush(self.open_set, (key, node))
+        else:
+            self.queued.pop(node, None)
+
+    def update_point(self, point):
+        """Repairs the search after whether a point in the grid is walkable has changed"""
+
+        # nothing has been searched until there is a goal, and a point outside of the search (that neither it nor its
+        # neighbours have been reached) can't change it
+        if self.goal is None or point not in self.rhs and \
+                not any(neighbour in self.rhs for neighbour, move_cost in self.neighbours(point)):
+            return
+
+        self.update_node(point)
+        for neighbour, move_cost in self.neighbours(point):
+            self.update_node(neighbour)
+
+    def set_goal(self, goal):
+        """Moves the goal of the search, which only changes the priorities of queued nodes"""
+
+        if goal == self.goal:
+            return
+
+        old_goal = self.goal
+        self.goal = goal
+        if old_goal is None:
+            # keys can only be worked out once there is a goal, so the root is queued now
+            self.update_node(self.root)
+        else:
+            self.key_modifier += self.heuristic(old_goal, goal)
+            # the goal can always be moved into, so whether the old and new goals are passable may have changed
+            self.update_point(old_goal)
+        self.update_point(goal)
+
+    def compute(self):
+        """Expands nodes until the goal's cost is known, returning False if <max_expansions> ran out first"""
+
+        expansions = 0
+        finished = True
+
+        while self.open_set:
+            key, node = self.open_set[0]
+            if self.queued.get(node) != key:
+                heapq.heappop(self.open_set)
+                continue
+
+            goal_gScore, goal_rhs = self.gScore.get(self.goal, math.inf), self.rhs.get(self.goal, math.inf)
+            if key >= self.calculate_key(self.goal) and goal_gScore == goal_rhs:
+                break
+
+            if self.max_expansions is not None and expansions >= self.max_expansions:
+                finished = False
+                break
+
+            heapq.heappop(self.open_set)
+            new_key = self.calculate_key(node)
+            if key < new_key:
+                # the key was worked out for an older goal, so requeue it with its real priority
+                self.queued[node] = new_key
+                heapq.heappush(self.open_set, (new_key, node))
+                continue
+
+            del self.queued[node]
+            expansions += 1
+
+            if self.gScore.get(node, math.inf) > self.rhs[node]:
+                gScore = self.gScore[node] = self.rhs[node]
+
+                # the node's cost only went down, so each neighbour's rhs is at most the new way round through it,
+                # without looking at the neighbour's other neighbours again
+                for neighbour, move_cost in self.neighbours(node):
+                    if neighbour != self.root and gScore + move_cost < self.rhs.get(neighbour, math.inf) and \
+                            self.passable(neighbour):
+                        self.rhs[neighbour] = gScore + move_cost
+                        if self.gScore.get(neighbour, math.inf) != gScore + move_cost:
+                            key = self.calculate_key(neighbour)
+                            self.queued[neighbour] = key
+                            heapq.heappush(self.open_set, (key, neighbour))
+                        else:
+                            self.queued.pop(neighbour, None)
+            else:
+                self.gScore[node] = math.inf
+                self.update_node(node)
+
+                for neighbour, move_cost in self.neighbours(node):
+                    self.update_node(neighbour)
+
+        if self.stats is not None:
+            self.stats["expansions"] = self.stats.get("expansions", 0) + expansions
+
+        return finished
+
+    def get_path(self, end=None):
+        """Returns the path from the root to <end> (the goal by default, excluding the root) as of the last search, or
+        None if there is no known path"""
+
+        if end is None:
+            end = self.goal
+        if self.gScore.get(end, math.inf) == math.inf:
+            return None
+
+        # walk back from the end, always to the neighbour that the node's cost came from
+        sequence = []
+        current_node = end
+        while current_node != self.root:
+            sequence.append(current_node)
+            best_node, best_score = None, math.inf
+            for neighbour, move_cost in self.neighbours(current_node):
+                score = self.gScore.get(neighbour, math.inf) + move_cost
+                if score < best_score and self.passable(neighbour):
+                    best_node, best_score = neighbour, score
+
+            if best_node is None or len(sequence) > len(self.gScore):
+                return None
+            current_node = best_node
+
+        return list(reversed(sequence))
+
+    def closest_node(self):
+        """Returns the expanded node closest to the goal, nearest the root on a tie"""
+
+        return min((node for node, gScore in self.gScore.items() if gScore < math.inf),
+                   key=lambda node: (self.heuristic(node, self.goal), self.gScore[node]), default=self.root)
+
+    def find_path(self, position, goal):
+        """Returns the optimal path from <position> to <goal> (excluding <position>), or None if there isn't one. If
+        the search runs out of expansions, the path to the expanded node closest to the goal is returned instead, as
+        A_Star() does, and the search carries on from there next time. While <position> stays on the last path found
+        (e.g. a mob following it), the search is kept and repaired, otherwise it starts again from <position>"""
+
+        if position != self.root and position not in self.path:
+            self.reset(position)
+
+        self.set_goal(goal)
+        if self.compute():
+            path = self.get_path()
+        else:
+            path = self.get_path(self.closest_node())
+        self.path = path or []
+        if position == self.root:
+            return path
+
+        # the rest of a shortest path after one of its points is also a shortest path from that point
+        if path is not None and position in path:
+            return path[path.index(position) + 1:]
+
+        # the new path doesn't pass through <position>, or the root can no longer reach the goal (but <position>, having
+        # moved on from it, still might), so search again from there
+        self.reset(position)
+        return self.find_path(position, goal)
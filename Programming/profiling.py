@@ -0,0 +1,194 @@
+import collections
+import contextlib
+import csv
+import functools
+import json
+import threading
+import time
+
+
+class Profiler:
+    """Times spans of code (e.g. each stage of a frame) and counts events (e.g. draw calls) frame by frame, keeping
+    the last <window> frames for rolling percentiles, and the last <history> frames and <trace_size> spans to be
+    exported as a CSV file or a Chrome trace (for chrome://tracing or ui.perfetto.dev). Spans can be recorded from
+    any thread, and are added to the frame that is running when they finish"""
+
+    def __init__(self, window=120, history=10000, trace_size=200000):
+        self.launch_time = time.perf_counter()
+        self.frames = collections.deque(maxlen=window)
+        self.history = collections.deque(maxlen=history)
+        self.trace = collections.deque(maxlen=trace_size)
+
+        # stage or counter -> its total so far in the current frame
+        self.current = collections.defaultdict(float)
+        # counter -> (read(), last value), for counters that only give a running total, e.g. a module's stats
+        self.totals = dict()
+        # gauge -> read(), for values read once a frame, e.g. the number of mobs
+        self.gauges = dict()
+        self.counter_names = set()
+        self.frame_start = None
+        self.lock = threading.Lock()
+
+    def record(self, name, start, end):
+        """Adds a span from one time.perf_counter() value to another to the current frame and the trace"""
+
+        with self.lock:
+            self.current[name] += end - start
+            self.trace.append((name, threading.get_ident(), start, end - start))
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Times the code within a with block"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def timed(self, name):
+        """Decorator that times every call of a function"""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, start, time.perf_counter())
+
+            return timed_function
+
+        return decorator
+
+    def count(self, name, amount=1):
+        """Adds to a counter for the current frame"""
+
+        with self.lock:
+            self.counter_names.add(name)
+            self.current[name] += amount
+
+    def track_total(self, name, read):
+        """Counts how much a running total, given by read(), goes up by each frame"""
+
+        self.counter_names.add(name)
+        self.totals[name] = (read, read())
+
+    def track_gauge(self, name, read):
+        """Records the value given by read() at the end of each frame"""
+
+        self.counter_names.add(name)
+        self.gauges[name] = read
+
+    def end_frame(self):
+        """Finishes the current frame, to be called once per frame by the render loop"""
+
+        now = time.perf_counter()
+        for name, (read, last) in self.totals.items():
+            total = read()
+            self.count(name, total - last)
+            self.totals[name] = (read, total)
+        for name, read in self.gauges.items():
+            self.count(name, read())
+
+        with self.lock:
+            frame, self.current = self.current, collections.defaultdict(float)
+
+        if self.frame_start is not None:
+            frame["frame"] = now - self.frame_start
+            frame = dict(frame)
+            self.frames.append(frame)
+            self.history.append((self.frame_start, frame))
+            with self.lock:
+                self.trace.append(("frame", threading.get_ident(), self.frame_start, now - self.frame_start))
+        self.frame_start = now
+
+    def summary(self):
+        """Returns (name, p50, p95, max) rows over the rolling window, for stages in milliseconds slowest first, then
+        for counters per frame"""
+
+        frames = list(self.frames)
+        names = {name for frame in frames for name in frame}
+        stages, counters = [], []
+        for name in names:
+            values = sorted(frame.get(name, 0) for frame in frames)
+            if name in self.counter_names:
+                counters.append((name, percentile(values, 0.5), percentile(values, 0.95), values[-1]))
+            else:
+                values = [value * 1000 for value in values]
+                stages.append((name, percentile(values, 0.5), percentile(values, 0.95), values[-1]))
+
+        stages.sort(key=lambda row: row[2], reverse=True)
+        counters.sort()
+
+        return stages, counters
+
+    def overlay_lines(self, max_stages=12):
+        """Returns the rolling percentiles as lines of text, for an on-screen overlay"""
+
+        stages, counters = self.summary()
+        lines = [f"{'stage (ms)':<22}{'p50':>7}{'p95':>7}{'max':>7}"]
+        lines += [f"{name[:22]:<22}{p50:>7.2f}{p95:>7.2f}{highest:>7.2f}" for name, p50, p95, highest in
+                  stages[:max_stages]]
+        lines.append(f"{'per frame':<22}{'p50':>7}{'p95':>7}{'max':>7}")
+        lines += [f"{name[:22]:<22}{p50:>7g}{p95:>7g}{highest:>7g}" for name, p50, p95, highest in counters]
+
+        return lines
+
+    def export(self, path):
+        """Writes the history to a Chrome trace if <path> ends in .json, otherwise to a CSV file"""
+
+        if path.endswith(".json"):
+            self.export_chrome_trace(path)
+        else:
+            self.export_csv(path)
+
+    def export_chrome_trace(self, path):
+        """Writes every span in the trace, and every frame's counters, in the Chrome trace event format"""
+
+        with self.lock:
+            spans = list(self.trace)
+        history = list(self.history)
+
+        def microseconds(seconds):
+            return round((seconds - self.launch_time) * 1000000, 1)
+
+        events = []
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id in sorted({span[1] for span in spans}):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": thread_id,
+                           "args": {"name": thread_names.get(thread_id, str(thread_id))}})
+
+        for name, thread_id, start, duration in spans:
+            events.append({"name": name, "ph": "X", "pid": 1, "tid": thread_id, "ts": microseconds(start),
+                           "dur": round(duration * 1000000, 1)})
+
+        for start, frame in history:
+            counters = {name: value for name, value in frame.items() if name in self.counter_names}
+            if counters:
+                events.append({"name": "counters", "ph": "C", "pid": 1, "ts": microseconds(start), "args": counters})
+
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def export_csv(self, path):
+        """Writes one row per frame, with the time (in milliseconds) of each stage and the value of each counter"""
+
+        history = list(self.history)
+        names = sorted({name for start, frame in history for name in frame} - {"frame"})
+
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "start", "total"] + names)
+            for index, (start, frame) in enumerate(history):
+                writer.writerow([index, round((start - self.launch_time) * 1000, 3), round(frame["frame"] * 1000, 3)] +
+                                [frame.get(name, 0) if name in self.counter_names else
+                                 round(frame.get(name, 0) * 1000, 3) for name in names])
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of a sorted list of values"""
+
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
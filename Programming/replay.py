@@ -0,0 +1,120 @@
+import collections
+import struct
+
+
+# recordings start with the seed the world was generated from and the seed of the random module for the session,
+# followed by one record per tick of the controls used in that tick and a checksum of the world after it. Version 2
+# snapshots list the other users in the world, which changes every checksum
+MAGIC = b"CMRP"
+VERSION = 2
+HEADER = struct.Struct("<4sHQQ")
+CONTROLS = struct.Struct("<bbBiibb")
+TICK = struct.Struct(CONTROLS.format + "I")
+
+# bits of a tick's flags
+USE, UPGRADE, EAT, HAS_TARGET = 1, 2, 4, 8
+
+# the controls of each tick are (move x, move y, use, target, upgrade, eat, toolbar slot, inventory slot) tuples, in
+# the same order as main.Controls
+Recording = collections.namedtuple("Recording", ["world_seed", "session_seed", "ticks"])
+
+
+class ReplayError(Exception):
+    """Raised when a file is not a recording, or was recorded by an unsupported version of the game"""
+
+
+class Recorder:
+    """Writes a recording to <path> tick by tick, as the session is played"""
+
+    def __init__(self, path, world_seed, session_seed):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, world_seed, session_seed))
+
+    def record(self, controls, checksum):
+        self.file.write(pack_tick(controls, checksum))
+
+    def close(self):
+        self.file.close()
+
+
+class Playback:
+    """Plays back the controls of a recording tick by tick, noting the first tick whose world does not match the
+    recorded checksum"""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.tick = 0
+        self.expected_checksum = None
+        self.diverged_at = None
+
+    @property
+    def finished(self):
+        return self.tick >= len(self.recording.ticks)
+
+    def next_controls(self):
+        """Returns the controls of the next tick"""
+
+        controls, self.expected_checksum = self.recording.ticks[self.tick]
+        self.tick += 1
+
+        return controls
+
+    def check(self, checksum):
+        """Checks the world after the tick that was last played back against the recording"""
+
+        if checksum != self.expected_checksum and self.diverged_at is None:
+            self.diverged_at = self.tick
+
+
+def controls_values(controls):
+    """Returns the values that a tick's controls are packed as, in the layout of <CONTROLS>"""
+
+    move_x, move_y, use, target, upgrade, eat, toolbar_slot, inventory_slot = controls
+    flags = (USE if use else 0) | (UPGRADE if upgrade else 0) | (EAT if eat else 0) | \
+        (HAS_TARGET if target is not None else 0)
+    target_x, target_y = target if target is not None else (0, 0)
+
+    return (move_x, move_y, flags, target_x, target_y, -1 if toolbar_slot is None else toolbar_slot,
+            -1 if inventory_slot is None else inventory_slot)
+
+
+def values_controls(move_x, move_y, flags, target_x, target_y, toolbar_slot, inventory_slot):
+    """Returns the controls of a tick from the values made by controls_values()"""
+
+    return (move_x, move_y, bool(flags & USE), (target_x, target_y) if flags & HAS_TARGET else None,
+            bool(flags & UPGRADE), bool(flags & EAT), None if toolbar_slot == -1 else toolbar_slot,
+            None if inventory_slot == -1 else inventory_slot)
+
+
+def pack_tick(controls, checksum):
+    """Packs the controls of a tick and the checksum of the world after it"""
+
+    return TICK.pack(*controls_values(controls), checksum)
+
+
+def unpack_tick(*values):
+    """Unpacks the controls and checksum of a tick packed by pack_tick()"""
+
+    return values_controls(*values[:-1]), values[-1]
+
+
+def read(path):
+    """Reads a whole recording"""
+
+    with open(path, "rb") as file:
+        data = file.read()
+
+    if len(data) < HEADER.size:
+        raise ReplayError(f"'{path}' is not a recording")
+    magic, version, world_seed, session_seed = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ReplayError(f"'{path}' is not a recording")
+    if version != VERSION:
+        raise ReplayError(f"'{path}' was recorded by version {version} of the game, which can't be replayed")
+
+    # a recording cut short (e.g. by a crash) is played back up to its last whole tick
+    tick_count = (len(data) - HEADER.size) // TICK.size
+    ticks = [unpack_tick(*values) for values in
+             TICK.iter_unpack(data[HEADER.size:HEADER.size + tick_count * TICK.size])]
+
+    return Recording(world_seed, session_seed, ticks)
@@ -0,0 +1,273 @@
+import asyncio
+import argparse
+import concurrent.futures
+import time
+
+import engine
+import profiling
+import state_sync
+
+
+# users are sent the mobs, other users and chunks of terrain within <SYNC_RANGE> points of them, the same range that
+# mobs are simulated in around them, and can only use tools on points within it
+SYNC_RANGE = engine.MEDIUM_RANGE
+# updates for a client are skipped whilst more than this many bytes are still waiting to be sent to it, so that a
+# client that falls behind is sent everything that changed in one update once it catches up
+MAX_BUFFERED_BYTES = 256 * 1024
+
+MOB_TYPE_IDS = {mob_type: index for index, mob_type in enumerate(engine.MOB_STATS)}
+DIRECTION_IDS = {direction: index for index, direction in enumerate(state_sync.DIRECTIONS)}
+
+
+class Connection:
+    """A client that has joined the game, with the user it plays as, the controls it last sent and what it has been
+    sent"""
+
+    def __init__(self, player, writer):
+        self.player = player
+        self.writer = writer
+        self.controls = engine.NO_CONTROLS
+        self.encoder = state_sync.ViewEncoder(engine.TERRAIN_CHUNK_SIZE)
+
+
+class GameServer:
+    """Runs the authoritative simulation of a world shared by every connected client, ticking it <TICK_RATE> times a
+    second on its own thread. The event loop only reads clients' messages and writes their updates, so a slow tick
+    never holds up the connections; clients joining, leaving and sending controls are passed to the simulation between
+    ticks. After every tick, each client is sent only what changed near their user, so the work and bandwidth of each
+    update depend on what is happening near the user rather than the size of the world"""
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        # the simulation (and each connection's encoder) is only ever used by this thread, one tick at a time
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="simulation")
+        self.connections = dict()
+        # futures for the clients waiting for a user to be added for them, and the ids of the users whose clients have
+        # left, which are both dealt with between ticks
+        self.joining = []
+        self.leaving = []
+        # the tasks handling each client, which are waited for when the server stops
+        self.handlers = set()
+        self.stats = {"joined": 0, "updates skipped": 0}
+        self.tick_times = []
+        self.update_sizes = []
+
+    async def serve(self, host, port, ticks=None):
+        """Accepts clients on (host, port) and ticks the world until <ticks> ticks have run, or forever"""
+
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving world {engine.WORLD_SEED} on {host}:{port}")
+
+        try:
+            async with server:
+                await self.run_ticks(ticks)
+        finally:
+            self.executor.shutdown()
+
+        # closing a client's connection ends its handler, and clients still waiting to join are turned away
+        for connection in list(self.connections.values()):
+            connection.writer.close()
+        for joined in self.joining:
+            joined.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def run_ticks(self, ticks=None):
+        """Ticks the world <TICK_RATE> times per second on the simulation's thread, without trying to catch up after a
+        slow tick, sending each client its update once the tick has finished"""
+
+        loop = asyncio.get_running_loop()
+        tick_length = 1 / engine.TICK_RATE
+        next_tick = loop.time()
+
+        while ticks is None or len(self.tick_times) < ticks:
+            self.update_players()
+            receivers = self.get_receivers()
+            updates = await loop.run_in_executor(self.executor, self.run_tick, receivers)
+
+            with engine.profiler.span("send updates"):
+                for connection, update in updates:
+                    if not connection.writer.transport.is_closing():
+                        connection.writer.write(state_sync.pack_message(state_sync.UPDATE, update))
+                        self.update_sizes.append(state_sync.FRAME.size + len(update))
+            engine.profiler.end_frame()
+
+            next_tick = max(next_tick + tick_length, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+    def update_players(self):
+        """Adds and removes the users of clients that have joined or left since the last tick, and gives every user
+        the controls their client last sent"""
+
+        for player_id in self.leaving:
+            self.simulation.remove_player(player_id)
+        self.leaving.clear()
+
+        for joined in self.joining:
+            if not joined.cancelled():
+                joined.set_result((self.simulation.add_player(), self.simulation.window_age))
+        self.joining.clear()
+
+        for connection in self.connections.values():
+            connection.player.controls = checked_controls(connection.controls, connection.player)
+
+    def get_receivers(self):
+        """Returns the clients to send an update to after the next tick"""
+
+        receivers = []
+        for connection in self.connections.values():
+            transport = connection.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_BUFFERED_BYTES:
+                self.stats["updates skipped"] += 1
+                continue
+            receivers.append(connection)
+
+        return receivers
+
+    def run_tick(self, receivers):
+        """Ticks the world, then returns the update for each receiving client of what changed near their user, on the
+        simulation's thread"""
+
+        tick_start = time.perf_counter()
+        self.simulation.tick()
+        with engine.profiler.span("pack updates"):
+            updates = [(connection, connection.encoder.pack_update(self.simulation.window_age,
+                                                                   get_view(self.simulation, connection.player)))
+                       for connection in receivers]
+        self.tick_times.append(time.perf_counter() - tick_start)
+
+        return updates
+
+    async def handle_connection(self, reader, writer):
+        """Adds a user to the world for a client once it has joined, then keeps their controls up to date until the
+        client leaves"""
+
+        loop = asyncio.get_running_loop()
+        connection = None
+        self.handlers.add(asyncio.current_task())
+        try:
+            message_type, payload = await state_sync.read_message(reader)
+            if message_type != state_sync.JOIN or len(payload) != state_sync.JOIN_MESSAGE.size:
+                raise state_sync.SyncError("client did not join")
+            version, = state_sync.JOIN_MESSAGE.unpack(payload)
+
+            # a client that talks a different version is still welcomed, so that it can tell its user why it can't join
+            if version != state_sync.PROTOCOL_VERSION:
+                writer.write(state_sync.pack_message(state_sync.WELCOME, state_sync.WELCOME_MESSAGE.pack(
+                    state_sync.PROTOCOL_VERSION, 0, engine.WORLD_SEED, self.simulation.window_age)))
+                return
+
+            # the user is added between ticks
+            joined = loop.create_future()
+            self.joining.append(joined)
+            player, tick = await joined
+
+            connection = Connection(player, writer)
+            self.connections[player.player_id] = connection
+            self.stats["joined"] += 1
+            writer.write(state_sync.pack_message(state_sync.WELCOME, state_sync.WELCOME_MESSAGE.pack(
+                state_sync.PROTOCOL_VERSION, player.player_id, engine.WORLD_SEED, tick)))
+
+            while True:
+                message_type, payload = await state_sync.read_message(reader)
+                if message_type == state_sync.CONTROLS:
+                    connection.controls = state_sync.unpack_controls(payload)
+
+        except (asyncio.IncompleteReadError, ConnectionError, state_sync.SyncError):
+            pass
+
+        finally:
+            if connection is not None:
+                del self.connections[connection.player.player_id]
+                self.leaving.append(connection.player.player_id)
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    def report(self):
+        """Prints how fast ticks ran, and how big the updates sent to clients were"""
+
+        engine.report_tick_times(self.tick_times)
+        sizes = sorted(self.update_sizes)
+        print(f"Clients joined: {self.stats['joined']}, connected: {len(self.connections)}, updates skipped: "
+              f"{self.stats['updates skipped']}")
+        if sizes:
+            print(f"Update sizes (bytes): p50 {profiling.percentile(sizes, 0.5)}, "
+                  f"p99 {profiling.percentile(sizes, 0.99)}, max {sizes[-1]}, total {sum(sizes)}")
+
+
+def checked_controls(controls, player):
+    """Returns a client's controls, with anything out of range (e.g. a target outside of the user's view) dropped, as
+    the server must never trust its clients"""
+
+    move_x, move_y, use, target, upgrade, eat, toolbar_slot, inventory_slot = controls
+
+    if target is not None and not (0 <= target[0] < engine.WORLD_WIDTH and 0 <= target[1] < engine.WORLD_HEIGHT and
+                                   abs(target[0] - player.player_x) < SYNC_RANGE and
+                                   abs(target[1] - player.player_y) < SYNC_RANGE):
+        target = None
+    if toolbar_slot is not None and not 0 <= toolbar_slot < len(engine.TOOLBAR_ICONS_COORDS[0]):
+        toolbar_slot = None
+    if inventory_slot is not None and inventory_slot < 0:
+        inventory_slot = None
+
+    return engine.Controls(max(-1, min(1, move_x)), max(-1, min(1, move_y)), use, target, upgrade, eat, toolbar_slot,
+                           inventory_slot)
+
+
+def get_view(simulation, player):
+    """Returns what a user can see of the world, as a state_sync.View"""
+
+    player_x, player_y = player.player_x, player.player_y
+    user = (player_x, player_y, DIRECTION_IDS[player.direction], player.user_health, player.user_hunger,
+            player.user_hit, player.selected_toolbar_slot, player.selected_inventory_slot, player.red_overlay_opacity)
+
+    players = {other.player_id: (other.player_x, other.player_y, DIRECTION_IDS[other.direction], other.user_hit)
+               for other in simulation.players.values() if other is not player and
+               abs(other.player_x - player_x) < SYNC_RANGE and abs(other.player_y - player_y) < SYNC_RANGE}
+
+    mobs = dict()
+    for mob in engine.mob_grid.query((player_x - SYNC_RANGE, player_y - SYNC_RANGE, 2 * SYNC_RANGE, 2 * SYNC_RANGE)):
+        mob_x, mob_y = mob.position
+        mobs[mob.mob_id] = (MOB_TYPE_IDS[mob.mob_type], mob_x, mob_y, engine.mob_data.is_hostile(mob.slot), mob.hit)
+
+    terrain = engine.terrain
+    chunk_size = engine.TERRAIN_CHUNK_SIZE
+    first_cx, first_cy = max(0, player_x - SYNC_RANGE) // chunk_size, max(0, player_y - SYNC_RANGE) // chunk_size
+    last_cx = min(engine.WORLD_WIDTH - 1, player_x + SYNC_RANGE) // chunk_size
+    last_cy = min(engine.WORLD_HEIGHT - 1, player_y + SYNC_RANGE) // chunk_size
+    chunks = {(cx, cy): (terrain.versions.get((cx, cy), 0), terrain.edits.get((cx, cy), dict()))
+              for cy in range(first_cy, last_cy + 1) for cx in range(first_cx, last_cx + 1)}
+
+    return state_sync.View(user, player.inventory, player.toolbar, player.messages, players, mobs, chunks)
+
+
+def start_server(world_seed):
+    """Generates a world for a server, with no local user"""
+
+    engine.WORLD_SEED = world_seed
+    engine.load_world()
+    engine.build_world_indexes()
+
+    return GameServer(engine.Simulation())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a world that several players can join with main.py --connect")
+    parser.add_argument("--host", default=state_sync.DEFAULT_HOST, help="address to accept clients on")
+    parser.add_argument("--port", type=int, default=state_sync.DEFAULT_PORT, help="port to accept clients on")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the world, random if not given")
+    parser.add_argument("--ticks", type=int, default=None, help="number of ticks to run for, forever if not given")
+    parser.add_argument("--profile", default=None,
+                        help="file to write the profile to, as a Chrome trace (.json) or CSV file")
+    arguments = parser.parse_args()
+
+    game_server = start_server(engine.WORLD_SEED if arguments.seed is None else arguments.seed)
+    try:
+        asyncio.run(game_server.serve(arguments.host, arguments.port, arguments.ticks))
+    except KeyboardInterrupt:
+        pass
+
+    game_server.report()
+    if arguments.profile is not None:
+        engine.profiler.export(arguments.profile)
@@ -0,0 +1,80 @@
+class SpatialHash:
+    """Uniform grid of buckets, each covering <cell_size> x <cell_size> points of the world, holding every item whose
+    box overlaps that bucket, so that only items near a box need to be checked against it"""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = dict()
+        # the (x, y, width, height) box of each item, and the range of buckets it is stored in
+        self.boxes = dict()
+        self.cells = dict()
+
+    def __contains__(self, item):
+        return item in self.boxes
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def cell_range(self, box):
+        """Returns the first and last bucket (inclusive) along each axis covered by a box, counting the far edges of
+        the box as inside it, in the same way as intersects()"""
+
+        x, y, width, height = box
+        return (x // self.cell_size, y // self.cell_size,
+                (x + width) // self.cell_size, (y + height) // self.cell_size)
+
+    def insert(self, item, box):
+        """Adds an item with a given box"""
+
+        cells = self.cell_range(box)
+        self.boxes[item] = box
+        self.cells[item] = cells
+
+        first_cx, first_cy, last_cx, last_cy = cells
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                # buckets are dictionaries rather than sets, so that queries return items in a repeatable order
+                self.buckets.setdefault((cx, cy), dict())[item] = None
+
+    def remove(self, item):
+        """Removes an item, if present"""
+
+        if item not in self.boxes:
+            return
+
+        first_cx, first_cy, last_cx, last_cy = self.cells.pop(item)
+        del self.boxes[item]
+
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                bucket = self.buckets[(cx, cy)]
+                del bucket[item]
+                if not bucket:
+                    del self.buckets[(cx, cy)]
+
+    def move(self, item, box):
+        """Updates the box of an item, only touching the buckets if the item has crossed into a different one"""
+
+        if item in self.boxes and self.cells[item] == self.cell_range(box):
+            self.boxes[item] = box
+        else:
+            self.remove(item)
+            self.insert(item, box)
+
+    def get_box(self, item):
+        """Returns the current box of an item"""
+
+        return self.boxes[item]
+
+    def query(self, box):
+        """Returns a list of the items stored in every bucket that a box covers - these items are near the box, but
+        may not actually intersect with it"""
+
+        found = dict()
+        first_cx, first_cy, last_cx, last_cy = self.cell_range(box)
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                if (cx, cy) in self.buckets:
+                    found.update(self.buckets[(cx, cy)])
+
+        return list(found)
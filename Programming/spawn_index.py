@@ -0,0 +1,88 @@
+import random
+
+
+class CandidateSet:
+    """Set of points that supports adding, removing and picking a random point, all in constant time"""
+
+    def __init__(self):
+        self.points = []
+        self.indexes = dict()
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, point):
+        return point in self.indexes
+
+    def add(self, point):
+        if point not in self.indexes:
+            self.indexes[point] = len(self.points)
+            self.points.append(point)
+
+    def discard(self, point):
+        """Removes a point if present, by moving the last point into its place"""
+
+        if point in self.indexes:
+            index = self.indexes.pop(point)
+            last_point = self.points.pop()
+            if index < len(self.points):
+                self.points[index] = last_point
+                self.indexes[last_point] = index
+
+    def choice(self):
+        return random.choice(self.points) if self.points else None
+
+
+class SpawnIndex:
+    """Lists, for each chunk of the world, the points in each biome where a mob of each navigation class (movement type
+    and clearance) that spawns in that biome can be placed, so that picking a valid spawn point is a single sample
+    rather than trying random points until one fits"""
+
+    def __init__(self, world_width, world_height, chunk_size, get_biome, fits, biome_classes):
+        self.world_width, self.world_height = world_width, world_height
+        self.chunk_size = chunk_size
+        # get_biome(x, y) is the biome of a point, and fits(navigation class, x, y) whether a mob fits at a point
+        self.get_biome = get_biome
+        self.fits = fits
+        # biome -> the navigation classes of the mobs that spawn in it
+        self.biome_classes = biome_classes
+        # (chunk, biome, navigation class) -> the points where such a mob can spawn
+        self.candidates = dict()
+
+        for y in range(world_height):
+            for x in range(world_width):
+                biome = get_biome(x, y)
+                for navigation_class in biome_classes.get(biome, []):
+                    if fits(navigation_class, x, y):
+                        self.candidates.setdefault((self.chunk_of((x, y)), biome, navigation_class),
+                                                   CandidateSet()).add((x, y))
+
+    def chunk_of(self, point):
+        return point[0] // self.chunk_size, point[1] // self.chunk_size
+
+    def update_point(self, x, y):
+        """Adds or removes a point from the candidates of every biome and navigation class after it has changed"""
+
+        chunk = self.chunk_of((x, y))
+        point_biome = self.get_biome(x, y)
+        for biome, navigation_classes in self.biome_classes.items():
+            for navigation_class in navigation_classes:
+                key = (chunk, biome, navigation_class)
+                if biome == point_biome and self.fits(navigation_class, x, y):
+                    self.candidates.setdefault(key, CandidateSet()).add((x, y))
+                elif key in self.candidates:
+                    self.candidates[key].discard((x, y))
+
+    def update_area(self, x, y, width, height):
+        """Updates every point in an (x, y, width, height) box, e.g. the points whose clearance an edit changed"""
+
+        for y_pos in range(y, y + height):
+            for x_pos in range(x, x + width):
+                self.update_point(x_pos, y_pos)
+
+    def sample(self, chunk, biome, navigation_class):
+        """Returns a random point in a chunk and biome where a mob of a navigation class can spawn, or None if there
+        are no such points"""
+
+        candidates = self.candidates.get((chunk, biome, navigation_class))
+        return candidates.choice() if candidates is not None else None
@@ -0,0 +1,98 @@
+import collections
+import threading
+import time
+
+
+# a stage of starting the game, with when it started and finished in seconds since the game was launched
+Stage = collections.namedtuple("Stage", ["name", "thread", "start", "end"])
+
+
+class StartupPipeline:
+    """Runs the slow parts of starting the game (e.g. generating the world, finding fonts) on background threads, each
+    one as soon as the tasks it needs have finished, so that the window can show their progress whilst they run. When
+    every stage starts and finishes is kept as a timeline, measured from <launch_time> (a time.perf_counter() value)"""
+
+    def __init__(self, launch_time):
+        self.launch_time = launch_time
+
+        # task name -> (function, names of the tasks that must finish first), and task name -> what it returned
+        self.tasks = dict()
+        self.results = dict()
+        self.running = set()
+        self.finished = set()
+        self.timeline = []
+        # an error from a background task, raised on the calling thread by is_finished()
+        self.error = None
+        self.changed = threading.Condition()
+
+    def add(self, name, function, needs=()):
+        """Adds a task, which is called with no arguments once every task in <needs> has finished, with what it returns
+        being kept in <results>"""
+
+        self.tasks[name] = (function, tuple(needs))
+
+    def mark(self, name, start, end=None):
+        """Records a stage that ran outside the pipeline (e.g. on the main thread), from one time.perf_counter() value
+        to another"""
+
+        if end is None:
+            end = time.perf_counter()
+        self.timeline.append(Stage(name, threading.current_thread().name, start - self.launch_time,
+                                   end - self.launch_time))
+
+    def start(self):
+        """Starts every task on its own background thread"""
+
+        for name in self.tasks:
+            threading.Thread(target=self.run_task, args=(name,), name=f"startup {name}", daemon=True).start()
+
+    def run_task(self, name):
+        function, needs = self.tasks[name]
+
+        with self.changed:
+            self.changed.wait_for(lambda: self.error is not None or self.finished.issuperset(needs))
+            if self.error is not None:
+                return
+            self.running.add(name)
+
+        start = time.perf_counter()
+        try:
+            result = function()
+        except BaseException as error:
+            with self.changed:
+                self.error = error
+                self.changed.notify_all()
+            return
+
+        with self.changed:
+            self.results[name] = result
+            self.mark(name, start)
+            self.running.discard(name)
+            self.finished.add(name)
+            self.changed.notify_all()
+
+    def is_finished(self):
+        """Returns whether every task has finished, raising the error of any task that failed"""
+
+        self.check()
+        return len(self.finished) == len(self.tasks)
+
+    def progress(self):
+        """Returns the fraction of tasks that have finished, and the names of the tasks running now"""
+
+        with self.changed:
+            return len(self.finished) / max(1, len(self.tasks)), sorted(self.running)
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        """Returns the timeline as lines of text, in the order that stages started"""
+
+        lines = ["Startup timeline (ms since launch):", f"  {'stage':<24}{'start':>9}{'end':>9}{'took':>9}"]
+        for stage in sorted(self.timeline, key=lambda stage: stage.start):
+            lines.append(f"  {stage.name:<24}{stage.start * 1000:>9.1f}{stage.end * 1000:>9.1f}"
+                         f"{(stage.end - stage.start) * 1000:>9.1f}  ({stage.thread})")
+
+        return lines
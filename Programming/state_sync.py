@@ -0,0 +1,390 @@
+import collections
+import struct
+
+import replay
+import world_save
+
+
+# a server and its clients talk in messages, each starting with its type and the length of what follows. A client
+# joins with JOIN, and is told which user it plays as and the seed of the world (which it generates for itself) by
+# WELCOME. It then sends its user's controls with CONTROLS whenever they change, whilst the server sends an UPDATE after
+# every tick with only what has changed near the user since the last UPDATE it sent them
+PROTOCOL_VERSION = 1
+DEFAULT_HOST, DEFAULT_PORT = "127.0.0.1", 7777
+FRAME = struct.Struct("<BI")
+JOIN, WELCOME, CONTROLS, UPDATE = 1, 2, 3, 4
+JOIN_MESSAGE = struct.Struct("<H")
+WELCOME_MESSAGE = struct.Struct("<HIQI")
+
+# an update is the tick it follows, and a bitmask of which sections follow it, in this order. Sections with nothing
+# in them are left out, so an update for a user standing still with nothing happening around them is a few bytes
+UPDATE_HEADER = struct.Struct("<IB")
+USER, INVENTORY, TOOLBAR, MESSAGES, PLAYERS, MOBS, CHUNKS = (1 << section for section in range(7))
+COUNT = struct.Struct("<H")
+ENTITY_ID = struct.Struct("<I")
+
+# the struct formats of the user's own (x, y, direction, health, hunger, hit, toolbar slot, inventory slot, red overlay
+# opacity), of another user's (x, y, direction, hit), and of a mob's (mob type, x, y, hostile, hit), in that order
+USER_FIELDS = ["H", "H", "B", "h", "h", "b", "B", "B", "B"]
+PLAYER_FIELDS = ["H", "H", "B", "b"]
+MOB_FIELDS = ["B", "H", "H", "?", "B"]
+DIRECTIONS = ["idle", "left", "right", "up", "down"]
+
+# a chunk's changes are its position, how many of its points changed and how many went back to the generated terrain,
+# then each changed point (by its position within the chunk, in the layout of a save's edits) and each reverted one
+CHUNK_HEADER = struct.Struct("<HHHH")
+POINT = struct.Struct("<BBdB3sBb")
+REVERTED_POINT = struct.Struct("<BB")
+
+# what a user can see of the world: their own fields (in the layout of USER_FIELDS), items, tools and messages for the
+# tick, the other users and mobs near them (id -> fields), and the chunks of terrain near them, as
+# chunk -> (how many times it has been edited, {(x, y): point} of its points that differ from the generated terrain)
+View = collections.namedtuple("View", ["user", "inventory", "toolbar", "messages", "players", "mobs", "chunks"])
+
+
+class SyncError(Exception):
+    """Raised when a server or client is sent a message it doesn't understand, or talks a different protocol version"""
+
+
+class FieldTable:
+    """Delta-encodes tuples of values that have a fixed struct format for each field, sending a bitmask of the fields
+    that changed since the last tuple that was sent, followed by only those fields"""
+
+    def __init__(self, formats):
+        self.fields = [struct.Struct("<" + field_format) for field_format in formats]
+        self.mask = struct.Struct("<B" if len(formats) <= 8 else "<H")
+
+    def pack(self, old, new):
+        """Packs the fields of <new> that are different from <old>, or every field if <old> is None"""
+
+        mask = 0
+        packed = bytearray()
+        for index, (field, value) in enumerate(zip(self.fields, new)):
+            if old is None or old[index] != value:
+                mask |= 1 << index
+                packed += field.pack(value)
+
+        return self.mask.pack(mask) + packed
+
+    def unpack(self, data, offset, old):
+        """Unpacks fields packed by pack() on top of <old>, returning the new tuple and the offset just after it"""
+
+        mask, = self.mask.unpack_from(data, offset)
+        offset += self.mask.size
+
+        values = list(old) if old is not None else [None] * len(self.fields)
+        for index, field in enumerate(self.fields):
+            if mask & (1 << index):
+                values[index], = field.unpack_from(data, offset)
+                offset += field.size
+
+        if old is None and None in values:
+            raise SyncError("update changes an entity that was never sent")
+
+        return tuple(values), offset
+
+    def pack_entities(self, old, new):
+        """Packs the changes between two id -> fields dicts, as the ids that are gone, then the id and changed fields
+        of every entity that is new or has changed, returning empty bytes if nothing changed"""
+
+        removed = [entity_id for entity_id in old if entity_id not in new]
+        changed = [(entity_id, fields) for entity_id, fields in new.items() if old.get(entity_id) != fields]
+        if not removed and not changed:
+            return b""
+
+        packed = bytearray(COUNT.pack(len(removed)))
+        for entity_id in removed:
+            packed += ENTITY_ID.pack(entity_id)
+
+        packed += COUNT.pack(len(changed))
+        for entity_id, fields in changed:
+            packed += ENTITY_ID.pack(entity_id) + self.pack(old.get(entity_id), fields)
+
+        return packed
+
+    def unpack_entities(self, data, offset, entities):
+        """Applies the changes packed by pack_entities() to an id -> fields dict, returning the offset just after
+        them"""
+
+        removed_count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for i in range(removed_count):
+            entity_id, = ENTITY_ID.unpack_from(data, offset)
+            offset += ENTITY_ID.size
+            entities.pop(entity_id, None)
+
+        changed_count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for i in range(changed_count):
+            entity_id, = ENTITY_ID.unpack_from(data, offset)
+            entities[entity_id], offset = self.unpack(data, offset + ENTITY_ID.size, entities.get(entity_id))
+
+        return offset
+
+
+USER_TABLE = FieldTable(USER_FIELDS)
+PLAYER_TABLE = FieldTable(PLAYER_FIELDS)
+MOB_TABLE = FieldTable(MOB_FIELDS)
+
+
+def pack_message(message_type, payload=b""):
+    """Puts the type and length of a message in front of it"""
+
+    return FRAME.pack(message_type, len(payload)) + payload
+
+
+async def read_message(reader):
+    """Reads the next message from an asyncio stream, returning its type and payload"""
+
+    message_type, length = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return message_type, await reader.readexactly(length)
+
+
+def pack_controls(controls):
+    """Packs a user's controls, in the same layout as they are recorded in replays"""
+
+    return replay.CONTROLS.pack(*replay.controls_values(controls))
+
+
+def unpack_controls(data):
+    """Unpacks controls packed by pack_controls(), as a tuple in the order of engine.Controls"""
+
+    if len(data) != replay.CONTROLS.size:
+        raise SyncError("controls are the wrong size")
+
+    return replay.values_controls(*replay.CONTROLS.unpack(data))
+
+
+def pack_inventory(old, new):
+    """Packs the changes between two item -> quantity dicts, as the items that are gone then the items that are new or
+    have changed in the order of <new>, so that the receiver's dict ends up in the same order (which decides the
+    inventory slots), returning empty bytes if nothing changed"""
+
+    removed = [item for item in old if item not in new]
+    changed = [item for item, quantity in new.items() if old.get(item) != quantity]
+    if not removed and not changed:
+        return b""
+
+    return world_save.pack_names(removed) + world_save.pack_names(changed) + \
+        struct.pack(f"<{len(changed)}I", *(new[item] for item in changed))
+
+
+def unpack_inventory(data, offset, inventory):
+    """Applies the changes packed by pack_inventory() to an item -> quantity dict, returning the offset just after
+    them"""
+
+    removed, offset = world_save.unpack_names(data, offset)
+    for item in removed:
+        inventory.pop(item, None)
+
+    changed, offset = world_save.unpack_names(data, offset)
+    quantities = struct.unpack_from(f"<{len(changed)}I", data, offset)
+    inventory.update(zip(changed, quantities))
+
+    return offset + 4 * len(changed)
+
+
+def pack_toolbar(old, new):
+    """Packs the tools in a tool -> material dict whose material has changed, returning empty bytes if none have"""
+
+    changed = [tool for tool, material in new.items() if old.get(tool) != material]
+    if not changed:
+        return b""
+
+    return world_save.pack_names(changed) + world_save.pack_names([new[tool] for tool in changed])
+
+
+def unpack_toolbar(data, offset, toolbar):
+    """Applies the changes packed by pack_toolbar() to a tool -> material dict, returning the offset just after them"""
+
+    tools, offset = world_save.unpack_names(data, offset)
+    materials, offset = world_save.unpack_names(data, offset)
+    toolbar.update(zip(tools, materials))
+
+    return offset
+
+
+def pack_messages(messages):
+    """Packs a tick's (text, (x, y)) messages, returning empty bytes if there are none"""
+
+    if not messages:
+        return b""
+
+    return world_save.pack_names([text for text, position in messages]) + \
+        struct.pack(f"<{2 * len(messages)}h", *(value for text, position in messages for value in position))
+
+
+def unpack_messages(data, offset):
+    """Unpacks the messages packed by pack_messages(), returning them and the offset just after them"""
+
+    texts, offset = world_save.unpack_names(data, offset)
+    positions = struct.unpack_from(f"<{2 * len(texts)}h", data, offset)
+
+    return tuple(zip(texts, zip(positions[::2], positions[1::2]))), offset + 4 * len(texts)
+
+
+def pack_chunk(chunk, chunk_size, old, new):
+    """Packs the changes between two {(x, y): point} dicts of a chunk's edited points"""
+
+    cx, cy = chunk
+    changed = [(position, point) for position, point in new.items() if old.get(position) != point]
+    reverted = [position for position in old if position not in new]
+
+    packed = bytearray(CHUNK_HEADER.pack(cx, cy, len(changed), len(reverted)))
+    for (x, y), (noise, biome, colour, object_state, durability) in changed:
+        packed += POINT.pack(x - cx * chunk_size, y - cy * chunk_size, noise, world_save.BIOMES.index(biome),
+                             bytes(colour), world_save.OBJECT_STATES.index(object_state), durability)
+    for x, y in reverted:
+        packed += REVERTED_POINT.pack(x - cx * chunk_size, y - cy * chunk_size)
+
+    return packed
+
+
+class ViewEncoder:
+    """Keeps what a server last sent to a client about their user's view of the world, packing each new View as only
+    what has changed since. Chunks are remembered after they go out of view, so they are only sent again if they are
+    edited"""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+
+        self.user = None
+        self.inventory = dict()
+        self.toolbar = dict()
+        self.players = dict()
+        self.mobs = dict()
+        # chunk -> (version, {(x, y): point}) as last sent
+        self.chunks = dict()
+
+    def pack_update(self, tick, view):
+        """Packs the update for a tick, which must be sent, as later updates only hold what changed since this one.
+        The View's inventory, toolbar and chunk edits are copied, so they can be the live ones, whilst its other parts
+        must not be changed afterwards"""
+
+        sections = [(USER, USER_TABLE.pack(self.user, view.user) if view.user != self.user else b""),
+                    (INVENTORY, pack_inventory(self.inventory, view.inventory)),
+                    (TOOLBAR, pack_toolbar(self.toolbar, view.toolbar)),
+                    (MESSAGES, pack_messages(view.messages)),
+                    (PLAYERS, PLAYER_TABLE.pack_entities(self.players, view.players)),
+                    (MOBS, MOB_TABLE.pack_entities(self.mobs, view.mobs)),
+                    (CHUNKS, self.pack_chunks(view.chunks))]
+
+        mask = 0
+        packed = bytearray()
+        for section, section_packed in sections:
+            if section_packed:
+                mask |= section
+                packed += section_packed
+
+        self.user = view.user
+        self.inventory = dict(view.inventory)
+        self.toolbar = dict(view.toolbar)
+        self.players = view.players
+        self.mobs = view.mobs
+
+        return UPDATE_HEADER.pack(tick, mask) + packed
+
+    def pack_chunks(self, chunks):
+        """Packs the chunks that have been edited since they were last sent, returning empty bytes if there are none"""
+
+        changed = [(chunk, version, edits) for chunk, (version, edits) in chunks.items()
+                   if self.chunks.get(chunk, (0, None))[0] != version]
+        if not changed:
+            return b""
+
+        packed = bytearray(COUNT.pack(len(changed)))
+        for chunk, version, edits in changed:
+            old_edits = self.chunks.get(chunk, (0, dict()))[1]
+            packed += pack_chunk(chunk, self.chunk_size, old_edits, edits)
+            self.chunks[chunk] = (version, dict(edits))
+
+        return packed
+
+
+class ClientWorld:
+    """A client's copy of what their user can see of the world, kept up to date by applying the server's updates.
+    Terrain edits are kept for each chunk, and also made to <terrain> (an OverlayTerrain generated from the server's
+    seed) once it is attached"""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+
+        self.tick = 0
+        self.user = None
+        self.inventory = dict()
+        self.toolbar = dict()
+        self.messages = ()
+        self.players = dict()
+        self.mobs = dict()
+        # chunk -> {(x, y): point} of the points that differ from the generated terrain
+        self.chunks = dict()
+        self.terrain = None
+        self.stats = {"updates": 0, "bytes": 0}
+
+    def attach_terrain(self, terrain):
+        """Starts keeping a terrain up to date, making every edit received so far to it"""
+
+        for edits in self.chunks.values():
+            for (x, y), point in edits.items():
+                terrain.edit(x, y, point)
+        self.terrain = terrain
+
+    def apply_update(self, payload):
+        """Applies an update from the server"""
+
+        self.stats["updates"] += 1
+        self.stats["bytes"] += FRAME.size + len(payload)
+
+        self.tick, mask = UPDATE_HEADER.unpack_from(payload)
+        offset = UPDATE_HEADER.size
+
+        if mask & USER:
+            self.user, offset = USER_TABLE.unpack(payload, offset, self.user)
+        if mask & INVENTORY:
+            offset = unpack_inventory(payload, offset, self.inventory)
+        if mask & TOOLBAR:
+            offset = unpack_toolbar(payload, offset, self.toolbar)
+        if mask & MESSAGES:
+            self.messages, offset = unpack_messages(payload, offset)
+        else:
+            self.messages = ()
+        if mask & PLAYERS:
+            offset = PLAYER_TABLE.unpack_entities(payload, offset, self.players)
+        if mask & MOBS:
+            offset = MOB_TABLE.unpack_entities(payload, offset, self.mobs)
+        if mask & CHUNKS:
+            offset = self.unpack_chunks(payload, offset)
+
+        if offset != len(payload):
+            raise SyncError("update is the wrong size")
+
+    def unpack_chunks(self, data, offset):
+        """Applies the chunks packed by ViewEncoder.pack_chunks(), returning the offset just after them"""
+
+        chunk_count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+
+        for i in range(chunk_count):
+            cx, cy, changed_count, reverted_count = CHUNK_HEADER.unpack_from(data, offset)
+            offset += CHUNK_HEADER.size
+            edits = self.chunks.setdefault((cx, cy), dict())
+            origin_x, origin_y = cx * self.chunk_size, cy * self.chunk_size
+
+            for j in range(changed_count):
+                x, y, noise, biome, colour, object_state, durability = POINT.unpack_from(data, offset)
+                offset += POINT.size
+                position = (origin_x + x, origin_y + y)
+                edits[position] = (noise, world_save.BIOMES[biome], tuple(colour),
+                                   world_save.OBJECT_STATES[object_state], durability)
+                if self.terrain is not None:
+                    self.terrain.edit(*position, edits[position])
+
+            for j in range(reverted_count):
+                x, y = REVERTED_POINT.unpack_from(data, offset)
+                offset += REVERTED_POINT.size
+                position = (origin_x + x, origin_y + y)
+                edits.pop(position, None)
+                if self.terrain is not None:
+                    self.terrain.edit(*position, self.terrain.base[position[1]][position[0]])
+
+        return offset
@@ -3,13 +3,22 @@ import queue
 import random
 
 
-def generate(width, height, spacing, terrain_icon_coords, point_size):
-    """Driver function that creates all the data for a world's terrain"""
-
-    terrain = perlin_noise(width, height, spacing)
-    terrain = allocate_biomes(width*spacing, height*spacing, terrain, 10)
-    terrain = colourise(terrain)
-    terrain = generate_objects(terrain, terrain_icon_coords, point_size)
+def generate(width, height, spacing, terrain_icon_coords, point_size, seed=None):
+    """Driver function that creates all the data for a world's terrain. Given a <seed>, the same terrain is made every
+    time, without changing the state of the random module for the rest of the game"""
+
+    if seed is not None:
+        state = random.getstate()
+        random.seed(seed)
+
+    try:
+        terrain = perlin_noise(width, height, spacing)
+        terrain = allocate_biomes(width*spacing, height*spacing, terrain, 10)
+        terrain = colourise(terrain)
+        terrain = generate_objects(terrain, terrain_icon_coords, point_size)
+    finally:
+        if seed is not None:
+            random.setstate(state)
 
     return terrain
 
@@ -201,6 +210,13 @@ def generate_objects(grid, terrain_icon_coords, point_size):
 
     object_sparsity = 5
 
+    # calculates sprite dimensions for each biome's object, accounting for <point_size> and scaling
+    object_sizes = dict()
+    for biome in terrain_icon_coords:
+        icon_width, icon_height = terrain_icon_coords[biome]["coords"][2:]
+        multiplier = terrain_icon_coords[biome]["scaling"] / point_size
+        object_sizes[biome] = (math.ceil(icon_width * multiplier), math.ceil(icon_height * multiplier))
+
     # generate up to the side length of the noise grid divided by <object density> terrain objects
     for i in range(len(grid) // object_sparsity):
         sx, sy = random.randint(0, len(grid[0])-1), random.randint(0, len(grid)-1)
@@ -209,11 +225,7 @@ def generate_objects(grid, terrain_icon_coords, point_size):
 
             # only three biomes generate objects
             if biome != "ocean" and biome != "caves":
-                # calculates sprite dimensions, accounting for <point_size> and scaling
-                icon_width, icon_height = terrain_icon_coords[biome]["coords"][2:]
-                multiplier = terrain_icon_coords[biome]["scaling"] / point_size
-                icon_width = math.ceil(icon_width * multiplier)
-                icon_height = math.ceil(icon_height * multiplier)
+                icon_width, icon_height = object_sizes[biome]
 
                 valid = True
                 dy = -1
@@ -237,6 +249,7 @@ def generate_objects(grid, terrain_icon_coords, point_size):
                 if valid:
                     for x, y in coords_to_change:
                         state = (x, y) == (sx, sy)
-                        grid[y][x] = [*grid[y][x][:3], state]
+                        grid[y][x] = (*grid[y][x][:3], state, grid[y][x][4])
 
     return grid
+
@@ -0,0 +1,112 @@
+import copy
+
+
+class OverlayTerrain:
+    """Terrain made up of a procedurally generated base, which can always be made again from the seed and parameters
+    it was generated with, and a sparse overlay of the points that have been changed since, kept for each chunk of
+    <chunk_size> x <chunk_size> points. It can be used in the same way as the nested lists made by
+    terrain_gen.generate(), where reading terrain[y][x] checks the overlay before the base, and so only the edits ever
+    need saving"""
+
+    def __init__(self, base, chunk_size, seed, parameters):
+        self.base = base
+        self.chunk_size = chunk_size
+        self.seed = seed
+        # the (width, height, spacing) that terrain_gen.generate() made the base with
+        self.parameters = parameters
+        self.width, self.height = len(base[0]), len(base)
+
+        # chunk -> {(x, y): point} for every point in the chunk that is different from the base, and chunk -> how many
+        # times the chunk has been edited, so that anything copying the edits (e.g. a server) can tell what changed
+        self.edits = dict()
+        self.versions = dict()
+        # chunk -> how many of its edits changed how it looks (its biome, colour or objects), so that anything drawing
+        # the terrain (e.g. terrain_render) can tell when to draw a chunk again
+        self.appearance_versions = dict()
+        # chunks whose edits are shared with a snapshot, which are copied before they are next changed
+        self.shared_chunks = set()
+        self.rows = [OverlayRow(self, y) for y in range(self.height)]
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        return self.rows[y]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def chunk_of(self, point):
+        return point[0] // self.chunk_size, point[1] // self.chunk_size
+
+    def edit(self, x, y, point):
+        """Changes a point, keeping it in the overlay only whilst it is different from the base"""
+
+        chunk = self.chunk_of((x, y))
+        self.versions[chunk] = self.versions.get(chunk, 0) + 1
+        if tuple(point[1:4]) != tuple(self[y][x][1:4]):
+            self.appearance_versions[chunk] = self.appearance_versions.get(chunk, 0) + 1
+        if chunk in self.shared_chunks:
+            self.shared_chunks.discard(chunk)
+            self.edits[chunk] = dict(self.edits[chunk])
+
+        if tuple(point) == tuple(self.base[y][x]):
+            chunk_edits = self.edits.get(chunk)
+            if chunk_edits is not None:
+                chunk_edits.pop((x, y), None)
+                if not chunk_edits:
+                    del self.edits[chunk]
+        else:
+            self.edits.setdefault(chunk, dict())[(x, y)] = tuple(point)
+
+    def snapshot(self):
+        """Returns a read-only copy of the terrain as it is now, which can be saved on another thread whilst this
+        terrain changes. The copy shares the edits of every chunk (and the base) with this terrain, with a chunk's
+        edits only being copied once this terrain changes them, so taking a snapshot is cheap"""
+
+        frozen = copy.copy(self)
+        frozen.edits = dict(self.edits)
+        frozen.versions = dict(self.versions)
+        frozen.appearance_versions = dict(self.appearance_versions)
+        frozen.shared_chunks = set()
+        frozen.rows = [OverlayRow(frozen, y) for y in range(self.height)]
+        self.shared_chunks = set(self.edits)
+
+        return frozen
+
+    def edited_points(self):
+        """Returns every (x, y, point) in the overlay, chunk by chunk"""
+
+        return [(x, y, point) for chunk in sorted(self.edits) for (x, y), point in sorted(self.edits[chunk].items())]
+
+
+class OverlayRow:
+    """A single row of an OverlayTerrain"""
+
+    __slots__ = ("terrain", "y", "chunk_y", "base_row")
+
+    def __init__(self, terrain, y):
+        self.terrain = terrain
+        self.y = y
+        self.chunk_y = y // terrain.chunk_size
+        self.base_row = terrain.base[y]
+
+    def __len__(self):
+        return self.terrain.width
+
+    def __iter__(self):
+        return (self[x] for x in range(self.terrain.width))
+
+    def __getitem__(self, x):
+        terrain = self.terrain
+        if terrain.edits:
+            chunk_edits = terrain.edits.get((x // terrain.chunk_size, self.chunk_y))
+            if chunk_edits is not None:
+                point = chunk_edits.get((x, self.y))
+                if point is not None:
+                    return point
+
+        return self.base_row[x]
+
+    def __setitem__(self, x, point):
+        self.terrain.edit(x, self.y, point)
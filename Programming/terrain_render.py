@@ -0,0 +1,178 @@
+import math
+
+import pygame
+
+
+# each zoom level halves the size of a point, so every mip level is half the size of the one before it
+ZOOM_LEVELS = 5
+CHUNK_SIZE = 40
+
+
+class Camera:
+    """The portion of the world shown in the game window, at a given zoom level"""
+
+    def __init__(self, centre, zoom_level, point_size, window_size, world_size):
+        self.zoom_level = zoom_level
+        self.tile_size = point_size / 2 ** zoom_level
+
+        # the number of points that fit across the window at this zoom level
+        view_width = window_size[0] / self.tile_size
+        view_height = window_size[1] / self.tile_size
+
+        # keep the view inside the world, or centre the whole world if the view is larger than it
+        self.x_min = self.clamp(centre[0] - view_width / 2, view_width, world_size[0])
+        self.y_min = self.clamp(centre[1] - view_height / 2, view_height, world_size[1])
+        self.x_max = self.x_min + view_width
+        self.y_max = self.y_min + view_height
+
+    @staticmethod
+    def clamp(view_min, view_length, world_length):
+        """Clamps the start of the view along one axis so that it does not show past the edge of the world"""
+
+        if view_length >= world_length:
+            return (world_length - view_length) / 2
+
+        return max(0, min(round(view_min), world_length - view_length))
+
+    def to_window(self, position):
+        """Converts world coordinates to window coordinates (scaling)"""
+
+        return (round((position[0] - self.x_min) * self.tile_size),
+                round((position[1] - self.y_min) * self.tile_size))
+
+    def to_world(self, position):
+        """Converts window coordinates, such as the mouse position, to the grid position beneath them"""
+
+        return (math.floor(self.x_min + position[0] / self.tile_size),
+                math.floor(self.y_min + position[1] / self.tile_size))
+
+    def is_visible(self, position, width, height):
+        """Returns whether a box of points starting at <position> is at least partially within the view"""
+
+        return (position[0] + width > self.x_min and position[0] < self.x_max and
+                position[1] + height > self.y_min and position[1] < self.y_max)
+
+
+class TerrainRenderer:
+    """Draws the terrain from pre-rendered chunk surfaces, downsampled once per zoom level (mip-mapping), so that
+    the cost of drawing a frame depends on the number of visible chunks rather than the number of visible points"""
+
+    def __init__(self, terrain, point_size, terrain_icon_coords, get_object_sprite):
+        self.terrain = terrain
+        self.point_size = point_size
+        self.get_object_sprite = get_object_sprite
+        self.world_width, self.world_height = len(terrain[0]), len(terrain)
+
+        # chunk surfaces are only rendered when first seen, then kept for every zoom level until the terrain's edits
+        # change how the chunk looks, with the chunk's version (see chunk_version()) it was rendered at
+        self.chunk_mips = dict()
+        self.chunk_versions = dict()
+        self.chunk_objects = dict()
+        self.object_sprites = dict()
+        # the number of surfaces blitted to the window so far
+        self.stats = {"blits": 0}
+
+        # the furthest an object's sprite can reach beyond its starting point, so objects can be culled by chunk
+        self.object_reach = 0
+        for icon in terrain_icon_coords.values():
+            self.object_reach = max(self.object_reach,
+                                    math.ceil(max(icon["coords"][2:]) * icon["scaling"] / point_size))
+
+    def draw(self, window, camera):
+        """Blits every visible terrain chunk and terrain object for a camera to the window"""
+
+        # clear the border around the world when zoomed out further than the world's size
+        if camera.x_min < 0 or camera.y_min < 0:
+            window.fill((0, 0, 0))
+
+        for cx, cy in self.visible_chunks(camera, 0):
+            chunk_surface = self.get_chunk(cx, cy)[camera.zoom_level]
+            window.blit(chunk_surface, camera.to_window((cx * CHUNK_SIZE, cy * CHUNK_SIZE)))
+            self.stats["blits"] += 1
+
+        # objects can overhang into the chunks below and to the right of them, so look slightly further up and left
+        for cx, cy in self.visible_chunks(camera, self.object_reach):
+            for col, row, biome in self.chunk_objects[(cx, cy)]:
+                sprite = self.get_scaled_object_sprite(biome, camera.zoom_level)
+                if camera.is_visible((col, row), sprite.get_width() / camera.tile_size,
+                                     sprite.get_height() / camera.tile_size):
+                    window.blit(sprite, camera.to_window((col, row)))
+                    self.stats["blits"] += 1
+
+    def visible_chunks(self, camera, padding):
+        """Generates the (x, y) index of every chunk within the view of a camera, plus <padding> points up and left"""
+
+        first_cx = max(0, int(camera.x_min - padding) // CHUNK_SIZE)
+        first_cy = max(0, int(camera.y_min - padding) // CHUNK_SIZE)
+        last_cx = min(math.ceil(self.world_width / CHUNK_SIZE), math.ceil(camera.x_max / CHUNK_SIZE))
+        last_cy = min(math.ceil(self.world_height / CHUNK_SIZE), math.ceil(camera.y_max / CHUNK_SIZE))
+
+        for cy in range(first_cy, last_cy):
+            for cx in range(first_cx, last_cx):
+                self.get_chunk(cx, cy)
+                yield cx, cy
+
+    def chunk_version(self, cx, cy):
+        """Returns how many times the edits to a chunk have changed how it looks, for terrain that keeps count (e.g.
+        terrain_overlay.OverlayTerrain), or 0 for terrain that never changes how it looks"""
+
+        appearance_versions = getattr(self.terrain, "appearance_versions", None)
+        if not appearance_versions:
+            return 0
+
+        # the terrain's chunks may be a different size to the renderer's, so every one that overlaps is counted
+        terrain_chunk_size = self.terrain.chunk_size
+        x_start, y_start = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+        return sum(appearance_versions.get((terrain_cx, terrain_cy), 0)
+                   for terrain_cy in range(y_start // terrain_chunk_size,
+                                           (y_start + CHUNK_SIZE - 1) // terrain_chunk_size + 1)
+                   for terrain_cx in range(x_start // terrain_chunk_size,
+                                           (x_start + CHUNK_SIZE - 1) // terrain_chunk_size + 1))
+
+    def get_chunk(self, cx, cy):
+        """Returns the list of mip levels for a chunk, rendering the chunk and indexing its objects on first use, and
+        again whenever edits have changed how it looks"""
+
+        version = self.chunk_version(cx, cy)
+        if self.chunk_versions.get((cx, cy)) != version:
+            x_start, y_start = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+            x_end = min(x_start + CHUNK_SIZE, self.world_width)
+            y_end = min(y_start + CHUNK_SIZE, self.world_height)
+
+            # full-size chunk, drawn point by point once
+            surface = pygame.Surface(((x_end - x_start) * self.point_size, (y_end - y_start) * self.point_size),
+                                     0, 32)
+            objects = []
+            for row in range(y_start, y_end):
+                for col in range(x_start, x_end):
+                    point = self.terrain[row][col]
+                    pygame.draw.rect(surface, point[2], ((col - x_start) * self.point_size,
+                                                         (row - y_start) * self.point_size,
+                                                         self.point_size, self.point_size))
+                    if point[3]:
+                        objects.append((col, row, point[1]))
+
+            # each mip level is downsampled from the level before it
+            mips = [surface]
+            for zoom_level in range(1, ZOOM_LEVELS):
+                width = max(1, surface.get_width() // 2 ** zoom_level)
+                height = max(1, surface.get_height() // 2 ** zoom_level)
+                mips.append(pygame.transform.smoothscale(mips[-1], (width, height)))
+
+            self.chunk_mips[(cx, cy)] = mips
+            self.chunk_objects[(cx, cy)] = objects
+            self.chunk_versions[(cx, cy)] = version
+
+        return self.chunk_mips[(cx, cy)]
+
+    def get_scaled_object_sprite(self, biome, zoom_level):
+        """Returns a terrain object's sprite, scaled once for a given zoom level"""
+
+        if (biome, zoom_level) not in self.object_sprites:
+            sprite, scaling = self.get_object_sprite(biome)
+            scaling /= 2 ** zoom_level
+            width = max(1, round(sprite.get_width() * scaling))
+            height = max(1, round(sprite.get_height() * scaling))
+            self.object_sprites[(biome, zoom_level)] = pygame.transform.scale(sprite, (width, height))
+
+        return self.object_sprites[(biome, zoom_level)]
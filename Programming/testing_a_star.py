@@ -1,4 +1,15 @@
+import argparse
+import collections
+import csv
 import math
+import random
+import time
+
+import flow_field
+import navigation
+import pathfinding
+import terrain_gen
+
 
 grids = [
     [["#", "#", "#", "#", "#", "#", "#", "#"],
@@ -19,12 +30,32 @@ grids = [
      ["#", "#", "#", "#", "#", "#", "#", "#"]]
 ]
 
+# the same natural objects as main.py, so that generated terrain has the same obstacles as the game's world
+TERRAIN_ICON_COORDS = {"plains": {"coords": [62, 77, 392, 344], "scaling": 0.1},
+                       "desert": {"coords": [62, 46, 138, 164], "scaling": 0.3},
+                       "forest": {"coords": [2, 41, 68, 87], "scaling": 0.8}}
+POINT_SIZE = 10
+SPACING = 10
+
+# every pathfinding engine that the game ships, in the order they are reported
+ENGINES = ["A*", "LPA*", "flow field", "HPA*"]
+# HPA* is benchmarked for a mob that only needs a single free point, with the game's chunk size
+NAVIGATION_CLASS = ("land", (1, 1))
+NAVIGATION_CHUNK_SIZE = 20
+
+REPORT_COLUMNS = ["map", "case", "engine", "result", "correct", "expansions", "time (ms)", "cost", "optimality"]
+
+# a grid of points that are either walkable (1) or an obstacle (0), as rows of bytes
+ObstacleMap = collections.namedtuple("ObstacleMap", ["name", "width", "height", "walkable"])
+# a start and goal to find a path between, and whether there is a path between them at all
+Case = collections.namedtuple("Case", ["obstacle_map", "kind", "start", "goal", "reachable"])
+
 
 def test(grid_index):
     """Selects a grid from <test_grids> and calls A_Star() to find a path from S (start) to E (end)"""
 
     grid = grids[grid_index]
-    path = A_Star((1, 1), (6, 6), grid)
+    path = pathfinding.A_Star((1, 1), (6, 6), grid, lambda x, y: grid[y][x] != "#", pathfinding.FOUR_DIRECTIONS)
 
     for row in range(len(grid)):
         for col in range(len(grid[0])):
@@ -36,95 +67,329 @@ def test(grid_index):
     print()
 
 
-def A_Star(start, end, grid):
-    """Implementation of A* algorithm for a 2D grid of values indicating whether each cell in the grid is an obstacle or
-    not, returning the almost perfectly optimised path from a start to end location in the grid, using heuristics"""
+def is_walkable_in(obstacle_map):
+    """Returns an is_walkable(x, y) function for an obstacle map"""
+
+    walkable = obstacle_map.walkable
+
+    def is_walkable(x, y):
+        return walkable[y][x] == 1
+
+    return is_walkable
+
+
+def maze_map(grid_index):
+    """Converts one of the hand-written mazes in <grids> to an obstacle map"""
+
+    grid = grids[grid_index]
+    return ObstacleMap(f"maze {grid_index + 1}", len(grid[0]), len(grid),
+                       [bytearray(point != "#" for point in row) for row in grid])
+
+
+def generate_obstacle_map(size, density):
+    """Generates a square obstacle map by scattering rectangular blocks and long thin walls until about <density> of
+    the points are obstacles"""
+
+    walkable = [bytearray(b"\x01") * size for y in range(size)]
+    max_side = max(2, size // 16)
+    blocked, target = 0, int(size * size * density)
+
+    while blocked < target:
+        width, height = random.randint(1, max_side), random.randint(1, max_side)
+        # half of the obstacles are walls, one point thick
+        if random.random() < 0.5:
+            if random.random() < 0.5:
+                width = 1
+            else:
+                height = 1
+
+        x, y = random.randint(0, size - width), random.randint(0, size - height)
+        for row in walkable[y:y + height]:
+            blocked += row[x:x + width].count(1)
+            row[x:x + width] = bytes(width)
+
+    return ObstacleMap(f"obstacles {size}", size, size, walkable)
+
+
+def generate_terrain_map(size):
+    """Generates a world with terrain_gen.generate(), as the game does, where land mobs can walk on any land point
+    without a natural object"""
+
+    terrain = terrain_gen.generate(size // SPACING, size // SPACING, SPACING, TERRAIN_ICON_COORDS, POINT_SIZE)
+    walkable = [bytearray(point[3] is None and point[1] != "ocean" for point in row) for row in terrain]
+
+    return ObstacleMap(f"terrain {len(walkable[0])}", len(walkable[0]), len(walkable), walkable)
+
+
+def seal(obstacle_map, point, radius=2):
+    """Returns a copy of an obstacle map with a ring of obstacles <radius> points around a point, so that nothing
+    outside the ring can reach it"""
+
+    walkable = [bytearray(row) for row in obstacle_map.walkable]
+    for y in range(point[1] - radius, point[1] + radius + 1):
+        for x in range(point[0] - radius, point[0] + radius + 1):
+            on_ring = max(abs(x - point[0]), abs(y - point[1])) == radius
+            if on_ring and 0 <= x < obstacle_map.width and 0 <= y < obstacle_map.height:
+                walkable[y][x] = 0
+
+    return obstacle_map._replace(name=f"{obstacle_map.name} (sealed)", walkable=walkable)
+
+
+def label_regions(obstacle_map):
+    """Labels every walkable point with the region of points it can reach (moving in eight directions), returning a
+    flat list of labels (0 for obstacles) and the size of each region"""
+
+    width, height, walkable = obstacle_map.width, obstacle_map.height, obstacle_map.walkable
+    labels = [0] * (width * height)
+    sizes = dict()
+
+    for y in range(height):
+        for x in range(width):
+            if not walkable[y][x] or labels[y * width + x]:
+                continue
+
+            # flood fill a new region outwards from this point
+            label = len(sizes) + 1
+            labels[y * width + x] = label
+            sizes[label] = 0
+            to_visit = collections.deque([(x, y)])
+            while to_visit:
+                x_pos, y_pos = to_visit.popleft()
+                sizes[label] += 1
+                for dx, dy in pathfinding.EIGHT_DIRECTIONS:
+                    nx, ny = x_pos + dx, y_pos + dy
+                    if 0 <= nx < width and 0 <= ny < height and walkable[ny][nx] and not labels[ny * width + nx]:
+                        labels[ny * width + nx] = label
+                        to_visit.append((nx, ny))
+
+    return labels, sizes
+
+
+def choose_cases(obstacle_map, pairs):
+    """Picks <pairs> reachable start and goal points far apart in the largest region of a map, plus unreachable cases:
+    a goal in another region (if there is one) and a goal sealed off inside a ring of obstacles"""
+
+    width = obstacle_map.width
+    labels, sizes = label_regions(obstacle_map)
+    main_label = max(sizes, key=sizes.get)
+    main_points = [(index % width, index // width) for index, label in enumerate(labels) if label == main_label]
+    min_distance = max(obstacle_map.width, obstacle_map.height) / 2
+
+    def far_pair():
+        start, goal = random.choice(main_points), random.choice(main_points)
+        for attempt in range(100):
+            if pathfinding.octile_distance(start, goal) >= min_distance:
+                break
+            start, goal = random.choice(main_points), random.choice(main_points)
+        return start, goal
+
+    cases = []
+    for i in range(pairs):
+        cases.append(Case(obstacle_map, "reachable", *far_pair(), True))
+
+    other_points = [(index % width, index // width) for index, label in enumerate(labels)
+                    if label and label != main_label]
+    if other_points:
+        cases.append(Case(obstacle_map, "other region", random.choice(main_points), random.choice(other_points),
+                          False))
+
+    start, goal = far_pair()
+    cases.append(Case(seal(obstacle_map, goal), "sealed goal", start, goal, False))
+
+    return cases
+
+
+def follow_flow_field(field, start, goal):
+    """Returns the path from <start> to <goal> given by a flow field's next steps, or None if there isn't one"""
+
+    path = []
+    position = start
+    while position != goal:
+        position = field.next_step(position)
+        if position is None:
+            return None
+        path.append(position)
+
+    return path
+
+
+def run_engine(engine, case, navigation_grid):
+    """Finds a path for a case with one pathfinding engine, returning (path or None, expansions, seconds).
+
+    Every engine starts cold, apart from HPA*'s clearance map and chunk graphs (in <navigation_grid>), which are
+    built once per map beforehand as the game does at start-up"""
+
+    obstacle_map, start, goal = case.obstacle_map, case.start, case.goal
+    width, height = obstacle_map.width, obstacle_map.height
+    is_walkable = is_walkable_in(obstacle_map)
+    stats = {"expansions": 0}
+
+    if engine == "HPA*":
+        navigation_grid.stats["expansions"] = 0
+
+    start_time = time.perf_counter()
+    if engine == "A*":
+        path = pathfinding.A_Star(start, goal, obstacle_map.walkable, is_walkable, stats=stats)
+        # A* heads for the closest point it found when the goal can't be reached, which doesn't count as a path
+        if start != goal and (not path or path[-1] != goal):
+            path = None
+    elif engine == "LPA*":
+        planner = pathfinding.IncrementalPlanner(start, width, height, is_walkable, stats=stats)
+        path = planner.find_path(start, goal)
+    elif engine == "flow field":
+        field = flow_field.FlowField(goal, max(width, height), width, height, flow_field.rows_of(is_walkable), stats)
+        path = follow_flow_field(field, start, goal)
+    else:
+        path = navigation_grid.find_path(NAVIGATION_CLASS, start, goal)
+        stats["expansions"] = navigation_grid.stats["expansions"]
+    seconds = time.perf_counter() - start_time
+
+    return path, stats["expansions"], seconds
+
+
+def path_cost(obstacle_map, start, path):
+    """Returns the cost of a path, or None if it isn't a valid path (every step must be to a neighbouring walkable
+    point, apart from the last, as the goal doesn't need to be walkable)"""
+
+    cost = 0
+    position = start
+    for index, point in enumerate(path):
+        dx, dy = abs(point[0] - position[0]), abs(point[1] - position[1])
+        if max(dx, dy) != 1 or (index < len(path) - 1 and not obstacle_map.walkable[point[1]][point[0]]):
+            return None
+        cost += pathfinding.DIAGONAL_COST if dx and dy else 1
+        position = point
+
+    return cost
+
+
+def optimal_cost(case):
+    """Returns the cost of the shortest path for a case, by Dijkstra's algorithm, or None if there isn't one"""
+
+    obstacle_map = case.obstacle_map
+    width, height = obstacle_map.width, obstacle_map.height
+    field = flow_field.FlowField(case.goal, max(width, height), width, height,
+                                 flow_field.rows_of(is_walkable_in(obstacle_map)))
+    cost = field.costs[field.index(case.start)]
+
+    return None if cost == math.inf else cost
+
+
+def run_case(case, engines, navigation_grid):
+    """Runs every engine on a case, returning a row of <REPORT_COLUMNS> for each"""
+
+    results = {engine: run_engine(engine, case, navigation_grid) for engine in engines}
+
+    # flow fields are built by Dijkstra's algorithm, so one already gives the optimal cost
+    if "flow field" in results:
+        flow_path = results["flow field"][0]
+        best_cost = path_cost(case.obstacle_map, case.start, flow_path) if flow_path is not None else None
+    else:
+        best_cost = optimal_cost(case)
 
-    def heuristic(start, end):
-        """Heuristic for A* algorithm, calculating the Pythagorean distance between two 2D grid points"""
+    rows = []
+    for engine, (path, expansions, seconds) in results.items():
+        cost = path_cost(case.obstacle_map, case.start, path) if path is not None else None
+        # a correct result is a valid path to the goal when there is one, and no path when there isn't
+        if path is None:
+            correct = not case.reachable
+        else:
+            correct = case.reachable and cost is not None and (not path or path[-1] == case.goal)
 
-        return math.sqrt((start[0] - end[0]) ** 2 + (start[1] - end[1]) ** 2)
+        if cost is not None and best_cost:
+            optimality = f"{cost / best_cost:.3f}"
+        else:
+            optimality = "-"
+        rows.append([case.obstacle_map.name, case.kind, engine, "path" if path is not None else "none",
+                     "yes" if correct else "NO", expansions, f"{seconds * 1000:.1f}",
+                     f"{cost:.1f}" if cost is not None else "-", optimality])
 
-    open_set = PriorityQueue() # nodes to be evaluated
-    open_set.enqueue(start, 0)
+    return rows
 
-    path = dict() # stores the best path to a node
-    gScore = dict() # cost from one node to another node
-    gScore[start] = 0
-    fScore = dict() # estimated total cost (gScore + heuristic)
-    fScore[start] = heuristic(start, end)
 
-    while not open_set.isEmpty():
-        current_node = open_set.pop() # pop the element with the lowest priority
+def build_navigation_grid(obstacle_map):
+    """Returns the HPA* navigation grid for an obstacle map, with its clearance map and chunk graphs already built"""
 
-        if current_node == end:
-            # if a path has been found from the start to the end, reconstruct and return this path
-            sequence = []
-            while current_node in path:
-                sequence.append(current_node)
-                current_node = path[current_node]
-            return list(reversed(sequence))
+    is_walkable = is_walkable_in(obstacle_map)
 
-        neighbours = []
-        for direction in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-            x_pos, y_pos = current_node[0] + direction[0], current_node[1] + direction[1]
-            # checks if in bounds and not an obstacle
-            if 0 <= x_pos < len(grid[0]) and 0 <= y_pos < len(grid) and grid[y_pos][x_pos] != "#":
-                neighbours.append((x_pos, y_pos))
+    def is_walkable_by(movement, x, y):
+        return is_walkable(x, y)
 
-        for neighbour in neighbours:
-            # new cost from <current_node> to <neighbour>
-            new_gScore = gScore[current_node] + 1
+    navigation_grid = navigation.NavigationGrid(obstacle_map.width, obstacle_map.height, is_walkable_by,
+                                                [NAVIGATION_CLASS[0]], max(NAVIGATION_CLASS[1]), NAVIGATION_CHUNK_SIZE)
+    navigation_grid.build_chunk_graphs([NAVIGATION_CLASS])
 
-            # check whether the new cost is the minimum cost
-            if neighbour not in gScore or new_gScore < gScore[neighbour]:
-                # update the cost from <current_node> to <neighbour> & the heuristic cost from <start> to <neighbour>
-                gScore[neighbour] = new_gScore
-                fScore[neighbour] = gScore[neighbour] + heuristic(neighbour, end)
-                path[neighbour] = current_node
+    return navigation_grid
 
-                # if the neighbour has not yet been explored at all, add it to the priority queue
-                if neighbour not in open_set:
-                    open_set.enqueue(neighbour, fScore[neighbour])
 
-    # if no path can be found, the mob cannot move towards the player
-    return []
+def format_row(row):
+    """Lines a row of the report up under its columns"""
 
+    return f"{row[0]:<24}{row[1]:<14}{row[2]:<12}" + "".join(f"{value:>12}" for value in map(str, row[3:]))
 
-class PriorityQueue(object):
-    """Priority queue implementation as required by the A* algorithm, popping the lowest priority items first"""
 
-    def __init__(self):
-        self.queue = []
+def build_maps(sizes, terrain_sizes, density):
+    """Yields the maps to benchmark: the hand-written mazes, then generated obstacle maps and terrain, smallest
+    first"""
 
-    def __iter__(self):
-        """Returns an iterable object so that iterable methods like 'in' can be used on the queue"""
+    for grid_index in range(len(grids)):
+        yield maze_map(grid_index)
+    for size in sizes:
+        yield generate_obstacle_map(size, density)
+    for size in terrain_sizes:
+        yield generate_terrain_map(size)
 
-        return iter(self.queue)
 
-    def isEmpty(self):
-        """Returns a boolean for whether the queue is empty"""
+def run_suite(seed, sizes, terrain_sizes, density, pairs, engines, csv_path):
+    """Benchmarks each engine on every case of every map, printing each row as it finishes"""
 
-        return len(self.queue) == 0
+    random.seed(seed)
+    rows = []
+    print(format_row(REPORT_COLUMNS))
 
-    def enqueue(self, data, priority):
-        """Adds a new element to the priority queue"""
+    for obstacle_map in build_maps(sizes, terrain_sizes, density):
+        if obstacle_map.name.startswith("maze"):
+            # the mazes are too small to pick cases from, so their S and E are used
+            cases = [Case(obstacle_map, "S to E", (1, 1), (6, 6), obstacle_map.name == "maze 1"),
+                     Case(seal(obstacle_map, (6, 6), 1), "sealed goal", (1, 1), (6, 6), False)]
+        else:
+            cases = choose_cases(obstacle_map, pairs)
 
-        self.queue.append((data, priority))
+        for case in cases:
+            navigation_grid = build_navigation_grid(case.obstacle_map) if "HPA*" in engines else None
 
-    def pop(self):
-        """Pops the lowest priority item in the priority queue"""
+            for row in run_case(case, engines, navigation_grid):
+                rows.append(row)
+                print(format_row(row))
 
-        min_priority = float("inf")
-        for item in self.queue:
-            # if the item has a lower priority, it becomes the prospective item to pop
-            if item[1] < min_priority:
-                min_data, min_priority = item
-        self.queue.remove((min_data, min_priority))
+    if csv_path is not None:
+        with open(csv_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(REPORT_COLUMNS)
+            writer.writerows(rows)
+        print(f"Results written to {csv_path}")
 
-        return min_data
+    return rows
 
 
 if __name__ == "__main__":
-    test(0)
-    test(1)
+    parser = argparse.ArgumentParser(description="Benchmark of every pathfinding engine on mazes, generated obstacle "
+                                                 "maps and generated terrain")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for generating maps and cases")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[64, 256, 1024],
+                        help="side lengths of the generated obstacle maps")
+    parser.add_argument("--terrain-sizes", type=int, nargs="*", default=[200],
+                        help="side lengths of the generated terrain maps (multiples of 10)")
+    parser.add_argument("--density", type=float, default=0.25, help="fraction of obstacle map points to block")
+    parser.add_argument("--pairs", type=int, default=2, help="number of reachable cases per generated map")
+    parser.add_argument("--engines", nargs="*", default=ENGINES, choices=ENGINES, help="engines to benchmark")
+    parser.add_argument("--csv", default=None, help="file to write the results to")
+    parser.add_argument("--mazes", action="store_true", help="only print A*'s paths through the hand-written mazes")
+    arguments = parser.parse_args()
+
+    if arguments.mazes:
+        test(0)
+        test(1)
+    else:
+        run_suite(arguments.seed, arguments.sizes, arguments.terrain_sizes, arguments.density, arguments.pairs,
+                  arguments.engines, arguments.csv)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the game's modules sit side by side in Programming, and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+import random
+
+import clearance
+
+
+WIDTH, HEIGHT, MAX_CLEARANCE = 30, 20, 5
+
+
+def make_grid(seed):
+    rng = random.Random(seed)
+    return [[rng.random() > 0.03 for x in range(WIDTH)] for y in range(HEIGHT)]
+
+
+def fits_brute_force(grid, x, y, width, height):
+    return 0 <= x and x + width <= WIDTH and 0 <= y and y + height <= HEIGHT and \
+        all(grid[y + dy][x + dx] for dy in range(height) for dx in range(width))
+
+
+def test_update_area_matches_fresh_map():
+    rng = random.Random(3)
+    grid = make_grid(3)
+    clearance_map = clearance.ClearanceMap(WIDTH, HEIGHT, lambda x, y: grid[y][x], MAX_CLEARANCE)
+
+    for i in range(200):
+        x, y = rng.randrange(WIDTH), rng.randrange(HEIGHT)
+        width, height = rng.randint(1, 4), rng.randint(1, 4)
+        for dy in range(height):
+            for dx in range(width):
+                if x + dx < WIDTH and y + dy < HEIGHT:
+                    grid[y + dy][x + dx] = rng.random() > 0.2
+
+        old_values = bytes(clearance_map.values)
+        box, changes = clearance_map.update_area(x, y, width, height)
+        fresh_map = clearance.ClearanceMap(WIDTH, HEIGHT, lambda x, y: grid[y][x], MAX_CLEARANCE)
+        assert clearance_map.values == fresh_map.values
+
+        # every change is reported once, and all of them are inside the recalculated box
+        expected_changes = {(index % WIDTH, index // WIDTH, old, new) for index, (old, new) in
+                            enumerate(zip(old_values, fresh_map.values)) if old != new}
+        assert len(changes) == len(expected_changes) and set(changes) == expected_changes
+        box_x, box_y, box_width, box_height = box
+        assert all(box_x <= x_pos < box_x + box_width and box_y <= y_pos < box_y + box_height
+                   for x_pos, y_pos, old, new in changes)
+
+
+def test_rectangles_match_brute_force():
+    grid = make_grid(7)
+    clearance_map = clearance.ClearanceMap(WIDTH, HEIGHT, lambda x, y: grid[y][x], MAX_CLEARANCE)
+
+    for width, height in [(1, 1), (2, 2), (3, 1), (1, 3), (2, 5), (5, 3), (4, 4)]:
+        for y in range(-1, HEIGHT + 1):
+            expected = [fits_brute_force(grid, x, y, width, height) for x in range(-2, WIDTH + 2)]
+            assert [clearance_map.fits_rectangle(x, y, width, height) for x in range(-2, WIDTH + 2)] == expected
+            assert list(clearance_map.fits_row(-2, y, WIDTH + 4, width, height)) == expected
@@ -0,0 +1,73 @@
+import math
+import random
+
+import pathfinding
+
+
+WIDTH, HEIGHT = 32, 24
+
+
+def path_cost(start, path):
+    cost = 0
+    for (x_start, y_start), (x_end, y_end) in zip([start] + path, path):
+        assert max(abs(x_end - x_start), abs(y_end - y_start)) == 1
+        cost += pathfinding.DIAGONAL_COST if x_end != x_start and y_end != y_start else 1
+    return cost
+
+
+def fresh_path(grid, start, goal):
+    """Returns the cost of the optimal path found by A_Star(), or None if the goal can't be reached"""
+
+    path = pathfinding.A_Star(start, goal, grid, lambda x, y: grid[y][x])
+    if (path[-1] if path else start) != goal:
+        return None
+    return path_cost(start, path)
+
+
+def test_a_star_budget_returns_closest_node():
+    grid = [[True] * WIDTH for y in range(HEIGHT)]
+    stats = dict()
+    path = pathfinding.A_Star((0, 0), (WIDTH - 1, HEIGHT - 1), grid, lambda x, y: grid[y][x], max_expansions=5,
+                              stats=stats)
+
+    assert stats["expansions"] == 5
+    assert path and path[-1] != (WIDTH - 1, HEIGHT - 1)
+    assert pathfinding.octile_distance(path[-1], (WIDTH - 1, HEIGHT - 1)) < \
+        pathfinding.octile_distance((0, 0), (WIDTH - 1, HEIGHT - 1))
+
+
+def test_incremental_planner_repairs_to_fresh_a_star():
+    rng = random.Random(11)
+    grid = [[rng.random() > 0.3 for x in range(WIDTH)] for y in range(HEIGHT)]
+    position, goal = (0, 0), (WIDTH - 1, HEIGHT - 1)
+    planner = pathfinding.IncrementalPlanner(position, WIDTH, HEIGHT, lambda x, y: grid[y][x])
+
+    for step in range(150):
+        # walls are added and removed, and the goal wanders, with the planner told about each changed point
+        for i in range(rng.randint(0, 6)):
+            point = (rng.randrange(WIDTH), rng.randrange(HEIGHT))
+            if point not in (position, goal):
+                grid[point[1]][point[0]] = not grid[point[1]][point[0]]
+                planner.update_point(point)
+        if step % 10 == 0:
+            goal = (rng.randrange(WIDTH), rng.randrange(HEIGHT))
+            grid[goal[1]][goal[0]] = True
+        elif step % 10 == 5:
+            # the goal is walled in for a while, so that it can't be reached
+            for (x, y), move_cost in planner.neighbours(goal):
+                if (x, y) != position:
+                    grid[y][x] = False
+                    planner.update_point((x, y))
+
+        path = planner.find_path(position, goal)
+        expected_cost = fresh_path(grid, position, goal)
+        if expected_cost is None:
+            assert path is None
+        else:
+            assert path is not None and (path[-1] if path else position) == goal
+            assert all(grid[y][x] for x, y in path)
+            assert math.isclose(path_cost(position, path), expected_cost)
+
+            # the mob follows the path, so the search is kept and repaired rather than started again
+            if path:
+                position = path[0]
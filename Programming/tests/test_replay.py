@@ -0,0 +1,55 @@
+import pytest
+
+import replay
+
+
+TICKS = [((0, 0, False, None, False, False, None, None), 0),
+         ((1, -1, True, (12, 40), False, False, 2, None), 123456789),
+         ((-1, 0, False, None, True, True, None, 5), 4294967295),
+         ((0, 1, True, (-3, 0), True, False, 0, 0), 77)]
+
+
+def record(path, ticks):
+    recorder = replay.Recorder(path, 1234567890123, 42)
+    for controls, checksum in ticks:
+        recorder.record(controls, checksum)
+    recorder.close()
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "session.rec")
+    record(path, TICKS)
+
+    recording = replay.read(path)
+    assert (recording.world_seed, recording.session_seed) == (1234567890123, 42)
+    assert recording.ticks == TICKS
+
+
+def test_cut_short_recording_plays_whole_ticks(tmp_path):
+    path = tmp_path / "session.rec"
+    record(str(path), TICKS)
+    path.write_bytes(path.read_bytes()[:-1])
+
+    assert replay.read(str(path)).ticks == TICKS[:-1]
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "session.rec"
+    path.write_bytes(b"CMRP")
+    with pytest.raises(replay.ReplayError):
+        replay.read(str(path))
+
+    path.write_bytes(replay.HEADER.pack(b"CMRP", replay.VERSION + 1, 1, 2))
+    with pytest.raises(replay.ReplayError):
+        replay.read(str(path))
+
+
+def test_playback_notes_first_divergence():
+    playback = replay.Playback(replay.Recording(1, 2, TICKS))
+    checksums = [0, 123456789, 5, 6]
+    while not playback.finished:
+        controls = playback.next_controls()
+        assert controls == TICKS[playback.tick - 1][0]
+        playback.check(checksums[playback.tick - 1])
+
+    assert playback.diverged_at == 3
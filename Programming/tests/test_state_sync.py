@@ -0,0 +1,83 @@
+import pytest
+
+import state_sync
+import terrain_overlay
+
+
+CHUNK_SIZE = 4
+
+
+def make_base():
+    return [[(0.5, "plains", (0, 128, 0), None, 100) for x in range(12)] for y in range(8)]
+
+
+def view_of(terrain, user, inventory, toolbar, messages, players, mobs):
+    # every chunk is in view, as the server does for the chunks near a user
+    chunks = {(cx, cy): (terrain.versions.get((cx, cy), 0), terrain.edits.get((cx, cy), dict()))
+              for cx in range(-(-terrain.width // CHUNK_SIZE)) for cy in range(-(-terrain.height // CHUNK_SIZE))}
+    return state_sync.View(user, inventory, toolbar, messages, players, mobs, chunks)
+
+
+def check_client(client, view):
+    assert client.user == view.user
+    assert list(client.inventory.items()) == list(view.inventory.items())
+    assert client.toolbar == view.toolbar
+    assert client.messages == tuple(view.messages)
+    assert client.players == view.players
+    assert client.mobs == view.mobs
+
+
+def test_updates_round_trip():
+    server_terrain = terrain_overlay.OverlayTerrain(make_base(), CHUNK_SIZE, 1, (12, 8, 1))
+    encoder = state_sync.ViewEncoder(CHUNK_SIZE)
+    client = state_sync.ClientWorld(CHUNK_SIZE)
+    client.attach_terrain(terrain_overlay.OverlayTerrain(make_base(), CHUNK_SIZE, 1, (12, 8, 1)))
+
+    user = (10, 20, 1, 100, 80, 0, 0, 0, 0)
+    inventory = {"wood": 2}
+    toolbar = {"pickaxe": "wood"}
+    players = {7: (11, 20, 0, 0)}
+    mobs = {1: (0, 5, 6, False, 0), 2: (3, 9, 9, True, 0)}
+
+    changes = [lambda: None,
+               lambda: server_terrain.edit(1, 1, (0.5, "desert", (200, 200, 0), None, 60)),
+               lambda: server_terrain.edit(9, 6, (0.5, "plains", (0, 128, 0), True, 100)),
+               lambda: server_terrain.edit(1, 1, make_base()[1][1])]
+    for tick, change in enumerate(changes):
+        change()
+        view = view_of(server_terrain, user, inventory, toolbar, [("+1 wood", (3, -4))] if tick == 1 else [],
+                       players, mobs)
+        client.apply_update(encoder.pack_update(tick, view))
+        assert client.tick == tick
+        check_client(client, view)
+        assert [list(row) for row in client.terrain] == [list(row) for row in server_terrain]
+
+        user = user[:2] + (2, user[3] - 5) + user[4:]
+        inventory = {"wood": inventory["wood"] + 1, "stone": tick}
+        toolbar = {"pickaxe": "stone"}
+        players = {8: (0, 0, 3, 1)} if tick else {7: (12, 20, 2, 0)}
+        mobs = {1: (0, 6, 6, False, 0)}
+
+
+def test_unchanged_view_is_only_a_header():
+    terrain = terrain_overlay.OverlayTerrain(make_base(), CHUNK_SIZE, 1, (12, 8, 1))
+    terrain.edit(5, 5, (0.5, "caves", (1, 1, 1), False, 3))
+    view = view_of(terrain, (1, 2, 0, 100, 100, 0, 0, 0, 0), {"wood": 1}, {}, [], {3: (1, 1, 0, 0)}, {})
+    encoder = state_sync.ViewEncoder(CHUNK_SIZE)
+
+    encoder.pack_update(0, view)
+    assert encoder.pack_update(1, view) == state_sync.UPDATE_HEADER.pack(1, 0)
+
+
+def test_controls_round_trip():
+    controls = (-1, 1, True, (30, 41), False, True, 3, None)
+    assert state_sync.unpack_controls(state_sync.pack_controls(controls)) == controls
+
+    with pytest.raises(state_sync.SyncError):
+        state_sync.unpack_controls(state_sync.pack_controls(controls)[:-1])
+
+
+def test_update_of_wrong_size():
+    client = state_sync.ClientWorld(CHUNK_SIZE)
+    with pytest.raises(state_sync.SyncError):
+        client.apply_update(state_sync.UPDATE_HEADER.pack(0, 0) + b"\x00")
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+import terrain_overlay
+import world_save
+
+
+WIDTH, HEIGHT = 24, 16
+
+
+def make_terrain(seed):
+    """Makes a small random terrain grid, in the layout made by terrain_gen.generate()"""
+
+    rng = random.Random(seed)
+    return [[(rng.random(), rng.choice(world_save.BIOMES), tuple(rng.randrange(256) for i in range(3)),
+              rng.choice(world_save.OBJECT_STATES), rng.randrange(101)) for x in range(WIDTH)] for y in range(HEIGHT)]
+
+
+def make_save_data(terrain):
+    player = world_save.PlayerRecord(3, 7, 82.5, 40.25, 12, 1, 4)
+    mobs = [("sheep", (3, 4), 10, False), ("zombie", (20, 2), 25, True), ("sheep", (0, 15), 1, False)]
+    inventory = {"wood": 12, "stone": 3, "meat": 1}
+    toolbar = {"pickaxe": "stone", "sword": "wood"}
+    return world_save.SaveData(terrain, player, mobs, inventory, toolbar)
+
+
+def points(terrain):
+    return [tuple(point) for row in terrain for point in row]
+
+
+def no_generation(seed, parameters):
+    raise AssertionError("the terrain should have been read from the save")
+
+
+def make_overlay():
+    """Makes a seeded OverlayTerrain with a few points changed and one changed back again"""
+
+    base = make_terrain(5)
+    terrain = terrain_overlay.OverlayTerrain(base, 8, 5, (WIDTH, HEIGHT, 1))
+    terrain.edit(1, 2, (0.5, "desert", (1, 2, 3), None, 40))
+    terrain.edit(20, 15, (0.25, "caves", (9, 9, 9), True, 100))
+    terrain.edit(9, 9, (0.75, "ocean", (0, 0, 255), False, 3))
+    terrain.edit(9, 9, base[9][9])
+    return terrain
+
+
+def check_save_data(loaded, expected):
+    assert loaded.player == expected.player
+    assert loaded.mobs == expected.mobs
+    assert list(loaded.inventory.items()) == list(expected.inventory.items())
+    assert loaded.toolbar == expected.toolbar
+
+
+def test_planes_round_trip(tmp_path):
+    path = str(tmp_path / "world.sav")
+    save_data = make_save_data(make_terrain(1))
+    world_save.save(path, save_data)
+
+    loaded = world_save.load(path, no_generation)
+    assert isinstance(loaded.terrain, world_save.MappedTerrain)
+    assert points(loaded.terrain) == points(save_data.terrain)
+    check_save_data(loaded, save_data)
+
+
+def test_seeded_round_trip_reads_base_in_place(tmp_path):
+    path = str(tmp_path / "world.sav")
+    terrain = make_overlay()
+    save_data = make_save_data(terrain)
+    world_save.save(path, save_data)
+
+    loaded = world_save.load(path, no_generation)
+    assert isinstance(loaded.terrain, terrain_overlay.OverlayTerrain)
+    assert isinstance(loaded.terrain.base, world_save.MappedTerrain)
+    assert (loaded.terrain.seed, loaded.terrain.parameters, loaded.terrain.chunk_size) == (5, (WIDTH, HEIGHT, 1), 8)
+    assert loaded.terrain.edited_points() == terrain.edited_points()
+    assert points(loaded.terrain) == points(terrain)
+    check_save_data(loaded, save_data)
+
+    # saving the loaded world again keeps the same terrain
+    world_save.save(path, loaded)
+    assert points(world_save.load(path, no_generation).terrain) == points(terrain)
+
+
+def test_seeded_save_without_planes_regenerates(tmp_path, monkeypatch):
+    path = str(tmp_path / "world.sav")
+    terrain = make_overlay()
+    # saves written before the base's planes were stored have empty plane sections
+    monkeypatch.setattr(world_save, "terrain_planes", lambda base: [b""] * len(world_save.PLANES))
+    world_save.save(path, make_save_data(terrain))
+
+    calls = []
+    loaded = world_save.load(path, lambda seed, parameters: calls.append((seed, parameters)) or make_terrain(5))
+    assert calls == [(5, (WIDTH, HEIGHT, 1))]
+    assert points(loaded.terrain) == points(terrain)
+
+
+def test_truncated_save_is_damaged(tmp_path):
+    path = str(tmp_path / "world.sav")
+    world_save.save(path, make_save_data(make_overlay()))
+    with open(path, "rb") as file:
+        data = file.read()
+
+    for length in (world_save.HEADER_START.size, 100, len(data) // 2, len(data) - 1):
+        with open(path, "wb") as file:
+            file.write(data[:length])
+        with pytest.raises(world_save.SaveError):
+            world_save.load(path, no_generation)
+
+
+def test_not_a_save_file(tmp_path):
+    path = tmp_path / "world.sav"
+    path.write_bytes(b"")
+    with pytest.raises(world_save.SaveError):
+        world_save.load(str(path), no_generation)
+
+    path.write_bytes(b"not a save file at all")
+    with pytest.raises(world_save.SaveError):
+        world_save.load(str(path), no_generation)
@@ -0,0 +1,332 @@
+import array
+import collections
+import mmap
+import os
+import struct
+import zlib
+
+import terrain_overlay
+
+
+# save files start with a header of fixed size, which gives where each section of the file starts and how long it is.
+# Version 1 files always store the whole terrain as planes, whilst version 2 files store the seed and parameters that
+# the terrain was generated with and only the points changed since, unless the terrain has no seed (e.g. it was loaded
+# from a version 1 file), when they store planes instead. Version 3 files are the same as version 2 files, apart from
+# the sections in <COMPRESSED_SECTIONS> being compressed with zlib (planes never are, so they can be read in place).
+# Version 3 files with a seed also store the planes of the generated terrain (before any changes), so that they open
+# straight away with the terrain read in place rather than generated again - older files without them still generate
+# their terrain again when loaded, which takes as long as generating a new world does
+MAGIC = b"CMWS"
+VERSION = 3
+SECTIONS = {1: ["noise", "biome", "colour", "object", "durability", "player", "inventory", "toolbar", "mobs"],
+            2: ["noise", "biome", "colour", "object", "durability", "world", "edits", "player", "inventory", "toolbar",
+                "mobs"]}
+SECTIONS[3] = SECTIONS[2]
+# the planes of the terrain, with how many bytes each one takes per point
+PLANES = ["noise", "biome", "colour", "object", "durability"]
+PLANE_SIZES = {"noise": 8, "biome": 1, "colour": 3, "object": 1, "durability": 1}
+COMPRESSED_SECTIONS = {1: set(), 2: set(), 3: {"edits", "mobs"}}
+HEADER_START = struct.Struct("<4sHII")
+# sections start on a multiple of this many bytes, so that planes can be read in place as arrays of numbers
+ALIGNMENT = 8
+
+BIOMES = ["plains", "desert", "forest", "caves", "ocean"]
+# a point's object state is None (no object), False (covered by an object) or True (the top-left of an object)
+OBJECT_STATES = [None, False, True]
+
+PLAYER = struct.Struct("<iiddIBB")
+MOB = struct.Struct("<BiiiB")
+# the seed, (width, height, spacing) parameters and overlay chunk size of generated terrain, and each changed point
+WORLD = struct.Struct("<QIIIH")
+EDIT = struct.Struct("<HHdB3sBb")
+
+# the user's values that are saved, alongside the terrain, every mob (awake or asleep) as a (mob type, position,
+# health, hostile) record, and the user's inventory and toolbar
+PlayerRecord = collections.namedtuple("PlayerRecord", ["x", "y", "health", "hunger", "window_age", "toolbar_slot",
+                                                       "inventory_slot"])
+SaveData = collections.namedtuple("SaveData", ["terrain", "player", "mobs", "inventory", "toolbar"])
+
+
+class SaveError(Exception):
+    """Raised when a file is not a save file, or was saved by an unsupported version of the game"""
+
+
+class MappedTerrain:
+    """Terrain read in place from the planes of a memory-mapped save file, which can be used in the same way as the
+    nested lists made by terrain_gen.generate(), where terrain[y][x] is a (noise, biome, colour, object state,
+    durability) tuple. The file is mapped copy-on-write, so changes to the terrain never reach the file itself"""
+
+    def __init__(self, width, height, planes, mapping=None):
+        self.width, self.height = width, height
+        self.noise, self.biome, self.colour, self.object, self.durability = planes
+        # kept open for as long as the planes are being read from it
+        self.mapping = mapping
+        self.rows = [MappedRow(self, y * width) for y in range(height)]
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        return self.rows[y]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def snapshot(self):
+        """Returns a copy of the terrain as it is now, which can be saved on another thread whilst this terrain
+        changes"""
+
+        planes = (memoryview(bytearray(self.noise)).cast("d"), bytearray(self.biome), bytearray(self.colour),
+                  bytearray(self.object), memoryview(bytearray(self.durability)).cast("b"))
+        return MappedTerrain(self.width, self.height, planes)
+
+
+class MappedRow:
+    """A single row of a MappedTerrain"""
+
+    __slots__ = ("terrain", "start")
+
+    def __init__(self, terrain, start):
+        self.terrain = terrain
+        self.start = start
+
+    def __len__(self):
+        return self.terrain.width
+
+    def __iter__(self):
+        return (self[x] for x in range(self.terrain.width))
+
+    def index(self, x):
+        if not 0 <= x < self.terrain.width:
+            if -self.terrain.width <= x < 0:
+                return self.start + self.terrain.width + x
+            raise IndexError("terrain row index out of range")
+        return self.start + x
+
+    def __getitem__(self, x):
+        index = self.index(x)
+        terrain = self.terrain
+
+        return (terrain.noise[index], BIOMES[terrain.biome[index]], tuple(terrain.colour[3 * index:3 * index + 3]),
+                OBJECT_STATES[terrain.object[index]], terrain.durability[index])
+
+    def __setitem__(self, x, point):
+        index = self.index(x)
+        terrain = self.terrain
+        noise, biome, colour, object_state = point[:4]
+
+        terrain.noise[index] = noise
+        terrain.biome[index] = BIOMES.index(biome)
+        terrain.colour[3 * index:3 * index + 3] = bytes(colour)
+        terrain.object[index] = OBJECT_STATES.index(object_state)
+        # points covered by objects are made without a durability
+        terrain.durability[index] = point[4] if len(point) > 4 else 100
+
+
+def header_struct(version):
+    """Returns the layout of the header of a save file, which has an (offset, length) pair for each section"""
+
+    return struct.Struct(HEADER_START.format + "QQ" * len(SECTIONS[version]))
+
+
+def terrain_planes(terrain):
+    """Returns the noise, biome, colour, object and durability planes of a terrain grid, as bytes"""
+
+    if isinstance(terrain, MappedTerrain):
+        # already in the save format, so the planes are copied as they are
+        return [bytes(plane) for plane in (terrain.noise, terrain.biome, terrain.colour, terrain.object,
+                                           terrain.durability)]
+
+    points = [point for row in terrain for point in row]
+    return [array.array("d", [point[0] for point in points]).tobytes(),
+            bytes(BIOMES.index(point[1]) for point in points),
+            bytes(value for point in points for value in point[2]),
+            bytes(OBJECT_STATES.index(point[3]) for point in points),
+            array.array("b", [point[4] if len(point) > 4 else 100 for point in points]).tobytes()]
+
+
+def pack_edits(terrain):
+    """Packs every changed point of an OverlayTerrain, chunk by chunk"""
+
+    edited_points = terrain.edited_points()
+    packed = bytearray(struct.pack("<I", len(edited_points)))
+    for x, y, (noise, biome, colour, object_state, *durability) in edited_points:
+        packed += EDIT.pack(x, y, noise, BIOMES.index(biome), bytes(colour), OBJECT_STATES.index(object_state),
+                            durability[0] if durability else 100)
+
+    return packed
+
+
+def unpack_edits(data, terrain):
+    """Applies the changed points packed by pack_edits() to an OverlayTerrain"""
+
+    count, = struct.unpack_from("<I", data, 0)
+    for x, y, noise, biome, colour, object_state, durability in EDIT.iter_unpack(data[4:4 + count * EDIT.size]):
+        terrain.edit(x, y, (noise, BIOMES[biome], tuple(colour), OBJECT_STATES[object_state], durability))
+
+
+def pack_names(names):
+    """Packs a list of strings, each with its length in front"""
+
+    packed = bytearray(struct.pack("<H", len(names)))
+    for name in names:
+        encoded = name.encode()
+        packed += struct.pack("<B", len(encoded)) + encoded
+
+    return packed
+
+
+def unpack_names(data, offset):
+    """Unpacks a list of strings packed by pack_names(), returning it and the offset just after it"""
+
+    count, = struct.unpack_from("<H", data, offset)
+    offset += 2
+    names = []
+    for i in range(count):
+        length = data[offset]
+        names.append(bytes(data[offset + 1:offset + 1 + length]).decode())
+        offset += 1 + length
+
+    return names, offset
+
+
+def pack_mobs(mobs):
+    """Packs (mob type, position, health, hostile) records into a table of mob types then one fixed-size record per
+    mob"""
+
+    mob_types = sorted({mob[0] for mob in mobs})
+    packed = pack_names(mob_types) + struct.pack("<I", len(mobs))
+    for mob_type, (x, y), health, hostile in mobs:
+        packed += MOB.pack(mob_types.index(mob_type), x, y, health, hostile)
+
+    return packed
+
+
+def unpack_mobs(data):
+    """Unpacks the mob records packed by pack_mobs()"""
+
+    mob_types, offset = unpack_names(data, 0)
+    count, = struct.unpack_from("<I", data, offset)
+    offset += 4
+
+    mobs = []
+    for type_index, x, y, health, hostile in MOB.iter_unpack(data[offset:offset + count * MOB.size]):
+        mobs.append((mob_types[type_index], (x, y), health, hostile == 1))
+
+    return mobs
+
+
+def save(path, save_data):
+    """Writes a save file, one section at a time, replacing any existing file at <path> only once it has been fully
+    written"""
+
+    terrain = save_data.terrain
+    width, height = len(terrain[0]), len(terrain)
+    sections = dict.fromkeys(SECTIONS[VERSION], b"")
+
+    # generated terrain is saved as its seed, the planes it was generated as and the points changed since, otherwise
+    # the whole terrain is saved as planes
+    if isinstance(terrain, terrain_overlay.OverlayTerrain) and terrain.seed is not None:
+        sections["world"] = WORLD.pack(terrain.seed, *terrain.parameters, terrain.chunk_size)
+        sections["edits"] = pack_edits(terrain)
+        sections.update(zip(PLANES, terrain_planes(terrain.base)))
+    else:
+        sections.update(zip(PLANES, terrain_planes(terrain)))
+
+    sections["player"] = PLAYER.pack(*save_data.player)
+    sections["inventory"] = pack_names(list(save_data.inventory)) + \
+        struct.pack(f"<{len(save_data.inventory)}I", *save_data.inventory.values())
+    sections["toolbar"] = pack_names(list(save_data.toolbar)) + pack_names(list(save_data.toolbar.values()))
+    sections["mobs"] = pack_mobs(save_data.mobs)
+    sections = [zlib.compress(section) if name in COMPRESSED_SECTIONS[VERSION] else section
+                for name, section in sections.items()]
+    header = header_struct(VERSION)
+
+    # work out where each section goes, padding each one up to a multiple of <ALIGNMENT> bytes
+    layout = []
+    offset = aligned(header.size)
+    for section in sections:
+        layout += [offset, len(section)]
+        offset = aligned(offset + len(section))
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(header.pack(MAGIC, VERSION, width, height, *layout))
+        for section_index, section in enumerate(sections):
+            file.seek(layout[2 * section_index])
+            file.write(section)
+        file.truncate(offset)
+        # make sure the new file is on disk before it replaces the old one, so that a crash never leaves neither
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def load(path, generate_base):
+    """Opens a save file, mapping it into memory so that saved terrain planes are read from the file only as they are
+    used. Generated terrain is read from its saved planes in the same way, with its saved changes laid over it, unless
+    it was saved without them, when it is made again by generate_base(seed, (width, height, spacing)), which takes as
+    long as generating the world in the first place"""
+
+    with open(path, "rb") as file:
+        # an empty file can't be mapped
+        if os.fstat(file.fileno()).st_size < HEADER_START.size:
+            raise SaveError(f"'{path}' is not a save file")
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    # a file cut short (e.g. by running out of disk space) has sections missing from its end
+    try:
+        return unpack_save(path, mapping, generate_base)
+    except (struct.error, zlib.error) as error:
+        raise SaveError(f"'{path}' is damaged ({error})") from None
+
+
+def unpack_save(path, mapping, generate_base):
+    """Reads the sections of a mapped save file"""
+
+    magic, version = HEADER_START.unpack_from(mapping)[:2]
+    if magic != MAGIC:
+        raise SaveError(f"'{path}' is not a save file")
+    if version not in SECTIONS:
+        raise SaveError(f"'{path}' was saved by version {version} of the game, which can't be loaded")
+    magic, version, width, height, *layout = header_struct(version).unpack_from(mapping)
+
+    view = memoryview(mapping)
+    sections = dict.fromkeys(SECTIONS[VERSION], view[0:0])
+    for section_index, name in enumerate(SECTIONS[version]):
+        offset, length = layout[2 * section_index:2 * section_index + 2]
+        sections[name] = view[offset:offset + length]
+        if name in COMPRESSED_SECTIONS[version]:
+            sections[name] = zlib.decompress(sections[name])
+
+    if sections["noise"]:
+        if any(len(sections[name]) != width * height * PLANE_SIZES[name] for name in PLANES):
+            raise SaveError(f"'{path}' is damaged (its terrain is the wrong size)")
+        planes = (sections["noise"].cast("d"), sections["biome"], sections["colour"], sections["object"],
+                  sections["durability"].cast("b"))
+        terrain = MappedTerrain(width, height, planes, mapping)
+    else:
+        terrain = None
+
+    if sections["world"]:
+        seed, generated_width, generated_height, spacing, chunk_size = WORLD.unpack(sections["world"])
+        parameters = (generated_width, generated_height, spacing)
+        base = terrain if terrain is not None else generate_base(seed, parameters)
+        terrain = terrain_overlay.OverlayTerrain(base, chunk_size, seed, parameters)
+        unpack_edits(sections["edits"], terrain)
+
+    player = PlayerRecord(*PLAYER.unpack(sections["player"]))
+
+    items, offset = unpack_names(sections["inventory"], 0)
+    counts = struct.unpack_from(f"<{len(items)}I", sections["inventory"], offset)
+    inventory = dict(zip(items, counts))
+
+    tools, offset = unpack_names(sections["toolbar"], 0)
+    materials, offset = unpack_names(sections["toolbar"], offset)
+    toolbar = dict(zip(tools, materials))
+
+    return SaveData(terrain, player, unpack_mobs(sections["mobs"]), inventory, toolbar)